@@ -0,0 +1,54 @@
+"""Cost of Window.from_data and Heating.from_data with and without the compiled XPath cache.
+
+Run from the etl directory:
+
+    python benchmarks/bench_element.py [tests/sample.h2k] [repeat]
+"""
+import sys
+import timeit
+import typing
+from lxml import etree
+from energuide import element
+from energuide.embedded import code
+from energuide.embedded import heating
+from energuide.embedded import window
+
+
+def _run(windows: typing.List[element.Element],
+         window_codes: typing.Dict[str, code.WindowCode],
+         heating_node: element.Element,
+         repeat: int) -> typing.Tuple[float, float]:
+    window_seconds = timeit.timeit(
+        lambda: [window.Window.from_data(node, window_codes) for node in windows], number=repeat)
+    heating_seconds = timeit.timeit(lambda: heating.Heating.from_data(heating_node), number=repeat)
+    return window_seconds / (repeat * len(windows)) * 1e6, heating_seconds / repeat * 1e6
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else 'tests/sample.h2k'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    doc = element.Element.parse(path)
+    windows = doc.xpath('House/Components//Window')
+    window_codes = {
+        window_code.identifier: window_code
+        for window_code in (code.WindowCode.from_data(node) for node in doc.xpath('Codes/Window/*/Code'))
+    }
+    heating_node = doc.xpath('House/HeatingCooling')[0]
+
+    cached = element.compiled_xpath
+    try:
+        element.compiled_xpath = etree.XPath  # type: ignore
+        uncached_window, uncached_heating = _run(windows, window_codes, heating_node, repeat)
+    finally:
+        element.compiled_xpath = cached  # type: ignore
+
+    cached_window, cached_heating = _run(windows, window_codes, heating_node, repeat)
+
+    print(f'Window.from_data:  {uncached_window:8.2f} us uncached, {cached_window:8.2f} us cached')
+    print(f'Heating.from_data: {uncached_heating:8.2f} us uncached, {cached_heating:8.2f} us cached')
+    print(f'XPath cache: {element.xpath_cache_info()}')
+
+
+if __name__ == '__main__':
+    main()
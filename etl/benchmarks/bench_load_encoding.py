@@ -0,0 +1,78 @@
+"""Docs/sec and peak RSS of the load path with dict documents and with raw BSON documents.
+
+Each mode runs in its own process so its peak RSS is measured on its own. The documents are transformed and
+batched as in `energuide load`, then encoded the way pymongo does for a bulk write, without sending them anywhere.
+
+Run from the etl directory:
+
+    python benchmarks/bench_load_encoding.py [tests/randomized_energuide_data.csv] [copies] [workers]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+import bson
+from bson import raw_bson
+from energuide import database
+from energuide import extractor
+from energuide import transform
+
+
+class _RepeatedReader:
+    def __init__(self, rows: typing.List[typing.Dict[str, typing.Any]], copies: int) -> None:
+        self._rows = rows
+        self._copies = copies
+
+    def extracted_rows(self) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        for _ in range(self._copies):
+            yield from self._rows
+
+    def num_rows(self) -> int:
+        return len(self._rows) * self._copies
+
+
+def _encode(document: typing.Mapping[str, typing.Any]) -> bytes:
+    if isinstance(document, raw_bson.RawBSONDocument):
+        return document.raw
+    return bson.BSON.encode(document)
+
+
+def _run(path: str, copies: int, workers: int, raw: bool) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        outfile = os.path.join(directory, 'extract.zip')
+        extractor.write_data(extractor.extract_data(path), outfile)
+        rows = list(transform.local_extract_reader(outfile).extracted_rows())
+
+    start = time.monotonic()
+    num_documents = num_bytes = 0
+    data = transform.transform(_RepeatedReader(rows, copies), workers=workers, raw_bson_documents=raw)
+    for chunk in database._chunk(data):
+        encoded = [_encode(database.to_document(document)) for document in chunk]
+        num_documents += len(encoded)
+        num_bytes += sum(len(document) for document in encoded)
+    seconds = time.monotonic() - start
+
+    parent_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f'{["dict", "raw"][raw]:>5}: {num_documents / seconds:8.0f} docs/s, {num_bytes / 1e6:6.1f} MB BSON, '
+          f'peak RSS {parent_rss:6.1f} MiB parent, {children_rss:6.1f} MiB largest worker')
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else 'tests/randomized_energuide_data.csv'
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    if len(sys.argv) > 4:
+        _run(path, copies, workers, raw=sys.argv[4] == 'raw')
+        return
+
+    for mode in ('dict', 'raw'):
+        subprocess.run([sys.executable, __file__, path, str(copies), str(workers), mode], check=True)
+
+
+if __name__ == '__main__':
+    main()
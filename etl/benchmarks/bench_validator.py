@@ -0,0 +1,35 @@
+"""Per-row cost of validating extract input with cerberus and with the compiled validator.
+
+Run from the etl directory:
+
+    python benchmarks/bench_validator.py [tests/randomized_energuide_data.csv] [repeat]
+"""
+import sys
+import timeit
+import typing
+import cerberus
+from energuide import extractor
+from energuide import validator
+
+
+def _load_rows(path: str) -> typing.List[typing.Dict[str, typing.Any]]:
+    return [extractor._empty_to_none(row) for row in extractor._read_csv(path, show_progress=False)]
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else 'tests/randomized_energuide_data.csv'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rows = _load_rows(path)
+
+    checkers = [
+        ('cerberus', cerberus.Validator(extractor.INPUT_SCHEMA, purge_unknown=True)),
+        ('compiled', validator.CompiledValidator(extractor.INPUT_SCHEMA)),
+    ]
+    for name, checker in checkers:
+        seconds = timeit.timeit(lambda: [checker.validate(row) for row in rows], number=repeat)
+        per_row = seconds / (repeat * len(rows)) * 1e6
+        print(f'{name:>10}: {per_row:8.2f} us/row over {len(rows)} rows x {repeat}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,23 @@
+import collections
+from concurrent import futures
 from contextlib import contextmanager
 import enum
+import hashlib
+from itertools import islice
+import json
+import time
 import typing
 
+import bson
+from bson import raw_bson
 import pymongo
+import pymongo.database
+import pymongo.errors
+from pymongo import collection as mongo_collection
 
 from energuide import dwelling
 from energuide import logger
+from energuide.exceptions import LoadSanityError
 
 
 LOGGER = logger.get_logger(__name__)
@@ -31,7 +43,6 @@ class EnvDefaults(enum.Enum):
     production = False
 
 
-
 class _DatabaseCoordinates(typing.NamedTuple):
     username: str
     password: str
@@ -64,23 +75,284 @@ def mongo_client(database_coordinates: DatabaseCoordinates) -> typing.Iterable[p
         yield client
 
 
+CHUNKSIZE = 1000
+WRITERS = 4
+CONTENT_HASH_FIELD = 'contentHash'
+STAGING_SUFFIX = '_staging'
+PREVIOUS_SUFFIX = '_previous'
+# a staged rebuild is not swapped in if it has fewer rows than this fraction of the live collection
+MIN_STAGED_ROW_RATIO = 0.9
+
+# the fields the API filters dwellings on (api/src/schema/enums.js); houseId is also the upsert key
+DWELLING_INDEX_FIELDS = ['yearBuilt', 'city', 'region', 'forwardSortationArea']
+EVALUATION_INDEX_FIELDS = [
+    'evaluationType', 'fileId', 'houseType', 'entryDate', 'creationDate', 'modificationDate', 'heatedFloorArea',
+]
+HOUSE_ID_INDEX = pymongo.IndexModel([('houseId', pymongo.ASCENDING)], unique=True)
+INDEXES = [HOUSE_ID_INDEX] + [
+    pymongo.IndexModel([(field, pymongo.ASCENDING)]) for field in DWELLING_INDEX_FIELDS
+] + [
+    pymongo.IndexModel([(f'evaluations.{field}', pymongo.ASCENDING)]) for field in EVALUATION_INDEX_FIELDS
+]
+
+T = typing.TypeVar('T')
+def _chunk(data: typing.Iterable[T], size: int = CHUNKSIZE) -> typing.Iterable[typing.List[T]]:
+    iterator = iter(data)
+    chunk = list(islice(iterator, size))
+
+    while len(chunk) == size:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+    if not chunk:
+        return
+    else:
+        yield chunk
+
+
+def _in_background(index: pymongo.IndexModel) -> pymongo.IndexModel:
+    options = {key: value for key, value in index.document.items() if key != 'key'}
+    return pymongo.IndexModel(list(index.document['key'].items()), **dict(options, background=True))
+
+
+def ensure_indexes(collection: mongo_collection.Collection,
+                   indexes: typing.Optional[typing.List[pymongo.IndexModel]] = None,
+                   background: bool = False) -> float:
+    """Build any of the API's query indexes missing from the collection, returning how long it took.
+
+    A foreground build holds the database lock until it finishes, so a collection that is serving the API should
+    have its indexes built in the `background`.
+    """
+    start = time.monotonic()
+    indexes = INDEXES if indexes is None else indexes
+    names = collection.create_indexes([_in_background(index) for index in indexes] if background else indexes)
+    seconds = time.monotonic() - start
+    LOGGER.info(f"{len(names)} indexes ensured on {collection.name} in {seconds:.1f}s")
+    return seconds
+
+
+def content_hash(document: typing.Dict[str, typing.Any]) -> str:
+    """A hash of the document's fields that is the same for equal documents, whatever their key order"""
+    fields = {key: value for key, value in document.items() if key not in (CONTENT_HASH_FIELD, '_id')}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def encode_document(document: typing.Dict[str, typing.Any]) -> bytes:
+    """The document with its content hash, encoded as BSON so it can be handed to pymongo without re-encoding"""
+    return bson.BSON.encode(dict(document, **{CONTENT_HASH_FIELD: content_hash(document)}))
+
+
+Row = typing.Union[dwelling.Dwelling, typing.Dict[str, typing.Any], raw_bson.RawBSONDocument]
+
+
+def to_document(row: Row) -> typing.Mapping[str, typing.Any]:
+    """The row as the document written for it, carrying its content hash"""
+    if isinstance(row, raw_bson.RawBSONDocument):
+        return row
+    document = dict(row) if isinstance(row, dict) else row.to_dict()
+    document[CONTENT_HASH_FIELD] = content_hash(document)
+    return document
+
+
+class LoadSummary(typing.NamedTuple):
+    written: int
+    skipped: int
+    failed: int
+    seconds: float
+
+
+def _stored_hashes(collection: mongo_collection.Collection,
+                   documents: typing.List[typing.Mapping[str, typing.Any]]) -> typing.Dict[typing.Any, str]:
+    """The content hash of each stored dwelling in `documents`, fetched with one query"""
+    stored = collection.find({'houseId': {'$in': [document['houseId'] for document in documents]}},
+                             projection={'houseId': True, CONTENT_HASH_FIELD: True, '_id': False})
+    return {row['houseId']: row.get(CONTENT_HASH_FIELD) for row in stored}
+
+
+def _write_chunk(collection: mongo_collection.Collection,
+                 chunk: typing.List[Row],
+                 update: bool) -> LoadSummary:
+    """Write one batch, skipping dwellings whose stored content hash is unchanged when updating"""
+    start = time.monotonic()
+    documents = [to_document(document) for document in chunk]
+    if update:
+        # a later row for the same dwelling supersedes an earlier one in the batch
+        documents = list({document['houseId']: document for document in documents}.values())
+        stored = _stored_hashes(collection, documents)
+        documents = [document for document in documents
+                     if stored.get(document['houseId']) != document[CONTENT_HASH_FIELD]]
+    skipped = len(chunk) - len(documents)
+
+    failed = 0
+    try:
+        if documents and update:
+            requests = [pymongo.ReplaceOne({'houseId': document['houseId']}, document, upsert=True)
+                        for document in documents]
+            collection.bulk_write(requests, ordered=False)
+        elif documents:
+            collection.insert_many(documents, ordered=False)
+    except pymongo.errors.BulkWriteError as exc:
+        write_errors = exc.details.get('writeErrors', [])
+        failed = len(write_errors)
+        for error in write_errors[:10]:
+            LOGGER.warning(f"Failed to write dwelling: {error.get('errmsg')}")
+
+    return LoadSummary(written=len(documents) - failed,
+                       skipped=skipped,
+                       failed=failed,
+                       seconds=time.monotonic() - start)
+
+
+def _house_id(row: Row) -> typing.Any:
+    return row.house_id if isinstance(row, dwelling.Dwelling) else row['houseId']
+
+
+def _partitioned_chunks(data: typing.Iterable[Row],
+                        size: int,
+                        partitions: int) -> typing.Iterable[typing.Tuple[int, typing.List[Row]]]:
+    """Batches of up to `size` rows, with all the rows for a houseId in the same partition, in their original order"""
+    buffers: typing.List[typing.List[Row]] = [[] for _ in range(partitions)]
+    for row in data:
+        partition = hash(_house_id(row)) % partitions
+        buffers[partition].append(row)
+        if len(buffers[partition]) == size:
+            yield partition, buffers[partition]
+            buffers[partition] = []
+
+    for partition, buffer in enumerate(buffers):
+        if buffer:
+            yield partition, buffer
+
+
+def _write_all(collection: mongo_collection.Collection,
+               data: typing.Iterable[Row],
+               update: bool,
+               batch_size: int,
+               writers: int) -> LoadSummary:
+    written = skipped = failed = 0
+    batch_seconds: typing.List[float] = []
+    pending: typing.Deque[futures.Future] = collections.deque()
+
+    def collect(future: futures.Future) -> None:
+        nonlocal written, skipped, failed
+        batch = future.result()
+        written += batch.written
+        skipped += batch.skipped
+        failed += batch.failed
+        batch_seconds.append(batch.seconds)
+        size = batch.written + batch.skipped + batch.failed
+        LOGGER.debug(f"wrote batch of {size} rows in {batch.seconds * 1000:.0f}ms "
+                     f"({size / max(batch.seconds, 1e-6):.0f} docs/s)")
+
+    start = time.monotonic()
+    executors = [futures.ThreadPoolExecutor(max_workers=1) for _ in range(writers)]
+    try:
+        for partition, chunk in _partitioned_chunks(data, batch_size, writers):
+            pending.append(executors[partition].submit(_write_chunk, collection, chunk, update))
+            if len(pending) >= 2 * writers:
+                collect(pending.popleft())
+
+        while pending:
+            collect(pending.popleft())
+    finally:
+        for executor in executors:
+            executor.shutdown()
+
+    seconds = max(time.monotonic() - start, 1e-6)
+    num_rows = written + skipped + failed
+    LOGGER.info(f"{['inserted', 'updated'][update]} {written} rows in {collection.name}, "
+                f"{skipped} unchanged rows skipped, {failed} rows failed")
+    if batch_seconds:
+        LOGGER.info(f"{len(batch_seconds)} batches in {seconds:.1f}s ({num_rows / seconds:.0f} docs/s), "
+                    f"batch latency mean {sum(batch_seconds) / len(batch_seconds) * 1000:.0f}ms "
+                    f"max {max(batch_seconds) * 1000:.0f}ms")
+
+    return LoadSummary(written=written, skipped=skipped, failed=failed, seconds=seconds)
+
+
+def _check_staged(staging: mongo_collection.Collection, live: mongo_collection.Collection) -> None:
+    staged_rows = staging.count()
+    live_rows = live.count()
+    if staged_rows == 0 or staged_rows < MIN_STAGED_ROW_RATIO * live_rows:
+        raise LoadSanityError(f'{staging.name} has {staged_rows} rows against {live_rows} in {live.name}, '
+                              f'not swapping it in')
+
+
+def _swap_in(database: pymongo.database.Database, staging_name: str, collection_name: str) -> None:
+    """Move the live collection aside as the previous one and rename the staging collection over it"""
+    if collection_name in database.collection_names():
+        database[collection_name].rename(collection_name + PREVIOUS_SUFFIX, dropTarget=True)
+    database[staging_name].rename(collection_name, dropTarget=True)
+    LOGGER.info(f"swapped {staging_name} in as {collection_name}, previous data kept in "
+                f"{collection_name + PREVIOUS_SUFFIX}")
+
+
 def load(coords: DatabaseCoordinates,
          database_name: str,
          collection_name: str,
-         data: typing.Iterable[dwelling.Dwelling],
-         update: bool = True) -> None:
+         data: typing.Iterable[Row],
+         update: bool = True,
+         batch_size: int = CHUNKSIZE,
+         writers: int = WRITERS,
+         defer_indexes: bool = False,
+         staged: bool = False) -> LoadSummary:
+    """Write the dwellings in unordered batches of `batch_size`, one round trip per batch.
+
+    Up to `writers` batches are in flight at once over the client's connection pool, and at most 2 * writers
+    batches are held in memory, so transforming the next batches overlaps with writing the previous ones. Rows are
+    partitioned across the writers by houseId and each writer writes its batches in order, so two writes of the
+    same dwelling never race and the last row for a houseId is the one stored.
+    Each document carries a content hash; when updating, the stored hashes for a batch are fetched with one
+    query and unchanged dwellings are not written. Without `update` the collection is dropped first, so the
+    batches are plain inserts rather than upserts.
+
+    The indexes are built before loading, so upserts find dwellings by houseId through the unique index. On a full
+    rebuild `defer_indexes` builds the other indexes once after loading instead, which is faster than maintaining
+    them per write. The unique houseId index is always built first, so a duplicate dwelling fails its own write
+    rather than the index build at the end.
+
+    A `staged` rebuild leaves the live collection serving while it loads a staging collection, builds its other
+    indexes afterwards, checks its row count against the live collection and then renames it over the live one. The
+    replaced collection is kept with PREVIOUS_SUFFIX for `rollback`.
+    """
 
     client: pymongo.MongoClient
     with mongo_client(coords) as client:
         database = client[database_name]
-        collection = database[collection_name]
 
+        if staged and not update:
+            staging = database[collection_name + STAGING_SUFFIX]
+            staging.drop()
+            ensure_indexes(staging, [HOUSE_ID_INDEX])
+            summary = _write_all(staging, data, update, batch_size, writers)
+            ensure_indexes(staging)
+            _check_staged(staging, database[collection_name])
+            _swap_in(database, staging.name, collection_name)
+            return summary
+
+        collection = database[collection_name]
         if not update:
             collection.drop()
 
-        num_rows = 0
-        for row in data:
-            num_rows += 1
-            data_row = row.to_dict()
-            collection.update({'houseId': data_row['houseId']}, data_row, upsert=True)
-        LOGGER.info(f"updated {num_rows} rows in the database")
+        # an update runs against the live collection, so its missing indexes are built without blocking the API
+        build_indexes_after = defer_indexes and not update
+        ensure_indexes(collection, [HOUSE_ID_INDEX] if build_indexes_after else INDEXES, background=update)
+
+        summary = _write_all(collection, data, update, batch_size, writers)
+
+        if build_indexes_after:
+            ensure_indexes(collection)
+
+        return summary
+
+
+def rollback(coords: DatabaseCoordinates, database_name: str, collection_name: str) -> None:
+    """Restore the collection replaced by the last staged rebuild"""
+    client: pymongo.MongoClient
+    with mongo_client(coords) as client:
+        database = client[database_name]
+        previous_name = collection_name + PREVIOUS_SUFFIX
+        if previous_name not in database.collection_names():
+            raise LoadSanityError(f'No {previous_name} collection to roll back to')
+        database[previous_name].rename(collection_name, dropTarget=True)
+        LOGGER.info(f"restored {collection_name} from {previous_name}")
@@ -1,3 +1,6 @@
+import functools
+import re
+import threading
 import typing
 from lxml import etree
 from energuide.exceptions import EnerguideError, ElementGetValueError
@@ -9,10 +12,85 @@ class MalformedXmlError(EnerguideError):
 
 T = typing.TypeVar('T', int, float, str)
 
+XPATH_CACHE_SIZE = 1024
 
-class Element:
+# relative paths made only of child steps mean the same thing to ElementPath (find/findtext) and XPath
+_SIMPLE_PATH = re.compile(r'^(\*|[A-Za-z_][\w.-]*)(/(\*|[A-Za-z_][\w.-]*))*$')
+
+
+@functools.lru_cache(maxsize=XPATH_CACHE_SIZE)
+def compiled_xpath(path: str) -> etree.XPath:
+    """Process-wide cache of compiled XPath expressions, keyed by the path string"""
+    return etree.XPath(path)
+
+
+def xpath_cache_info() -> typing.Any:
+    """Hits, misses and size of the compiled XPath cache"""
+    return compiled_xpath.cache_info()
+
+
+# lxml parsers keep per-parse state and must not be shared between threads, so each thread gets its own
+_THREAD_PARSERS = threading.local()
+
+
+def xml_parser(huge_tree: bool = False, remove_blank_text: bool = False) -> etree.XMLParser:
+    """The calling thread's parser for the given options, created on first use"""
+    parsers: typing.Optional[typing.Dict[typing.Tuple[bool, bool], etree.XMLParser]] = \
+        getattr(_THREAD_PARSERS, 'parsers', None)
+    if parsers is None:
+        parsers = _THREAD_PARSERS.parsers = {}
+
+    key = (huge_tree, remove_blank_text)
+    parser = parsers.get(key)
+    if parser is None:
+        parser = parsers[key] = etree.XMLParser(
+            ns_clean=True,
+            recover=True,
+            encoding='utf-8',
+            huge_tree=huge_tree,
+            remove_blank_text=remove_blank_text,
+        )
+    return parser
+
+
+# name -> (path, type, required), as taken by Element.get_many
+FieldSpecs = typing.Mapping[str, typing.Tuple[str, typing.Callable[[typing.Any], typing.Any], bool]]
+
+_ATTRIBUTE_PATH = re.compile(r'^(?:(.+)/)?@([\w.:-]+)$')
+
+
+@functools.lru_cache(maxsize=XPATH_CACHE_SIZE)
+def _split_attribute_path(path: str) -> typing.Optional[typing.Tuple[typing.Optional[str], str]]:
+    match = _ATTRIBUTE_PATH.match(path)
+    if match is None or (match.group(1) is not None and not _SIMPLE_PATH.match(match.group(1))):
+        return None
+    return match.group(1), match.group(2)
+
+
+def _get_many(tag: str,
+              lookup: typing.Callable[[str], typing.Optional[typing.Any]],
+              fields: FieldSpecs) -> typing.Dict[str, typing.Any]:
+    values: typing.Dict[str, typing.Any] = {}
+    problems: typing.List[str] = []
+    for name, (path, type_, required) in fields.items():
+        value = lookup(path)
+        if value is None:
+            if required:
+                problems.append(f'{name} (missing {path})')
+            values[name] = None
+            continue
+        try:
+            values[name] = type_(value)
+        except ValueError:
+            problems.append(f'{name} (unable to cast {value} to {type_})')
+            values[name] = None
+
+    if problems:
+        raise ElementGetValueError(f"Invalid fields in {tag}: {', '.join(problems)}")
+    return values
 
-    _PARSER = etree.XMLParser(ns_clean=True, recover=True, encoding='utf-8')
+
+class Element:
 
     def __init__(self, node: etree._Element) -> None:
         self.__node = node
@@ -22,8 +100,9 @@ class Element:
         return cls(etree.Element(tag))
 
     @classmethod
-    def from_string(cls, data: str) -> 'Element':
-        output: typing.Optional[etree._Element] = etree.fromstring(data.encode('utf-8'), parser=cls._PARSER)
+    def from_string(cls, data: str, huge_tree: bool = False, remove_blank_text: bool = False) -> 'Element':
+        parser = xml_parser(huge_tree=huge_tree, remove_blank_text=remove_blank_text)
+        output: typing.Optional[etree._Element] = etree.fromstring(data.encode('utf-8'), parser=parser)
         if output is None:
             raise MalformedXmlError(f'Invalid XML fragment: {data}')
         return cls(output)
@@ -33,11 +112,18 @@ class Element:
         output = etree.parse(*args, **kwargs)
         return cls(output.find('.'))
 
+    def _find_simple(self, path: str) -> typing.Optional[etree._Element]:
+        nodes = compiled_xpath(path)(self.__node)
+        return nodes[0] if nodes else None
+
     def findtext(self, *args, **kwargs) -> typing.Optional[str]:
+        if len(args) == 1 and not kwargs and _SIMPLE_PATH.match(args[0]):
+            node = self._find_simple(args[0])
+            return (node.text or '') if node is not None else None
         return self.__node.findtext(*args, **kwargs)
 
     def get_text(self, *args, **kwargs) -> str:
-        result: typing.Optional[str] = self.__node.findtext(*args, **kwargs)
+        result: typing.Optional[str] = self.findtext(*args, **kwargs)
         if result is None:
             error_message = (
                 f"Couldn't find text at path {args[0]} in tag {self.tag}"
@@ -52,11 +138,17 @@ class Element:
         return self.__node.attrib
 
     def xpath(self, *args, **kwargs) -> typing.List[typing.Any]:
-        output = self.__node.xpath(*args, **kwargs)
+        if len(args) == 1 and not kwargs:
+            output = compiled_xpath(args[0])(self.__node)
+        else:
+            output = self.__node.xpath(*args, **kwargs)
         return [Element(node) if isinstance(node, etree._Element) else node for node in output]
 
     def find(self, *args, **kwargs) -> typing.Optional['Element']:
-        output = self.__node.find(*args, **kwargs)
+        if len(args) == 1 and not kwargs and _SIMPLE_PATH.match(args[0]):
+            output = self._find_simple(args[0])
+        else:
+            output = self.__node.find(*args, **kwargs)
         return Element(output) if output is not None else None
 
     def to_string(self) -> str:
@@ -75,7 +167,143 @@ class Element:
 
     def get(self, xpath: str, type_: typing.Type[T]) -> T:
         try:
-            value = self.__node.xpath(xpath)[0]
+            value = compiled_xpath(xpath)(self.__node)[0]
+        except IndexError as ex:
+            raise ElementGetValueError(f"Couldn't find element at {xpath} in {self.tag}") from ex
+
+        try:
+            result = type_(value)
+        except ValueError as ex:
+            raise ElementGetValueError(f"Unable to cast {value} to {type_} in {self.tag}") from ex
+        return typing.cast(T, result)
+
+    def get_many(self, fields: FieldSpecs) -> typing.Dict[str, typing.Any]:
+        """Read several `get` style values at once.
+
+        Each field maps to (path, type, required); missing optional fields are None. Attribute paths that share
+        a parent path look the parent up once. Raises a single ElementGetValueError naming every missing or
+        uncastable required field.
+        """
+        parents: typing.Dict[str, typing.List[etree._Element]] = {}
+
+        def lookup(path: str) -> typing.Optional[typing.Any]:
+            split = _split_attribute_path(path)
+            if split is None:
+                found = compiled_xpath(path)(self.__node)
+                return found[0] if found else None
+
+            parent_path, attribute = split
+            if parent_path is None:
+                return self.__node.get(attribute)
+            if parent_path not in parents:
+                parents[parent_path] = compiled_xpath(parent_path)(self.__node)
+            for parent in parents[parent_path]:
+                value = parent.get(attribute)
+                if value is not None:
+                    return value
+            return None
+
+        return _get_many(self.tag, lookup, fields)
+
+    def to_structured(self) -> typing.Dict[str, typing.Any]:
+        return to_structured(self.__node)
+
+
+def to_structured(node: etree._Element) -> typing.Dict[str, typing.Any]:
+    """Convert an XML node to the plain dict form read by StructuredElement.
+
+    Only what the embedded classes read is kept: the tag, attributes, leading text and element children.
+    Comments, processing instructions and tails are dropped.
+    """
+    return {
+        'tag': node.tag,
+        'attrib': dict(node.attrib),
+        'text': node.text or '',
+        'children': [to_structured(child) for child in node if isinstance(child.tag, str)],
+    }
+
+
+class _PathStep(typing.NamedTuple):
+    tags: typing.Optional[typing.FrozenSet[str]]
+    attribute: typing.Optional[str]
+
+
+_PREDICATE_PREFIX = '*[self::'
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_path(path: str) -> typing.Tuple[_PathStep, ...]:
+    steps = []
+    parts = path.split('/')
+    for index, part in enumerate(parts):
+        if part.startswith('@') and index == len(parts) - 1:
+            steps.append(_PathStep(tags=None, attribute=part[1:]))
+        elif part == '*':
+            steps.append(_PathStep(tags=None, attribute=None))
+        elif part.startswith(_PREDICATE_PREFIX) and part.endswith(']'):
+            names = part[len(_PREDICATE_PREFIX):-1].split(' or self::')
+            steps.append(_PathStep(tags=frozenset(names), attribute=None))
+        elif part and all(char.isalnum() or char in '_-.' for char in part):
+            steps.append(_PathStep(tags=frozenset([part]), attribute=None))
+        else:
+            raise ValueError(f'Unsupported path for structured data: {path}')
+    return tuple(steps)
+
+
+class StructuredElement:
+    """Read-only view over the dict form of an element, with the same read API as Element.
+
+    Paths are the subset of XPath used by the embedded classes: child steps by tag name, `*`,
+    `*[self::A or self::B]` and a final `@attribute` step.
+    """
+
+    def __init__(self, data: typing.Dict[str, typing.Any]) -> None:
+        self.__data = data
+
+    def _select(self, path: str) -> typing.List[typing.Any]:
+        nodes: typing.List[typing.Any] = [self.__data]
+        for step in _parse_path(path):
+            if step.attribute is not None:
+                return [node['attrib'][step.attribute] for node in nodes if step.attribute in node['attrib']]
+            nodes = [child for node in nodes for child in node['children']
+                     if step.tags is None or child['tag'] in step.tags]
+        return nodes
+
+    def findtext(self, path: str) -> typing.Optional[str]:
+        nodes = self._select(path)
+        return nodes[0]['text'] if nodes else None
+
+    def get_text(self, path: str) -> str:
+        result = self.findtext(path)
+        if result is None:
+            raise ElementGetValueError(f"Couldn't find text at path {path} in tag {self.tag}")
+        return result
+
+    @property
+    def attrib(self) -> typing.Dict[str, typing.Any]:
+        return self.__data['attrib']
+
+    def xpath(self, path: str) -> typing.List[typing.Any]:
+        return [StructuredElement(node) if isinstance(node, dict) else node for node in self._select(path)]
+
+    def find(self, path: str) -> typing.Optional['StructuredElement']:
+        nodes = self._select(path)
+        return StructuredElement(nodes[0]) if nodes else None
+
+    def __iter__(self) -> typing.Iterator['StructuredElement']:
+        for child in self.__data['children']:
+            yield StructuredElement(child)
+
+    @property
+    def tag(self) -> str:
+        return self.__data['tag']
+
+    def to_structured(self) -> typing.Dict[str, typing.Any]:
+        return self.__data
+
+    def get(self, xpath: str, type_: typing.Type[T]) -> T:
+        try:
+            value = self.xpath(xpath)[0]
         except IndexError as ex:
             raise ElementGetValueError(f"Couldn't find element at {xpath} in {self.tag}") from ex
 
@@ -84,3 +312,22 @@ class Element:
         except ValueError as ex:
             raise ElementGetValueError(f"Unable to cast {value} to {type_} in {self.tag}") from ex
         return typing.cast(T, result)
+
+    def get_many(self, fields: FieldSpecs) -> typing.Dict[str, typing.Any]:
+        def lookup(path: str) -> typing.Optional[typing.Any]:
+            found = self._select(path)
+            return found[0] if found else None
+
+        return _get_many(self.tag, lookup, fields)
+
+
+AnyElement = typing.Union[Element, StructuredElement]
+
+ElementData = typing.Union[Element, StructuredElement, typing.Dict[str, typing.Any]]
+
+
+def ensure_element(data: ElementData) -> AnyElement:
+    """Accept either form of a snippet: parsed XML, or the dict form produced by `to_structured`"""
+    if isinstance(data, dict):
+        return StructuredElement(data)
+    return data
@@ -63,21 +63,26 @@ class _BasementHeader(typing.NamedTuple):
 
 class BasementHeader(_BasementHeader):
 
+    _VALUE_FIELDS: element.FieldSpecs = {
+        'nominal_insulation': ('Construction/Type/@nominalInsulation', float, True),
+        'effective_insulation': ('Construction/Type/@rValue', float, True),
+        'height': ('Measurements/@height', float, True),
+        'width': ('Measurements/@perimeter', float, True),
+    }
+
     @classmethod
-    def from_data(cls, header: element.Element) -> 'BasementHeader':
+    def from_data(cls, header: element.ElementData) -> 'BasementHeader':
+        header = element.ensure_element(header)
         try:
-            nominal_insulation = header.get('Construction/Type/@nominalInsulation', float)
-            effective_insulation = header.get('Construction/Type/@rValue', float)
-            height = header.get('Measurements/@height', float)
-            width = header.get('Measurements/@perimeter', float)
+            values = header.get_many(cls._VALUE_FIELDS)
         except ElementGetValueError as exc:
             raise InvalidEmbeddedDataTypeError(BasementHeader, 'Invalid/Missing attribute value') from exc
 
         return BasementHeader(
-            nominal_insulation=insulation.Insulation(nominal_insulation),
-            effective_insulation=insulation.Insulation(effective_insulation),
-            height=distance.Distance(height),
-            perimeter=distance.Distance(width),
+            nominal_insulation=insulation.Insulation(values['nominal_insulation']),
+            effective_insulation=insulation.Insulation(values['effective_insulation']),
+            height=distance.Distance(values['height']),
+            perimeter=distance.Distance(values['width']),
         )
 
 
@@ -113,6 +118,16 @@ class BasementFloor(_BasementFloor):
         ),
     }
 
+    _RECTANGULAR_FIELDS: element.FieldSpecs = {
+        'length': ('Measurements/@length', float, True),
+        'width': ('Measurements/@width', float, True),
+    }
+
+    _IRREGULAR_FIELDS: element.FieldSpecs = {
+        'area': ('Measurements/@area', float, True),
+        'perimeter': ('Measurements/@perimeter', float, True),
+    }
+
     @classmethod
     def _empty_floor(cls, floor_type: FloorType) -> 'BasementFloor':
         return BasementFloor(
@@ -128,7 +143,7 @@ class BasementFloor(_BasementFloor):
 
     @classmethod
     def _from_data(cls,
-                   floor: element.Element,
+                   floor: element.AnyElement,
                    construction_type: str,
                    floor_type: FloorType) -> 'BasementFloor':
 
@@ -138,13 +153,14 @@ class BasementFloor(_BasementFloor):
         try:
             rectangular = floor.get('Measurements/@isRectangular', str) == 'true'
             if rectangular:
-                length = floor.get('Measurements/@length', float)
-                width = floor.get('Measurements/@width', float)
+                values = floor.get_many(cls._RECTANGULAR_FIELDS)
+                length, width = values['length'], values['width']
                 perimeter = (2 * length) + (2 * width)
                 floor_area = length * width
             else:
-                floor_area = floor.get('Measurements/@area', float)
-                perimeter = floor.get('Measurements/@perimeter', float)
+                values = floor.get_many(cls._IRREGULAR_FIELDS)
+                floor_area = values['area']
+                perimeter = values['perimeter']
 
             nominal_insulation_node = floor.xpath(f'Construction/{construction_type}/@nominalInsulation')
             effective_insulation_node = floor.xpath(f'Construction/{construction_type}/@rValue')
@@ -174,14 +190,14 @@ class BasementFloor(_BasementFloor):
 
 
     @classmethod
-    def from_basement(cls, floor: typing.Optional[element.Element]) -> typing.List['BasementFloor']:
+    def from_basement(cls, floor: typing.Optional[element.AnyElement]) -> typing.List['BasementFloor']:
         return [
             cls._from_data(floor, 'AddedToSlab', FloorType.SLAB)
             if floor is not None else cls._empty_floor(FloorType.SLAB)
         ]
 
     @classmethod
-    def from_crawlspace(cls, floor: typing.Optional[element.Element]) -> typing.List['BasementFloor']:
+    def from_crawlspace(cls, floor: typing.Optional[element.AnyElement]) -> typing.List['BasementFloor']:
         if floor is None:
             return [cls._empty_floor(FloorType.SLAB), cls._empty_floor(FloorType.FLOOR_ABOVE_CRAWLSPACE)]
 
@@ -191,7 +207,7 @@ class BasementFloor(_BasementFloor):
         ]
 
     @classmethod
-    def from_slab(cls, floor: typing.Optional[element.Element]) -> typing.List['BasementFloor']:
+    def from_slab(cls, floor: typing.Optional[element.AnyElement]) -> typing.List['BasementFloor']:
         return [
             cls._from_data(floor, 'AddedToSlab', FloorType.SLAB)
             if floor is not None else cls._empty_floor(FloorType.SLAB)
@@ -240,9 +256,14 @@ class BasementWall(_BasementWall):
         ),
     }
 
+    _SECTION_FIELDS: element.FieldSpecs = {
+        'nominal_insulation': ('@nominalRsi', float, True),
+        'effective_insulation': ('@rsi', float, True),
+    }
+
     @classmethod
     def _from_data(cls,
-                   wall: element.Element,
+                   wall: element.AnyElement,
                    wall_perimeter: float,
                    wall_height: float,
                    tag: WallType,
@@ -252,22 +273,21 @@ class BasementWall(_BasementWall):
         percentage = float(maybe_percentage) if maybe_percentage else backup_percentage
 
         try:
-            nominal_insulation = wall.get('@nominalRsi', float)
-            effective_insulation = wall.get('@rsi', float)
+            values = wall.get_many(cls._SECTION_FIELDS)
         except ElementGetValueError as exc:
             raise InvalidEmbeddedDataTypeError(BasementWall, 'Invalid insulation attributes') from exc
 
         return BasementWall(
             wall_type=tag,
-            nominal_insulation=insulation.Insulation(nominal_insulation),
-            effective_insulation=insulation.Insulation(effective_insulation),
+            nominal_insulation=insulation.Insulation(values['nominal_insulation']),
+            effective_insulation=insulation.Insulation(values['effective_insulation']),
             composite_percentage=percentage,
             wall_area=area.Area(wall_perimeter * wall_height * (percentage / 100))
         )
 
 
     @classmethod
-    def from_basement(cls, wall: element.Element, wall_perimeter: float) -> typing.List['BasementWall']:
+    def from_basement(cls, wall: element.AnyElement, wall_perimeter: float) -> typing.List['BasementWall']:
         interior_wall_sections = wall.xpath('Construction/InteriorAddedInsulation/Composite/Section')
         exterior_wall_sections = wall.xpath('Construction/ExteriorAddedInsulation/Composite/Section')
         pony_wall_sections = wall.xpath('Construction/PonyWallType/Composite/Section')
@@ -314,7 +334,7 @@ class BasementWall(_BasementWall):
         return walls
 
     @classmethod
-    def from_crawlspace(cls, wall: element.Element, wall_perimeter: float) -> typing.List['BasementWall']:
+    def from_crawlspace(cls, wall: element.AnyElement, wall_perimeter: float) -> typing.List['BasementWall']:
         wall_sections = wall.xpath('Construction/Type/Composite/Section')
 
         try:
@@ -395,7 +415,8 @@ class Basement(_Basement):
     }
 
     @classmethod
-    def from_data(cls, basement: element.Element) -> 'Basement':
+    def from_data(cls, basement: element.ElementData) -> 'Basement':
+        basement = element.ensure_element(basement)
         foundation_type = cls._derive_foundation_type(basement.tag)
         if foundation_type is FoundationType.UNKNOWN:
             raise InvalidEmbeddedDataTypeError(Basement, f'Invalid foundation type: {basement.tag}')
@@ -18,21 +18,28 @@ class _Ceiling(typing.NamedTuple):
 
 class Ceiling(_Ceiling):
 
+    _VALUE_FIELDS: element.FieldSpecs = {
+        'nominal_insulation': ('Construction/CeilingType/@nominalInsulation', float, True),
+        'effective_insulation': ('Construction/CeilingType/@rValue', float, True),
+        'area': ('Measurements/@area', float, True),
+        'length': ('Measurements/@length', float, True),
+    }
+
     @classmethod
-    def from_data(cls, ceiling: element.Element) -> 'Ceiling':
+    def from_data(cls, ceiling: element.ElementData) -> 'Ceiling':
+        ceiling = element.ensure_element(ceiling)
         try:
+            values = ceiling.get_many(cls._VALUE_FIELDS)
             return Ceiling(
                 label=ceiling.get_text('Label'),
                 ceiling_type=bilingual.Bilingual(
                     english=ceiling.get_text('Construction/Type/English'),
                     french=ceiling.get_text('Construction/Type/French'),
                 ),
-                nominal_insulation=insulation.Insulation(
-                    ceiling.get('Construction/CeilingType/@nominalInsulation', float)),
-                effective_insulation=insulation.Insulation(
-                    ceiling.get('Construction/CeilingType/@rValue', float)),
-                ceiling_area=area.Area(ceiling.get('Measurements/@area', float)),
-                ceiling_length=distance.Distance(ceiling.get('Measurements/@length', float)),
+                nominal_insulation=insulation.Insulation(values['nominal_insulation']),
+                effective_insulation=insulation.Insulation(values['effective_insulation']),
+                ceiling_area=area.Area(values['area']),
+                ceiling_length=distance.Distance(values['length']),
             )
         except (ElementGetValueError) as exc:
             raise InvalidEmbeddedDataTypeError(Ceiling) from exc
@@ -19,7 +19,8 @@ class _WallCode(typing.NamedTuple):
 class WallCode(_WallCode):
 
     @classmethod
-    def from_data(cls, wall_code: element.Element) -> 'WallCode':
+    def from_data(cls, wall_code: element.ElementData) -> 'WallCode':
+        wall_code = element.ensure_element(wall_code)
         structure_type_english = wall_code.findtext('Layers/StructureType/English')
         structure_type_french = wall_code.findtext('Layers/StructureType/French')
 
@@ -63,7 +64,8 @@ class _WindowCode(typing.NamedTuple):
 class WindowCode(_WindowCode):
 
     @classmethod
-    def from_data(cls, window_code: element.Element) -> 'WindowCode':
+    def from_data(cls, window_code: element.ElementData) -> 'WindowCode':
+        window_code = element.ensure_element(window_code)
 
         glazing_type_english = window_code.findtext('Layers/GlazingTypes/English')
         glazing_type_french = window_code.findtext('Layers/GlazingTypes/French')
@@ -126,7 +128,7 @@ class _Codes(typing.NamedTuple):
 class Codes(_Codes):
 
     @classmethod
-    def from_data(cls, codes: typing.Dict[str, typing.List[element.Element]]) -> 'Codes':
+    def from_data(cls, codes: typing.Dict[str, typing.List[element.ElementData]]) -> 'Codes':
         wall_code_list = [WallCode.from_data(wall_code) for wall_code in codes['wall']]
         window_code_list = [WindowCode.from_data(window_code) for window_code in codes['window']]
 
@@ -18,18 +18,26 @@ class _Door(typing.NamedTuple):
 class Door(_Door):
     _RSI_MULTIPLIER = 5.678263337
 
+    _VALUE_FIELDS: element.FieldSpecs = {
+        'insulation': ('Construction/Type/@value', float, True),
+        'height': ('Measurements/@height', float, True),
+        'width': ('Measurements/@width', float, True),
+    }
+
     @classmethod
-    def from_data(cls, door: element.Element) -> 'Door':
+    def from_data(cls, door: element.ElementData) -> 'Door':
+        door = element.ensure_element(door)
         try:
+            values = door.get_many(cls._VALUE_FIELDS)
             return Door(
                 label=door.get_text('Label'),
                 door_type=bilingual.Bilingual(
                     english=door.get_text('Construction/Type/English'),
                     french=door.get_text('Construction/Type/French'),
                 ),
-                door_insulation=insulation.Insulation(door.get('Construction/Type/@value', float)),
-                height=distance.Distance(door.get('Measurements/@height', float)),
-                width=distance.Distance(door.get('Measurements/@width', float)),
+                door_insulation=insulation.Insulation(values['insulation']),
+                height=distance.Distance(values['height']),
+                width=distance.Distance(values['width']),
             )
         except (ElementGetValueError) as exc:
             raise InvalidEmbeddedDataTypeError(Door) from exc
@@ -16,15 +16,24 @@ class _Floor(typing.NamedTuple):
 
 class Floor(_Floor):
 
+    _VALUE_FIELDS: element.FieldSpecs = {
+        'nominal_insulation': ('Construction/Type/@nominalInsulation', float, True),
+        'effective_insulation': ('Construction/Type/@rValue', float, True),
+        'area': ('Measurements/@area', float, True),
+        'length': ('Measurements/@length', float, True),
+    }
+
     @classmethod
-    def from_data(cls, floor: element.Element) -> 'Floor':
+    def from_data(cls, floor: element.ElementData) -> 'Floor':
+        floor = element.ensure_element(floor)
         try:
+            values = floor.get_many(cls._VALUE_FIELDS)
             return Floor(
                 label=floor.get_text('Label'),
-                nominal_insulation=insulation.Insulation(floor.get('Construction/Type/@nominalInsulation', float)),
-                effective_insulation=insulation.Insulation(floor.get('Construction/Type/@rValue', float)),
-                floor_area=area.Area(floor.get('Measurements/@area', float)),
-                floor_length=distance.Distance(floor.get('Measurements/@length', float)),
+                nominal_insulation=insulation.Insulation(values['nominal_insulation']),
+                effective_insulation=insulation.Insulation(values['effective_insulation']),
+                floor_area=area.Area(values['area']),
+                floor_length=distance.Distance(values['length']),
             )
         except (ElementGetValueError) as exc:
             raise InvalidEmbeddedDataTypeError(Floor) from exc
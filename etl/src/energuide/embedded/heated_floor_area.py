@@ -12,7 +12,8 @@ class _HeatedFloorArea(typing.NamedTuple):
 class HeatedFloorArea(_HeatedFloorArea):
 
     @classmethod
-    def from_data(cls, heated_floor_area: element.Element) -> 'HeatedFloorArea':
+    def from_data(cls, heated_floor_area: element.ElementData) -> 'HeatedFloorArea':
+        heated_floor_area = element.ensure_element(heated_floor_area)
         try:
             return HeatedFloorArea(
                 area_above_grade=area.Area(float(heated_floor_area.attrib['aboveGrade'])),
@@ -79,7 +79,7 @@ class Heating(_Heating):
     }
 
     @classmethod
-    def _get_output_size(cls, node: element.Element) -> float:
+    def _get_output_size(cls, node: element.AnyElement) -> float:
         capacity_node = node.find('Type1/*/Specifications/OutputCapacity')
         assert capacity_node is not None
 
@@ -101,7 +101,7 @@ class Heating(_Heating):
         return capacity
 
     @classmethod
-    def _get_heating_type(cls, node: element.Element) -> HeatingType:
+    def _get_heating_type(cls, node: element.AnyElement) -> HeatingType:
         candidates = [candidate.tag for candidate in node.xpath('Type1/*')]
         heating_type: typing.Optional[HeatingType] = None
         for candidate in candidates:
@@ -114,7 +114,7 @@ class Heating(_Heating):
         return heating_type
 
     @classmethod
-    def _get_energy_source(cls, node: element.Element) -> EnergySource:
+    def _get_energy_source(cls, node: element.AnyElement) -> EnergySource:
         try:
             code = node.get('Type1/*/Equipment/EnergySource/@code', int)
         except ElementGetValueError as exc:
@@ -127,13 +127,13 @@ class Heating(_Heating):
         return energy_source
 
     @classmethod
-    def _get_equipment_type(cls, node: element.Element) -> bilingual.Bilingual:
+    def _get_equipment_type(cls, node: element.AnyElement) -> bilingual.Bilingual:
         english_text = node.get_text('Type1/*/Equipment/EquipmentType/English')
         french_text = node.get_text('Type1/*/Equipment/EquipmentType/French')
         return bilingual.Bilingual(english=english_text, french=french_text)
 
     @staticmethod
-    def _get_steady_state(node: element.Element) -> str:
+    def _get_steady_state(node: element.AnyElement) -> str:
         try:
             steady_state_value = node.get('Type1/*/Specifications/@isSteadyState', str)
         except ElementGetValueError as exc:
@@ -142,7 +142,8 @@ class Heating(_Heating):
         return 'Steady State' if steady_state_value == 'true' else 'AFUE'
 
     @classmethod
-    def from_data(cls, node: element.Element) -> 'Heating':
+    def from_data(cls, node: element.ElementData) -> 'Heating':
+        node = element.ensure_element(node)
         try:
             label = node.get_text('Label')
             efficiency = node.get('Type1/*/Specifications/@efficiency', float)
@@ -11,7 +11,8 @@ class _Upgrade(typing.NamedTuple):
 class Upgrade(_Upgrade):
 
     @classmethod
-    def from_data(cls, setting: element.Element) -> 'Upgrade':
+    def from_data(cls, setting: element.ElementData) -> 'Upgrade':
+        setting = element.ensure_element(setting)
         return Upgrade(
             upgrade_type=setting.tag,
             cost=int(setting.attrib['cost']),
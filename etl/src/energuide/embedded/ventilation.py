@@ -59,7 +59,8 @@ class Ventilation(_Ventilation):
         return VentilationType.NOT_ENERGY_STAR_NOT_INSTITUTE_CERTIFIED
 
     @classmethod
-    def from_data(cls, ventilation: element.Element) -> 'Ventilation':
+    def from_data(cls, ventilation: element.ElementData) -> 'Ventilation':
+        ventilation = element.ensure_element(ventilation)
         try:
             energy_star = ventilation.attrib['isEnergyStar'] == 'true'
             institute_certified = ventilation.attrib['isHomeVentilatingInstituteCertified'] == 'true'
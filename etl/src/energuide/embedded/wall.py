@@ -23,22 +23,31 @@ class Wall(_Wall):
         (code.WallCodeTag.COMPONENT_TYPE_SIZE, 'componentTypeSize')
     ]
 
+    _VALUE_FIELDS: element.FieldSpecs = {
+        'nominal_insulation': ('Construction/Type/@nominalInsulation', float, True),
+        'effective_insulation': ('Construction/Type/@rValue', float, True),
+        'perimeter': ('Measurements/@perimeter', float, True),
+        'height': ('Measurements/@height', float, True),
+    }
+
     @classmethod
     def from_data(cls,
-                  wall: element.Element,
+                  wall: element.ElementData,
                   wall_codes: typing.Dict[str, code.WallCode]) -> 'Wall':
+        wall = element.ensure_element(wall)
 
         code_id = wall.xpath('Construction/Type/@idref')
         wall_code = wall_codes[code_id[0]] if code_id else None
 
         try:
+            values = wall.get_many(cls._VALUE_FIELDS)
             return Wall(
                 label=wall.get_text('Label'),
                 wall_code=wall_code,
-                nominal_insulation=insulation.Insulation(wall.get('Construction/Type/@nominalInsulation', float)),
-                effective_insulation=insulation.Insulation(wall.get('Construction/Type/@rValue', float)),
-                perimeter=distance.Distance(wall.get('Measurements/@perimeter', float)),
-                height=distance.Distance(wall.get('Measurements/@height', float)),
+                nominal_insulation=insulation.Insulation(values['nominal_insulation']),
+                effective_insulation=insulation.Insulation(values['effective_insulation']),
+                perimeter=distance.Distance(values['perimeter']),
+                height=distance.Distance(values['height']),
             )
         except (ElementGetValueError) as exc:
             raise InvalidEmbeddedDataTypeError(Wall) from exc
@@ -279,7 +279,7 @@ class WaterHeating(_WaterHeating):
     }
 
     @classmethod
-    def _from_data(cls, water_heating: element.Element) -> 'WaterHeating':
+    def _from_data(cls, water_heating: element.AnyElement) -> 'WaterHeating':
         drain_water_efficiency: typing.Optional[float] = None
         if water_heating.get('@hasDrainWaterHeatRecovery', str) == 'true':
             drain_water_efficiency = water_heating.get('DrainWaterHeatRecovery/@effectivenessAt9.5', float)
@@ -310,7 +310,8 @@ class WaterHeating(_WaterHeating):
         )
 
     @classmethod
-    def from_data(cls, water_heating: element.Element) -> typing.List['WaterHeating']:
+    def from_data(cls, water_heating: element.ElementData) -> typing.List['WaterHeating']:
+        water_heating = element.ensure_element(water_heating)
         water_heatings = water_heating.xpath("*[self::Primary or self::Secondary]")
 
         return [cls._from_data(heater) for heater in water_heatings]
@@ -20,6 +20,12 @@ class _Window(typing.NamedTuple):
 
 class Window(_Window):
 
+    _VALUE_FIELDS: element.FieldSpecs = {
+        'insulation': ('Construction/Type/@rValue', float, True),
+        'width': ('Measurements/@width', float, True),
+        'height': ('Measurements/@height', float, True),
+    }
+
     _CODE_TAG_TRANSLATIONS = [
         (code.WindowCodeTag.GLAZING_TYPE, 'glazingTypes'),
         (code.WindowCodeTag.COATING_TINTS, 'coatingsTints'),
@@ -31,19 +37,21 @@ class Window(_Window):
 
     @classmethod
     def from_data(cls,
-                  window: element.Element,
+                  window: element.ElementData,
                   window_codes: typing.Dict[str, code.WindowCode]) -> 'Window':
+        window = element.ensure_element(window)
 
         code_id = window.xpath('Construction/Type/@idref')
         window_code = window_codes[code_id[0]] if code_id else None
 
         try:
+            values = window.get_many(cls._VALUE_FIELDS)
             return Window(
                 label=window.get_text('Label'),
                 window_code=window_code,
-                window_insulation=insulation.Insulation(window.get('Construction/Type/@rValue', float)),
-                width=distance.Distance(window.get('Measurements/@width', float) / _MILLIMETRES_TO_METRES),
-                height=distance.Distance(window.get('Measurements/@height', float) / _MILLIMETRES_TO_METRES),
+                window_insulation=insulation.Insulation(values['insulation']),
+                width=distance.Distance(values['width'] / _MILLIMETRES_TO_METRES),
+                height=distance.Distance(values['height'] / _MILLIMETRES_TO_METRES),
             )
         except (ElementGetValueError) as exc:
             raise InvalidEmbeddedDataTypeError(Window) from exc
@@ -1,13 +1,22 @@
+import collections
+import contextlib
 import csv
+import gzip
+import heapq
+import io
+import itertools
 import json
+import os
 import typing
 import sys
+import tempfile
 import zipfile
-import cerberus
+from concurrent import futures
 from tqdm import tqdm
 from energuide import element
 from energuide import logger
 from energuide import snippets
+from energuide import validator
 from energuide.exceptions import InvalidInputDataError, EnerguideError
 
 
@@ -35,6 +44,12 @@ for field in NULLABLE_FIELDS:
 
 _WINDOWS_LONG_SIZE = (2 ** 31) - 1
 
+BATCH_SIZE = 100
+
+OUTPUT_FORMATS = ['zip', 'jsonl.gz']
+
+SORT_RUN_SIZE = 10000
+
 
 def _empty_to_none(row: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
     for key, value in row.items():
@@ -43,11 +58,31 @@ def _empty_to_none(row: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing
     return row
 
 
-def _validated(row: typing.Dict[str, typing.Any], validator: cerberus.Validator) -> typing.Dict[str, typing.Any]:
-    if not validator.validate(row):
-        error_keys = ', '.join(validator.errors.keys())
+def _validated(row: typing.Dict[str, typing.Any], checker: validator.CompiledValidator) -> typing.Dict[str, typing.Any]:
+    if not checker.validate(row):
+        error_keys = ', '.join(checker.errors.keys())
         raise InvalidInputDataError(f'Validator failed on keys: {error_keys} for {row.get("BUILDER")}')
-    return validator.document
+    return checker.document
+
+
+class _ProgressReader(io.RawIOBase):
+
+    def __init__(self, raw_file: io.FileIO, progress: tqdm) -> None:
+        super().__init__()
+        self._raw_file = raw_file
+        self._progress = progress
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: typing.Any) -> int:
+        count = self._raw_file.readinto(buffer)
+        self._progress.update(count)
+        return count
+
+    def close(self) -> None:
+        self._raw_file.close()
+        super().close()
 
 
 def _read_csv(filepath: str, show_progress: bool) -> typing.Iterator[typing.Dict[str, typing.Any]]:
@@ -56,14 +91,13 @@ def _read_csv(filepath: str, show_progress: bool) -> typing.Iterator[typing.Dict
     except OverflowError:
         csv.field_size_limit(_WINDOWS_LONG_SIZE)
 
-    with open(filepath, 'r', encoding='utf-8', newline='') as file:
-        total_lines = sum(1 for _ in file)
-
-    with tqdm(open(filepath, 'r', encoding='utf-8', newline=''),
-              total=total_lines, unit=' lines', disable=not show_progress) as file:
-        csv_reader = csv.DictReader(file)
-        for row in csv_reader:
-            yield row
+    total_bytes = os.stat(filepath).st_size
+    with tqdm(total=total_bytes, unit='B', unit_scale=True, disable=not show_progress) as progress:
+        raw_file = _ProgressReader(io.FileIO(filepath, 'r'), progress)
+        with io.TextIOWrapper(io.BufferedReader(raw_file), encoding='utf-8', newline='') as file:
+            csv_reader = csv.DictReader(file)
+            for row in csv_reader:
+                yield row
 
 
 def _safe_merge(data: typing.Dict[str, typing.Any],
@@ -74,61 +108,185 @@ def _safe_merge(data: typing.Dict[str, typing.Any],
     return data
 
 
-def _extract_snippets(row: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
-    doc = element.Element.from_string(row['RAW_XML'])
+def _snip_document(raw_xml: str, structured: bool) -> typing.Tuple[typing.Dict[str, typing.Any], ...]:
+    doc = element.Element.from_string(raw_xml)
     house_node = doc.xpath('House')
-    if house_node:
-        house_snippets = snippets.snip_house(house_node[0])
-        row = _safe_merge(row, house_snippets.to_dict())
-    else:
-        row = _safe_merge(row, snippets.HouseSnippet.EMPTY_SNIPPET)
-
     code_node = doc.xpath('Codes')
-    if code_node:
-        code_snippets = snippets.snip_codes(code_node[0])
-        row = _safe_merge(row, code_snippets.to_dict())
-    else:
-        row = _safe_merge(row, snippets.Codes.EMPTY_SNIPPET)
-
     upgrades_node = doc.xpath('EnergyUpgrades')
-    if upgrades_node:
-        energy_snippets = snippets.snip_energy_upgrades(upgrades_node[0])
-        row = _safe_merge(row, energy_snippets.to_dict())
+    return (
+        snippets.snip_house(house_node[0], structured).to_dict() if house_node else snippets.HouseSnippet.EMPTY_SNIPPET,
+        snippets.snip_codes(code_node[0], structured).to_dict() if code_node else snippets.Codes.EMPTY_SNIPPET,
+        snippets.snip_energy_upgrades(upgrades_node[0], structured).to_dict() if upgrades_node
+        else snippets.EnergyUpgradesSnippet.EMPTY_SNIPPET,
+        snippets.snip_other_data(doc).to_dict(),
+    )
+
+
+def _extract_snippets(row: typing.Dict[str, typing.Any],
+                      structured: bool = False,
+                      stream: bool = False) -> typing.Dict[str, typing.Any]:
+    """Add the snippets of RAW_XML to the row.
+
+    The DOM path is the faster one on typical files. `stream` snips in one pull-parser pass instead, which keeps
+    memory bounded on very large house files at some CPU cost.
+    """
+    if stream:
+        sections = tuple(section.to_dict() for section in snippets.snip_stream(row['RAW_XML'], structured))
     else:
-        row = _safe_merge(row, snippets.EnergyUpgradesSnippet.EMPTY_SNIPPET)
+        sections = _snip_document(row['RAW_XML'], structured)
 
-    tsv_fields = snippets.snip_other_data(doc)
-    row = _safe_merge(row, tsv_fields.to_dict())
+    for section in sections:
+        row = _safe_merge(row, section)
     return row
 
 
+def _extract_row(row: typing.Dict[str, typing.Any],
+                 checker: validator.CompiledValidator,
+                 structured: bool = False,
+                 stream: bool = False) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    try:
+        patched = _empty_to_none(row)
+        validated_data = _validated(patched, checker)
+        return _extract_snippets(validated_data, structured, stream)
+    except EnerguideError as ex:
+        LOGGER.error(f"Error extracting data from row {row.get('BUILDER', 'Unknown ID')}. Details: {ex}")
+        return None
+
+
+def _extract_batch(batch: typing.List[typing.Dict[str, typing.Any]],
+                   structured: bool = False,
+                   stream: bool = False) -> typing.List[typing.Optional[typing.Dict[str, typing.Any]]]:
+    checker = validator.CompiledValidator(INPUT_SCHEMA)
+    return [_extract_row(row, checker, structured, stream) for row in batch]
+
+
+def _batched(rows: typing.Iterable[typing.Dict[str, typing.Any]],
+             size: int) -> typing.Iterator[typing.List[typing.Dict[str, typing.Any]]]:
+    iterator = iter(rows)
+    batch = list(itertools.islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(iterator, size))
+
+
+def _extract_parallel(rows: typing.Iterable[typing.Dict[str, typing.Any]],
+                      workers: int,
+                      batch_size: int,
+                      structured: bool,
+                      stream: bool) -> typing.Iterator[typing.Optional[typing.Dict[str, typing.Any]]]:
+    pending: typing.Deque[futures.Future] = collections.deque()
+    with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in _batched(rows, batch_size):
+            pending.append(executor.submit(_extract_batch, batch, structured, stream))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
 def extract_data(input_path: str,
-                 show_progress: bool = False) -> typing.Iterator[typing.Optional[typing.Dict[str, typing.Any]]]:
-    validator = cerberus.Validator(INPUT_SCHEMA, purge_unknown=True)
+                 show_progress: bool = False,
+                 workers: int = 1,
+                 batch_size: int = BATCH_SIZE,
+                 structured: bool = False,
+                 stream: bool = False) -> typing.Iterator[typing.Optional[typing.Dict[str, typing.Any]]]:
     rows = _read_csv(input_path, show_progress)
 
-    for row in rows:
-        try:
-            patched = _empty_to_none(row)
-            validated_data = _validated(patched, validator)
-            result = _extract_snippets(validated_data)
-            yield result
-        except EnerguideError as ex:
-            LOGGER.error(f"Error extracting data from row {row.get('BUILDER', 'Unknown ID')}. Details: {ex}")
-            yield None
+    if workers > 1:
+        yield from _extract_parallel(rows, workers, batch_size, structured, stream)
+    else:
+        checker = validator.CompiledValidator(INPUT_SCHEMA)
+        for row in rows:
+            yield _extract_row(row, checker, structured, stream)
 
 
-def write_data(data: typing.Iterable[typing.Optional[typing.Dict[str, typing.Any]]],
+def _record_name(blob: typing.Optional[typing.Dict[str, typing.Any]]) -> typing.Optional[str]:
+    if blob is None or not blob.get('BUILDER'):
+        return None
+    blob_id: str = blob['BUILDER']
+    eval_id: str = blob['EVAL_ID']
+    return f'{eval_id}-{blob_id}'
+
+
+def _write_zip(data: typing.Iterable[typing.Optional[typing.Dict[str, typing.Any]]],
                output_path: str) -> typing.Tuple[int, int]:
     records_written, records_failed = 0, 0
     with zipfile.ZipFile(output_path, mode='w', compression=zipfile.ZIP_DEFLATED) as output_zip:
         for blob in data:
-            if blob is None or not blob.get('BUILDER'):
+            name = _record_name(blob)
+            if name is None:
+                records_failed += 1
+            else:
+                output_zip.writestr(name, json.dumps(blob))
+                records_written += 1
+
+    return records_written, records_failed
+
+
+def _read_run(run_file: typing.TextIO) -> typing.Iterator[typing.Tuple[str, str]]:
+    for run_line in run_file:
+        key, line = run_line.rstrip('\n').split('\t', 1)
+        yield key, line
+
+
+def _sorted_lines(keyed_lines: typing.Iterable[typing.Tuple[str, str]], run_size: int) -> typing.Iterator[str]:
+    """Sort (key, line) pairs by key, holding at most `run_size` lines in memory.
+
+    Full runs are sorted and spilled to temporary files, which are then merged.
+    """
+    with contextlib.ExitStack() as stack:
+        runs: typing.List[typing.Iterator[typing.Tuple[str, str]]] = []
+        buffer: typing.List[typing.Tuple[str, str]] = []
+
+        def spill() -> None:
+            buffer.sort()
+            run_file = stack.enter_context(tempfile.TemporaryFile('w+', encoding='utf-8'))
+            run_file.writelines(f'{key}\t{line}\n' for key, line in buffer)
+            run_file.seek(0)
+            runs.append(_read_run(run_file))
+            buffer.clear()
+
+        for keyed_line in keyed_lines:
+            buffer.append(keyed_line)
+            if len(buffer) >= run_size:
+                spill()
+
+        buffer.sort()
+        runs.append(iter(buffer))
+        for _, line in heapq.merge(*runs):
+            yield line
+
+
+def _write_jsonl_gz(data: typing.Iterable[typing.Optional[typing.Dict[str, typing.Any]]],
+                    output_path: str,
+                    run_size: int) -> typing.Tuple[int, int]:
+    records_written, records_failed = 0, 0
+
+    def keyed_lines() -> typing.Iterator[typing.Tuple[str, str]]:
+        nonlocal records_written, records_failed
+        for blob in data:
+            name = _record_name(blob)
+            if name is None:
                 records_failed += 1
             else:
-                blob_id: str = blob['BUILDER']
-                eval_id: str = blob['EVAL_ID']
-                output_zip.writestr(f'{eval_id}-{blob_id}', json.dumps(blob))
                 records_written += 1
+                yield name, json.dumps(dict(typing.cast(typing.Dict[str, typing.Any], blob), jsonFileName=name))
+
+    with gzip.open(output_path, 'wt', encoding='utf-8', compresslevel=6) as output_file:
+        for line in _sorted_lines(keyed_lines(), run_size):
+            output_file.write(line)
+            output_file.write('\n')
 
     return records_written, records_failed
+
+
+def write_data(data: typing.Iterable[typing.Optional[typing.Dict[str, typing.Any]]],
+               output_path: str,
+               output_format: str = 'zip',
+               run_size: int = SORT_RUN_SIZE) -> typing.Tuple[int, int]:
+    if output_format == 'zip':
+        return _write_zip(data, output_path)
+    if output_format == 'jsonl.gz':
+        return _write_jsonl_gz(data, output_path, run_size)
+    raise ValueError(f'Unknown output format: {output_format}')
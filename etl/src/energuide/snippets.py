@@ -1,11 +1,17 @@
+import functools
 import typing
+from lxml import etree
 from energuide import element
 from energuide.exceptions import ElementGetValueError
 
 
+# a component is snipped either as its XML string or in the dict form read by element.StructuredElement
+Snippet = typing.Union[str, typing.Dict[str, typing.Any]]
+
+
 class _Codes(typing.NamedTuple):
-    wall: typing.List[str]
-    window: typing.List[str]
+    wall: typing.List[Snippet]
+    window: typing.List[Snippet]
 
 
 class Codes(_Codes):
@@ -17,7 +23,7 @@ class Codes(_Codes):
         }
     }
 
-    def to_dict(self) -> typing.Dict[str, typing.Dict[str, typing.List[str]]]:
+    def to_dict(self) -> typing.Dict[str, typing.Dict[str, typing.List[Snippet]]]:
         return {
             'codes': {
                 'wall': self.wall,
@@ -27,18 +33,18 @@ class Codes(_Codes):
 
 
 class _HouseSnippet(typing.NamedTuple):
-    ceilings: typing.List[str]
-    floors: typing.List[str]
-    walls: typing.List[str]
-    doors: typing.List[str]
-    windows: typing.List[str]
-    heated_floor_area: typing.Optional[str]
-    heating_cooling: typing.Optional[str]
-    ventilation: typing.List[str]
-    water_heating: typing.Optional[str]
-    basements: typing.List[str]
-    crawlspaces: typing.List[str]
-    slabs: typing.List[str]
+    ceilings: typing.List[Snippet]
+    floors: typing.List[Snippet]
+    walls: typing.List[Snippet]
+    doors: typing.List[Snippet]
+    windows: typing.List[Snippet]
+    heated_floor_area: typing.Optional[Snippet]
+    heating_cooling: typing.Optional[Snippet]
+    ventilation: typing.List[Snippet]
+    water_heating: typing.Optional[Snippet]
+    basements: typing.List[Snippet]
+    crawlspaces: typing.List[Snippet]
+    slabs: typing.List[Snippet]
 
 
 class HouseSnippet(_HouseSnippet):
@@ -76,7 +82,7 @@ class HouseSnippet(_HouseSnippet):
 
 
 class _EnergyUpgradesSnippet(typing.NamedTuple):
-    upgrades: typing.List[str]
+    upgrades: typing.List[Snippet]
 
 
 class EnergyUpgradesSnippet(_EnergyUpgradesSnippet):
@@ -126,54 +132,240 @@ def snip_other_data(root: element.Element) -> OtherDataSnippet:
     )
 
 
-def snip_house(house: element.Element) -> HouseSnippet:
-    ceilings = _extract_nodes(house, 'Components/Ceiling')
-    floors = _extract_nodes(house, 'Components/Floor')
-    walls = _extract_nodes(house, 'Components/Wall')
-    doors = _extract_nodes(house, 'Components//Components/Door')
-    windows = _extract_nodes(house, 'Components//Components/Window')
-    heated_floor_area = _extract_nodes(house, 'Specifications/HeatedFloorArea')
-    heating_cooling = _extract_nodes(house, 'HeatingCooling')
-    heating_cooling_string = heating_cooling[0].to_string() if heating_cooling else None
-    ventilation = _extract_nodes(house, 'Ventilation/WholeHouseVentilatorList/Hrv')
-    ventilation_strings = [hrv.to_string() for hrv in ventilation]
+def _snip(node: element.Element, structured: bool) -> Snippet:
+    return node.to_structured() if structured else node.to_string()
+
 
-    water_heating = _extract_nodes(house, 'Components/HotWater')
-    water_heating_string = water_heating[0].to_string() if water_heating else None
+def _snip_all(nodes: typing.List[element.Element], structured: bool) -> typing.List[Snippet]:
+    return [_snip(node, structured) for node in nodes]
 
-    basements = _extract_nodes(house, 'Components/Basement')
-    crawlspaces = _extract_nodes(house, 'Components/Crawlspace')
-    slabs = _extract_nodes(house, 'Components/Slab')
 
+def _snip_first(nodes: typing.List[element.Element], structured: bool) -> typing.Optional[Snippet]:
+    return _snip(nodes[0], structured) if nodes else None
+
+
+def snip_house(house: element.Element, structured: bool = False) -> HouseSnippet:
     return HouseSnippet(
-        ceilings=[node.to_string() for node in ceilings],
-        floors=[node.to_string() for node in floors],
-        walls=[node.to_string() for node in walls],
-        doors=[node.to_string() for node in doors],
-        windows=[node.to_string() for node in windows],
-        heated_floor_area=heated_floor_area[0].to_string() if heated_floor_area else None,
-        heating_cooling=heating_cooling_string,
-        ventilation=ventilation_strings,
-        water_heating=water_heating_string,
-        basements=[node.to_string() for node in basements],
-        crawlspaces=[node.to_string() for node in crawlspaces],
-        slabs=[node.to_string() for node in slabs],
+        ceilings=_snip_all(_extract_nodes(house, 'Components/Ceiling'), structured),
+        floors=_snip_all(_extract_nodes(house, 'Components/Floor'), structured),
+        walls=_snip_all(_extract_nodes(house, 'Components/Wall'), structured),
+        doors=_snip_all(_extract_nodes(house, 'Components//Components/Door'), structured),
+        windows=_snip_all(_extract_nodes(house, 'Components//Components/Window'), structured),
+        heated_floor_area=_snip_first(_extract_nodes(house, 'Specifications/HeatedFloorArea'), structured),
+        heating_cooling=_snip_first(_extract_nodes(house, 'HeatingCooling'), structured),
+        ventilation=_snip_all(_extract_nodes(house, 'Ventilation/WholeHouseVentilatorList/Hrv'), structured),
+        water_heating=_snip_first(_extract_nodes(house, 'Components/HotWater'), structured),
+        basements=_snip_all(_extract_nodes(house, 'Components/Basement'), structured),
+        crawlspaces=_snip_all(_extract_nodes(house, 'Components/Crawlspace'), structured),
+        slabs=_snip_all(_extract_nodes(house, 'Components/Slab'), structured),
     )
 
 
-def snip_codes(codes: element.Element) -> Codes:
-    wall_codes = codes.xpath('Wall/*/Code')
-    window_codes = codes.xpath('Window/*/Code')
-
+def snip_codes(codes: element.Element, structured: bool = False) -> Codes:
     return Codes(
-        wall=[node.to_string() for node in wall_codes],
-        window=[node.to_string() for node in window_codes],
+        wall=_snip_all(codes.xpath('Wall/*/Code'), structured),
+        window=_snip_all(codes.xpath('Window/*/Code'), structured),
     )
 
 
-def snip_energy_upgrades(energy_upgrades: element.Element) -> EnergyUpgradesSnippet:
-    upgrades = _extract_nodes(energy_upgrades, 'Settings/*')
-
+def snip_energy_upgrades(energy_upgrades: element.Element, structured: bool = False) -> EnergyUpgradesSnippet:
     return EnergyUpgradesSnippet(
-        upgrades=[upgrade.to_string() for upgrade in upgrades],
+        upgrades=_snip_all(_extract_nodes(energy_upgrades, 'Settings/*'), structured),
+    )
+
+
+_HOUSE_COMPONENT_FIELDS = {
+    'Ceiling': 'ceilings',
+    'Floor': 'floors',
+    'Wall': 'walls',
+    'HotWater': 'water_heating',
+    'Basement': 'basements',
+    'Crawlspace': 'crawlspaces',
+    'Slab': 'slabs',
+}
+
+_NESTED_COMPONENT_FIELDS = {
+    'Door': 'doors',
+    'Window': 'windows',
+}
+
+_FIRST_ONLY_SECTIONS = ('House', 'Codes', 'EnergyUpgrades')
+
+_POSTAL_CODE_PATH = ('ProgramInformation', 'Client', 'StreetAddress', 'PostalCode')
+
+_ERS_RATING_PATH = ('Program', 'Results', 'Tsv', 'ERSRating')
+
+_UPGRADE_SETTINGS_PATH = ('EnergyUpgrades', 'Settings')
+
+_STREAMED_TAGS = sorted({
+    *_HOUSE_COMPONENT_FIELDS, *_NESTED_COMPONENT_FIELDS, *_FIRST_ONLY_SECTIONS,
+    'HeatedFloorArea', 'HeatingCooling', 'Hrv', 'Code', 'Settings', 'PostalCode', 'ERSRating', 'Results',
+})
+
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _stream_field(path: typing.Tuple[str, ...]) -> typing.Optional[str]:
+    """Return the snippet field the element at `path` (tags below the root) belongs to, if any"""
+    depth = len(path)
+    top = path[0]
+    if top == 'House':
+        if depth == 3 and path[1] == 'Components' and path[2] in _HOUSE_COMPONENT_FIELDS:
+            return _HOUSE_COMPONENT_FIELDS[path[2]]
+        if depth >= 4 and path[1] == 'Components' and path[-2] == 'Components' \
+                and path[-1] in _NESTED_COMPONENT_FIELDS:
+            return _NESTED_COMPONENT_FIELDS[path[-1]]
+        if path == ('House', 'Specifications', 'HeatedFloorArea'):
+            return 'heated_floor_area'
+        if path == ('House', 'HeatingCooling'):
+            return 'heating_cooling'
+        if path == ('House', 'Ventilation', 'WholeHouseVentilatorList', 'Hrv'):
+            return 'ventilation'
+    elif top == 'Codes':
+        if depth == 4 and path[1] in ('Wall', 'Window') and path[3] == 'Code':
+            return path[1].lower()
+    return None
+
+
+def _protected(path: typing.Tuple[str, ...]) -> bool:
+    """Elements whose content is read only after their own end event, and so must not be cleared early"""
+    return path[:len(_POSTAL_CODE_PATH)] == _POSTAL_CODE_PATH[:len(path)] or \
+        (len(path) > len(_UPGRADE_SETTINGS_PATH) and path[:len(_UPGRADE_SETTINGS_PATH)] == _UPGRADE_SETTINGS_PATH)
+
+
+def _node_path(node: etree._Element) -> typing.List[etree._Element]:
+    """The ancestors of `node` below the document root, outermost first, including `node` itself"""
+    nodes = []
+    parent = node.getparent()
+    while parent is not None:
+        nodes.append(node)
+        node, parent = parent, parent.getparent()
+    nodes.reverse()
+    return nodes
+
+
+def _stream_events(data: str) -> typing.Iterator[typing.Tuple[str, etree._Element]]:
+    parser = etree.XMLPullParser(events=('start', 'end'), tag=_STREAMED_TAGS,
+                                 ns_clean=True, recover=True, encoding='utf-8')
+    encoded = data.encode('utf-8')
+    for offset in range(0, len(encoded), _STREAM_CHUNK_SIZE):
+        parser.feed(encoded[offset:offset + _STREAM_CHUNK_SIZE])
+        yield from parser.read_events()
+    root = parser.close()
+    yield from parser.read_events()
+    if root is None:
+        raise element.MalformedXmlError(f'Invalid XML fragment: {data}')
+
+
+def snip_stream(data: str,
+                structured: bool = False) -> typing.Tuple[HouseSnippet, Codes, EnergyUpgradesSnippet, OtherDataSnippet]:
+    """Snip a whole RAW_XML document in one streaming pass.
+
+    Produces the same snippets as running snip_house, snip_codes, snip_energy_upgrades and snip_other_data
+    over a fully parsed document. Each component is serialized as soon as the parser has moved past it, and
+    everything that is not part of a component still being read is cleared, so memory stays bounded by the
+    largest component or results section rather than by the whole document.
+
+    With `structured`, components are emitted in the dict form of element.to_structured instead of as XML
+    strings, so transform can read them without parsing XML again.
+    """
+    serialize: typing.Callable[[etree._Element], Snippet] = \
+        element.to_structured if structured else functools.partial(etree.tostring, encoding='unicode')
+    found: typing.Dict[str, typing.List[typing.Tuple[float, Snippet]]] = {}
+    finished_sections: typing.Set[str] = set()
+    postal_code: typing.Optional[str] = None
+    ers_rating: typing.Optional[str] = None
+
+    starts: typing.List[int] = []
+    pending: typing.Optional[typing.Tuple[etree._Element, str, int, bool]] = None
+
+    for position, (event, node) in enumerate(_stream_events(data)):
+        if pending is not None:
+            # a component's tail text is only complete once the parser has moved past it
+            pending_node, pending_field, pending_start, pending_nested = pending
+            found.setdefault(pending_field, []).append((pending_start, serialize(pending_node)))
+            if not pending_nested:
+                pending_node.clear()
+            pending = None
+
+        if event == 'start':
+            starts.append(position)
+            continue
+
+        start = starts.pop()
+        nodes = _node_path(node)
+        if not nodes:
+            continue
+
+        path = tuple(ancestor.tag for ancestor in nodes)
+        top = path[0]
+        first = top not in _FIRST_ONLY_SECTIONS or top not in finished_sections
+        field = _stream_field(path) if first else None
+        nested = any(_stream_field(path[:depth]) for depth in range(1, len(path))) if first else False
+
+        if field is not None:
+            pending = (node, field, start, nested)
+            continue
+
+        if path == _POSTAL_CODE_PATH:
+            if postal_code is None:
+                texts = node.xpath('text()')
+                postal_code = str(texts[0]) if texts else None
+        elif path == _ERS_RATING_PATH:
+            if ers_rating is None:
+                ers_rating = node.get('value')
+        elif path == _UPGRADE_SETTINGS_PATH and first:
+            upgrades = [upgrade for upgrade in node if isinstance(upgrade.tag, str)]
+            found.setdefault('upgrades', []).extend(
+                (start + index / len(upgrades), serialize(upgrade))
+                for index, upgrade in enumerate(upgrades)
+            )
+
+        if len(path) == 1:
+            finished_sections.add(top)
+        if not nested and not _protected(path):
+            node.clear()
+            while node.getprevious() is not None:
+                del node.getparent()[0]
+
+    if pending is not None:
+        pending_node, pending_field, pending_start, _ = pending
+        found.setdefault(pending_field, []).append((pending_start, serialize(pending_node)))
+
+    return _streamed_snippets(found, postal_code, ers_rating)
+
+
+def _streamed_snippets(found: typing.Dict[str, typing.List[typing.Tuple[float, Snippet]]],
+                       postal_code: typing.Optional[str],
+                       ers_rating: typing.Optional[str],
+                      ) -> typing.Tuple[HouseSnippet, Codes, EnergyUpgradesSnippet, OtherDataSnippet]:
+    """Assemble the snippets collected by snip_stream, each field in document order"""
+
+    def strings(field: str) -> typing.List[Snippet]:
+        return [snippet for _, snippet in sorted(found.get(field, []), key=lambda item: item[0])]
+
+    def single(field: str) -> typing.Optional[Snippet]:
+        values = strings(field)
+        return values[0] if values else None
+
+    house = HouseSnippet(
+        ceilings=strings('ceilings'),
+        floors=strings('floors'),
+        walls=strings('walls'),
+        doors=strings('doors'),
+        windows=strings('windows'),
+        heated_floor_area=single('heated_floor_area'),
+        heating_cooling=single('heating_cooling'),
+        ventilation=strings('ventilation'),
+        water_heating=single('water_heating'),
+        basements=strings('basements'),
+        crawlspaces=strings('crawlspaces'),
+        slabs=strings('slabs'),
+    )
+    codes = Codes(wall=strings('wall'), window=strings('window'))
+    upgrades = EnergyUpgradesSnippet(upgrades=strings('upgrades'))
+    other = OtherDataSnippet(
+        forward_sortation_area=postal_code[0:3] if postal_code else None,
+        ers_rating=ers_rating,
     )
+    return house, codes, upgrades, other
@@ -484,6 +484,20 @@ def test_crawlspace_from_data(
     assert output == sample_crawlspace
 
 
+def test_basement_from_structured_data(
+        sample_basement: basement.Basement,
+        sample_basement_element: element.Element) -> None:
+    output = basement.Basement.from_data(sample_basement_element.to_structured())
+    assert output == sample_basement
+
+
+def test_crawlspace_from_structured_data(
+        sample_crawlspace: basement.Basement,
+        sample_crawlspace_element: element.Element) -> None:
+    output = basement.Basement.from_data(sample_crawlspace_element.to_structured())
+    assert output == sample_crawlspace
+
+
 def test_slab_from_data(
         sample_slab: basement.Basement,
         sample_slab_element: element.Element) -> None:
@@ -105,6 +105,11 @@ def test_from_data(sample_raw: element.Element, sample: heating.Heating) -> None
     assert output == sample
 
 
+def test_from_structured_data(sample_raw: element.Element, sample: heating.Heating) -> None:
+    output = heating.Heating.from_data(sample_raw.to_structured())
+    assert output == sample
+
+
 @pytest.mark.parametrize("unit", ['btu/hr', 'btu/h'])
 def test_converts_btu(unit: str) -> None:
     specification_node = sample_specifications(capacity=1000.0, capacity_units=unit)
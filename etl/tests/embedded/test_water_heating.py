@@ -245,6 +245,11 @@ def test_from_data_ef(sample_ef: element.Element) -> None:
     assert output.efficiency_ef == 0.8217
 
 
+def test_from_structured_data(sample_ef: element.Element) -> None:
+    output = water_heating.WaterHeating.from_data(sample_ef.to_structured())
+    assert output == water_heating.WaterHeating.from_data(sample_ef)
+
+
 def test_from_data_percentage(sample_percentage: element.Element) -> None:
     output = water_heating.WaterHeating.from_data(sample_percentage)[0]
     assert output.water_heater_type == water_heating.WaterHeaterType.ELECTRICITY_CONVENTIONAL_TANK
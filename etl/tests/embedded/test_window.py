@@ -95,6 +95,13 @@ def test_from_data(raw_sample: element.Element,
     assert output == sample
 
 
+def test_from_structured_data(raw_sample: element.Element,
+                              sample_window_code: typing.Dict[str, code.WindowCode],
+                              sample: window.Window) -> None:
+    output = window.Window.from_data(raw_sample.to_structured(), sample_window_code)
+    assert output == sample
+
+
 @pytest.mark.parametrize("bad_xml", BAD_XML_DATA)
 def test_bad_data(bad_xml: str) -> None:
     window_node = element.Element.from_string(bad_xml)
@@ -104,6 +111,15 @@ def test_bad_data(bad_xml: str) -> None:
     assert excinfo.value.data_class == window.Window
 
 
+@pytest.mark.parametrize("bad_xml", BAD_XML_DATA)
+def test_bad_structured_data(bad_xml: str) -> None:
+    window_data = element.Element.from_string(bad_xml).to_structured()
+    with pytest.raises(InvalidEmbeddedDataTypeError) as excinfo:
+        window.Window.from_data(window_data, {})
+
+    assert excinfo.value.data_class == window.Window
+
+
 def test_from_data_missing_codes() -> None:
     doc = """
     <Window>
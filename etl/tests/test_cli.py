@@ -1,4 +1,5 @@
 import csv
+import gzip
 import os
 import typing
 import zipfile
@@ -6,6 +7,7 @@ import py
 import _pytest
 from click import testing  # type: ignore
 import pymongo
+import bson
 import pytest
 from energuide import cli
 
@@ -97,6 +99,100 @@ def test_load_filename(energuide_zip_fixture: str,
     assert coll.count() == 7
 
 
+def test_load_transform_workers(energuide_zip_fixture: str,
+                                database_name: str,
+                                collection: str,
+                                mongo_client: pymongo.MongoClient) -> None:
+    runner = testing.CliRunner()
+    result = runner.invoke(cli.main, args=[
+        'load',
+        '--db_name', database_name,
+        '--filename', energuide_zip_fixture,
+        '--transform-workers', '2',
+    ])
+
+    assert result.exit_code == 0
+
+    coll = mongo_client.get_database(database_name).get_collection(collection)
+    assert coll.count() == 7
+
+
+def test_load_batch_size(energuide_zip_fixture: str,
+                         database_name: str,
+                         collection: str,
+                         mongo_client: pymongo.MongoClient) -> None:
+    runner = testing.CliRunner()
+    result = runner.invoke(cli.main, args=[
+        'load',
+        '--db_name', database_name,
+        '--filename', energuide_zip_fixture,
+        '--no-update',
+        '--batch-size', '3',
+    ])
+
+    assert result.exit_code == 0
+
+    coll = mongo_client.get_database(database_name).get_collection(collection)
+    assert coll.count() == 7
+
+
+
+def test_load_outfile(energuide_zip_fixture: str,
+                      tmpdir: py._path.local.LocalPath,
+                      database_name: str,
+                      collection: str,
+                      mongo_client: pymongo.MongoClient) -> None:
+    outfile = str(tmpdir.join('dwellings.bson.gz'))
+    runner = testing.CliRunner()
+    result = runner.invoke(cli.main, args=[
+        'load',
+        '--db_name', database_name,
+        '--filename', energuide_zip_fixture,
+        '--outfile', outfile,
+        '--compress',
+    ])
+
+    assert result.exit_code == 0
+
+    with gzip.open(outfile) as output:
+        assert len(bson.decode_all(output.read())) == 7
+    assert mongo_client.get_database(database_name).get_collection(collection).count() == 0
+
+def test_load_staged_rollback(energuide_zip_fixture: str,
+                              database_name: str,
+                              collection: str,
+                              mongo_client: pymongo.MongoClient) -> None:
+    runner = testing.CliRunner()
+    load_args = ['load', '--db_name', database_name, '--filename', energuide_zip_fixture, '--no-update']
+    assert runner.invoke(cli.main, args=load_args).exit_code == 0
+    assert runner.invoke(cli.main, args=load_args + ['--staged']).exit_code == 0
+
+    database = mongo_client.get_database(database_name)
+    assert database.get_collection(collection + '_previous').count() == 7
+
+    result = runner.invoke(cli.main, args=['rollback', '--db_name', database_name])
+    assert result.exit_code == 0
+    assert database.get_collection(collection).count() == 7
+    assert collection + '_previous' not in database.collection_names()
+
+
+@pytest.mark.parametrize('args', [
+    ['--staged'],
+    ['--defer-indexes'],
+    ['--no-update', '--staged', '--outfile', 'dwellings.bson'],
+    ['--no-update', '--defer-indexes', '--outfile', 'dwellings.bson'],
+])
+def test_load_rejects_ignored_options(energuide_zip_fixture: str,
+                                      database_name: str,
+                                      args: typing.List[str]) -> None:
+    runner = testing.CliRunner()
+    result = runner.invoke(cli.main, args=['load', '--db_name', database_name, '--filename', energuide_zip_fixture]
+                           + args)
+
+    assert result.exit_code == 2
+    assert 'Error' in result.output
+
+
 @pytest.mark.usefixtures('populated_azure_emulator')
 def test_load_azure(database_name: str,
                     collection: str,
@@ -156,6 +252,38 @@ def test_extract_valid(valid_filepath: str, tmpdir: py._path.local.LocalPath) ->
         assert len(output.namelist()) == 1
 
 
+def test_extract_workers(valid_filepath: str, tmpdir: py._path.local.LocalPath) -> None:
+    outfile = f'{tmpdir}/output.zip'
+    runner = testing.CliRunner()
+    result = runner.invoke(cli.main, args=[
+        'extract',
+        '--infile', valid_filepath,
+        '--outfile', outfile,
+        '--workers', '2',
+    ])
+
+    assert result.exit_code == 0
+
+    with zipfile.ZipFile(outfile, 'r') as output:
+        assert len(output.namelist()) == 1
+
+
+def test_extract_jsonl_gz(valid_filepath: str, tmpdir: py._path.local.LocalPath) -> None:
+    outfile = f'{tmpdir}/output.jsonl.gz'
+    runner = testing.CliRunner()
+    result = runner.invoke(cli.main, args=[
+        'extract',
+        '--infile', valid_filepath,
+        '--outfile', outfile,
+        '--format', 'jsonl.gz',
+    ])
+
+    assert result.exit_code == 0
+
+    with gzip.open(outfile, 'rt') as output:
+        assert len(output.readlines()) == 1
+
+
 def test_extract_invalid(invalid_filepath: str, tmpdir: py._path.local.LocalPath) -> None:
     outfile = f'{tmpdir}/output.zip'
     runner = testing.CliRunner()
@@ -1,7 +1,13 @@
+import logging
 import typing
+import _pytest
+import _pytest.logging
 import pymongo
+import pymongo.errors
 import pytest
+from bson import raw_bson
 from energuide import database
+from energuide import exceptions
 from energuide import dwelling
 
 
@@ -62,3 +68,348 @@ def test_load_update(database_coordinates: database.DatabaseCoordinates,
     )
     assert mongo_client[database_name][collection].count() == 4
     assert mongo_client[database_name][collection].find_one({'houseId': 1})['yearBuilt'] == 2001
+
+
+@pytest.mark.parametrize('size, expected', [
+    (2, [[0, 1], [2, 3], [4]]),
+    (5, [[0, 1, 2, 3, 4]]),
+    (10, [[0, 1, 2, 3, 4]]),
+])
+def test_chunk(size: int, expected: typing.List[typing.List[int]]) -> None:
+    assert list(database._chunk(range(5), size)) == expected
+    assert list(database._chunk([], size)) == []
+
+
+@pytest.mark.parametrize('update', [True, False])
+def test_load_batch_size(database_coordinates: database.DatabaseCoordinates,
+                         mongo_client: pymongo.MongoClient,
+                         database_name: str,
+                         collection: str,
+                         load_data: typing.List[dwelling.Dwelling],
+                         update: bool):
+    database.load(
+        coords=database_coordinates,
+        database_name=database_name,
+        collection_name=collection,
+        data=load_data,
+        update=update,
+        batch_size=2
+    )
+    assert mongo_client[database_name][collection].count() == 3
+    assert mongo_client[database_name][collection].find_one({'houseId': 3})['yearBuilt'] == 2000
+
+
+def test_load_no_update_inserts(database_coordinates: database.DatabaseCoordinates,
+                                mongo_client: pymongo.MongoClient,
+                                database_name: str,
+                                collection: str,
+                                load_data: typing.List[dwelling.Dwelling],
+                                monkeypatch: _pytest.monkeypatch.MonkeyPatch):
+
+    def no_upserts(*args, **kwargs) -> None:
+        raise AssertionError('ReplaceOne called')
+
+    monkeypatch.setattr(pymongo, 'ReplaceOne', no_upserts)
+    database.load(
+        coords=database_coordinates,
+        database_name=database_name,
+        collection_name=collection,
+        data=load_data,
+        update=False
+    )
+    assert mongo_client[database_name][collection].count() == 3
+
+
+@pytest.mark.parametrize('update', [True, False])
+def test_load_concurrent_writers(database_coordinates: database.DatabaseCoordinates,
+                                 mongo_client: pymongo.MongoClient,
+                                 database_name: str,
+                                 collection: str,
+                                 caplog: _pytest.logging.LogCaptureFixture,
+                                 update: bool):
+    data = ({'houseId': house_id, 'yearBuilt': 2000} for house_id in range(50))
+    with caplog.at_level(logging.INFO):
+        database.load(
+            coords=database_coordinates,
+            database_name=database_name,
+            collection_name=collection,
+            data=data,
+            update=update,
+            batch_size=4,
+            writers=3
+        )
+    assert mongo_client[database_name][collection].count() == 50
+    assert sorted(mongo_client[database_name][collection].distinct('houseId')) == list(range(50))
+    assert '14 batches' in caplog.text
+    assert 'docs/s' in caplog.text
+
+
+def test_load_concurrent_writers_keep_last_write(database_coordinates: database.DatabaseCoordinates,
+                                                 mongo_client: pymongo.MongoClient,
+                                                 database_name: str,
+                                                 collection: str):
+    data = [{'houseId': house_id, 'yearBuilt': year} for year in range(2000, 2010) for house_id in range(5)]
+    summary = database.load(
+        coords=database_coordinates,
+        database_name=database_name,
+        collection_name=collection,
+        data=data,
+        batch_size=2,
+        writers=3
+    )
+    assert summary.failed == 0
+    stored = mongo_client[database_name][collection].find()
+    assert {row['houseId']: row['yearBuilt'] for row in stored} == {house_id: 2009 for house_id in range(5)}
+
+
+def test_partitioned_chunks() -> None:
+    data = [{'houseId': order % 4, 'order': order} for order in range(12)]
+    chunks = [(partition, typing.cast(typing.List[typing.Dict[str, typing.Any]], chunk))
+              for partition, chunk in database._partitioned_chunks(data, 2, 2)]
+
+    assert sorted(row['order'] for _, chunk in chunks for row in chunk) == list(range(12))
+    assert all(len(chunk) <= 2 for _, chunk in chunks)
+    for house_id in range(4):
+        partitions = {partition for partition, chunk in chunks for row in chunk if row['houseId'] == house_id}
+        orders = [row['order'] for _, chunk in chunks for row in chunk if row['houseId'] == house_id]
+        assert len(partitions) == 1
+        assert orders == sorted(orders)
+
+
+def test_load_write_error(database_coordinates: database.DatabaseCoordinates,
+                          database_name: str,
+                          collection: str,
+                          load_data: typing.List[dwelling.Dwelling],
+                          monkeypatch: _pytest.monkeypatch.MonkeyPatch):
+
+    def failing_write(*args, **kwargs) -> database.LoadSummary:
+        raise pymongo.errors.AutoReconnect('connection lost')
+
+    monkeypatch.setattr(database, '_write_chunk', failing_write)
+    with pytest.raises(pymongo.errors.AutoReconnect):
+        database.load(
+            coords=database_coordinates,
+            database_name=database_name,
+            collection_name=collection,
+            data=load_data,
+            batch_size=1,
+            writers=2
+        )
+
+
+def test_content_hash() -> None:
+    document = {'houseId': 1, 'yearBuilt': 2000, 'evaluations': [{'fileId': 'a'}]}
+    reordered = {'evaluations': [{'fileId': 'a'}], 'yearBuilt': 2000, 'houseId': 1}
+
+    assert database.content_hash(document) == database.content_hash(reordered)
+    assert database.content_hash(document) == database.content_hash(
+        dict(document, _id='x', contentHash=database.content_hash(document)))
+    assert database.content_hash(document) != database.content_hash(dict(document, yearBuilt=2001))
+
+
+def test_load_skips_unchanged(database_coordinates: database.DatabaseCoordinates,
+                              mongo_client: pymongo.MongoClient,
+                              database_name: str,
+                              collection: str,
+                              load_data: typing.List[dwelling.Dwelling]):
+    first = database.load(coords=database_coordinates,
+                          database_name=database_name,
+                          collection_name=collection,
+                          data=load_data,
+                          update=False)
+    assert (first.written, first.skipped, first.failed) == (3, 0, 0)
+
+    documents = [house.to_dict() for house in load_data]
+    documents[0]['yearBuilt'] = 2001
+    second = database.load(coords=database_coordinates,
+                           database_name=database_name,
+                           collection_name=collection,
+                           data=documents,
+                           batch_size=2)
+    assert (second.written, second.skipped, second.failed) == (1, 2, 0)
+
+    stored = mongo_client[database_name][collection].find_one({'houseId': documents[0]['houseId']})
+    assert stored['yearBuilt'] == 2001
+    assert stored[database.CONTENT_HASH_FIELD] == database.content_hash(documents[0])
+
+
+def test_load_counts_failed_writes(database_coordinates: database.DatabaseCoordinates,
+                                   database_name: str,
+                                   collection: str):
+    data = [{'_id': 1, 'houseId': 1}, {'_id': 1, 'houseId': 2}, {'_id': 3, 'houseId': 3}]
+    summary = database.load(coords=database_coordinates,
+                            database_name=database_name,
+                            collection_name=collection,
+                            data=data,
+                            update=False)
+    assert (summary.written, summary.skipped, summary.failed) == (2, 0, 1)
+
+
+def test_load_builds_indexes(database_coordinates: database.DatabaseCoordinates,
+                             mongo_client: pymongo.MongoClient,
+                             database_name: str,
+                             collection: str,
+                             load_data: typing.List[dwelling.Dwelling]):
+    database.load(coords=database_coordinates,
+                  database_name=database_name,
+                  collection_name=collection,
+                  data=load_data)
+
+    indexes = mongo_client[database_name][collection].index_information()
+    assert indexes['houseId_1']['unique']
+    assert 'forwardSortationArea_1' in indexes
+    assert 'evaluations.fileId_1' in indexes
+    with pytest.raises(pymongo.errors.DuplicateKeyError):
+        mongo_client[database_name][collection].insert_one({'houseId': 1})
+
+
+@pytest.mark.parametrize('update, defer_indexes, expected_builds', [
+    (True, False, [(0, len(database.INDEXES), True)]),
+    (False, False, [(0, len(database.INDEXES), False)]),
+    (True, True, [(0, len(database.INDEXES), True)]),
+    (False, True, [(0, 1, False), (3, len(database.INDEXES), False)]),
+])
+def test_load_defer_indexes(database_coordinates: database.DatabaseCoordinates,
+                            database_name: str,
+                            collection: str,
+                            load_data: typing.List[dwelling.Dwelling],
+                            monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                            update: bool,
+                            defer_indexes: bool,
+                            expected_builds: typing.List[typing.Tuple[int, int, bool]]):
+    builds: typing.List[typing.Tuple[int, int, bool]] = []
+    ensure_indexes = database.ensure_indexes
+
+    def recording_ensure_indexes(coll: pymongo.collection.Collection,
+                                 indexes: typing.Optional[typing.List[pymongo.IndexModel]] = None,
+                                 background: bool = False) -> float:
+        builds.append((coll.count(), len(database.INDEXES if indexes is None else indexes), background))
+        return ensure_indexes(coll, indexes, background)
+
+    monkeypatch.setattr(database, 'ensure_indexes', recording_ensure_indexes)
+    database.load(coords=database_coordinates,
+                  database_name=database_name,
+                  collection_name=collection,
+                  data=load_data,
+                  update=update,
+                  defer_indexes=defer_indexes)
+    assert builds == expected_builds
+
+
+def test_ensure_indexes_background() -> None:
+
+    class RecordingCollection:
+        name = 'dwellings'
+        indexes: typing.List[pymongo.IndexModel] = []
+
+        def create_indexes(self, indexes: typing.List[pymongo.IndexModel]) -> typing.List[str]:
+            self.indexes = indexes
+            return [index.document['name'] for index in indexes]
+
+    coll = RecordingCollection()
+    database.ensure_indexes(typing.cast(pymongo.collection.Collection, coll), background=True)
+    assert [index.document for index in coll.indexes] == [
+        dict(index.document, background=True) for index in database.INDEXES
+    ]
+
+    database.ensure_indexes(typing.cast(pymongo.collection.Collection, coll))
+    assert not any('background' in index.document for index in coll.indexes)
+
+
+def test_load_defer_indexes_fails_duplicates(database_coordinates: database.DatabaseCoordinates,
+                                             mongo_client: pymongo.MongoClient,
+                                             database_name: str,
+                                             collection: str):
+    data = [{'houseId': 1, 'yearBuilt': 2000}, {'houseId': 2, 'yearBuilt': 2000}, {'houseId': 1, 'yearBuilt': 2001}]
+    summary = database.load(coords=database_coordinates,
+                            database_name=database_name,
+                            collection_name=collection,
+                            data=data,
+                            update=False,
+                            defer_indexes=True)
+    assert (summary.written, summary.failed) == (2, 1)
+    assert mongo_client[database_name][collection].index_information()['houseId_1']['unique']
+
+
+def test_load_staged(database_coordinates: database.DatabaseCoordinates,
+                     mongo_client: pymongo.MongoClient,
+                     database_name: str,
+                     collection: str,
+                     load_data: typing.List[dwelling.Dwelling]):
+    live = mongo_client[database_name][collection]
+    database.load(coords=database_coordinates,
+                  database_name=database_name,
+                  collection_name=collection,
+                  data=load_data,
+                  update=False)
+
+    def rebuilt() -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        for house in load_data:
+            assert live.count() == 3
+            yield dict(house.to_dict(), yearBuilt=2001)
+
+    database.load(coords=database_coordinates,
+                  database_name=database_name,
+                  collection_name=collection,
+                  data=rebuilt(),
+                  update=False,
+                  staged=True)
+
+    assert live.find_one({'houseId': 1})['yearBuilt'] == 2001
+    assert live.index_information()['houseId_1']['unique']
+    previous = mongo_client[database_name][collection + database.PREVIOUS_SUFFIX]
+    assert previous.find_one({'houseId': 1})['yearBuilt'] == 2000
+    assert collection + database.STAGING_SUFFIX not in mongo_client[database_name].collection_names()
+
+    database.rollback(database_coordinates, database_name, collection)
+    assert live.find_one({'houseId': 1})['yearBuilt'] == 2000
+    with pytest.raises(exceptions.LoadSanityError):
+        database.rollback(database_coordinates, database_name, collection)
+
+
+def test_load_staged_sanity_check(database_coordinates: database.DatabaseCoordinates,
+                                  mongo_client: pymongo.MongoClient,
+                                  database_name: str,
+                                  collection: str,
+                                  load_data: typing.List[dwelling.Dwelling]):
+    database.load(coords=database_coordinates,
+                  database_name=database_name,
+                  collection_name=collection,
+                  data=load_data,
+                  update=False)
+
+    with pytest.raises(exceptions.LoadSanityError):
+        database.load(coords=database_coordinates,
+                      database_name=database_name,
+                      collection_name=collection,
+                      data=load_data[:1],
+                      update=False,
+                      staged=True)
+
+    assert mongo_client[database_name][collection].count() == 3
+    assert mongo_client[database_name][collection + database.STAGING_SUFFIX].count() == 1
+
+
+def test_load_raw_bson(database_coordinates: database.DatabaseCoordinates,
+                       mongo_client: pymongo.MongoClient,
+                       database_name: str,
+                       collection: str,
+                       load_data: typing.List[dwelling.Dwelling]):
+    documents = [house.to_dict() for house in load_data]
+    raw_documents = [raw_bson.RawBSONDocument(database.encode_document(document)) for document in documents]
+
+    first = database.load(coords=database_coordinates,
+                          database_name=database_name,
+                          collection_name=collection,
+                          data=raw_documents)
+    assert (first.written, first.skipped) == (3, 0)
+
+    second = database.load(coords=database_coordinates,
+                           database_name=database_name,
+                           collection_name=collection,
+                           data=documents)
+    assert (second.written, second.skipped) == (0, 3)
+
+    stored = mongo_client[database_name][collection].find_one({'houseId': 1})
+    assert stored['yearBuilt'] == 2000
+    assert stored[database.CONTENT_HASH_FIELD] == database.content_hash(documents[0])
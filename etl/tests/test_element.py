@@ -1,3 +1,6 @@
+import concurrent.futures
+import threading
+import typing
 import py._path.local
 import pytest
 from energuide import element
@@ -135,3 +138,156 @@ def test_get_raises_when_not_found(fragment_node: element.Element) -> None:
 def test_get_raises_when_cant_cast(fragment_node: element.Element) -> None:
     with pytest.raises(ElementGetValueError):
         fragment_node.get('Bar/text()', int)
+
+
+@pytest.fixture
+def structured_node(fragment_node: element.Element) -> element.StructuredElement:
+    return element.StructuredElement(fragment_node.to_structured())
+
+
+def test_to_structured(fragment_node: element.Element) -> None:
+    assert fragment_node.to_structured() == {
+        'tag': 'Foo',
+        'attrib': {},
+        'text': '',
+        'children': [
+            {'tag': 'Bar', 'attrib': {'id': '1'}, 'text': 'baz', 'children': []},
+            {'tag': 'Bar', 'attrib': {'id': '2'}, 'text': 'qux', 'children': []},
+        ],
+    }
+
+
+def test_to_structured_skips_comments() -> None:
+    node = element.Element.from_string('<Foo>a<!-- comment -->b<Bar /></Foo>')
+    assert node.to_structured() == {
+        'tag': 'Foo',
+        'attrib': {},
+        'text': 'a',
+        'children': [{'tag': 'Bar', 'attrib': {}, 'text': '', 'children': []}],
+    }
+
+
+def test_structured_matches_element(fragment_node: element.Element,
+                                    structured_node: element.StructuredElement) -> None:
+    assert structured_node.tag == fragment_node.tag
+    assert structured_node.findtext('Bar') == fragment_node.findtext('Bar')
+    assert structured_node.findtext('Baz') is None
+    assert structured_node.get_text('Bar') == fragment_node.get_text('Bar')
+    assert structured_node.get('Bar/@id', int) == fragment_node.get('Bar/@id', int)
+    assert structured_node.xpath('Bar/@id') == fragment_node.xpath('Bar/@id')
+    assert [node.attrib for node in structured_node.xpath('*')] == [node.attrib for node in fragment_node.xpath('*')]
+    assert [node.tag for node in structured_node] == [node.tag for node in fragment_node]
+
+
+def test_structured_predicate_path() -> None:
+    node = element.Element.from_string('<Foo><Primary a="1" /><Other a="2" /><Secondary a="3" /></Foo>')
+    structured = element.StructuredElement(node.to_structured())
+    path = '*[self::Primary or self::Secondary]'
+    assert [child.attrib['a'] for child in structured.xpath(path)] == ['1', '3']
+    assert [child.attrib['a'] for child in structured.xpath(path)] == [child.attrib['a'] for child in node.xpath(path)]
+
+
+def test_structured_find(structured_node: element.StructuredElement) -> None:
+    found = structured_node.find('Bar')
+    assert found is not None
+    assert found.attrib['id'] == '1'
+    assert structured_node.find('Baz') is None
+
+
+def test_structured_get_raises(structured_node: element.StructuredElement) -> None:
+    with pytest.raises(ElementGetValueError):
+        structured_node.get('Bar/@missing', int)
+    with pytest.raises(ElementGetValueError):
+        structured_node.get_text('Baz')
+
+
+def test_structured_rejects_unsupported_paths(structured_node: element.StructuredElement) -> None:
+    with pytest.raises(ValueError):
+        structured_node.xpath('//Bar')
+
+
+def test_ensure_element(fragment_node: element.Element) -> None:
+    assert element.ensure_element(fragment_node) is fragment_node
+    assert isinstance(element.ensure_element(fragment_node.to_structured()), element.StructuredElement)
+
+
+def test_xpath_cache_counts_hits(fragment_node: element.Element) -> None:
+    path = 'Bar/@id'
+    fragment_node.xpath(path)
+    before = element.xpath_cache_info()
+    assert fragment_node.xpath(path) == ['1', '2']
+    after = element.xpath_cache_info()
+    assert after.hits == before.hits + 1
+    assert after.misses == before.misses
+    assert after.maxsize == element.XPATH_CACHE_SIZE
+
+
+def test_findtext_empty_element() -> None:
+    node = element.Element.from_string('<Foo><Bar /></Foo>')
+    assert node.findtext('Bar') == ''
+    assert node.findtext('Baz') is None
+
+
+def test_find_falls_back_for_element_path(fragment_node: element.Element) -> None:
+    found = fragment_node.find(".//Bar[@id='2']")
+    assert found is not None
+    assert found.findtext('.') == 'qux'
+
+
+def test_get_many(fragment_node: element.Element) -> None:
+    output = fragment_node.get_many({
+        'first': ('Bar/@id', int, True),
+        'text': ('Bar/text()', str, True),
+        'missing': ('Bar/@size', float, False),
+    })
+    assert output == {'first': 1, 'text': 'baz', 'missing': None}
+
+
+def test_get_many_reports_every_bad_field(fragment_node: element.Element) -> None:
+    with pytest.raises(ElementGetValueError) as excinfo:
+        fragment_node.get_many({
+            'size': ('Bar/@size', float, True),
+            'text': ('Bar/text()', float, True),
+            'first': ('Bar/@id', int, True),
+        })
+    message = str(excinfo.value)
+    assert 'size (missing Bar/@size)' in message
+    assert 'text (unable to cast baz' in message
+    assert 'first' not in message
+
+
+def test_structured_get_many(fragment_node: element.Element, structured_node: element.StructuredElement) -> None:
+    fields = {
+        'first': ('Bar/@id', int, True),
+        'missing': ('Bar/@size', float, False),
+    }
+    assert structured_node.get_many(fields) == fragment_node.get_many(fields)
+
+
+def test_xml_parser_is_per_thread() -> None:
+    assert element.xml_parser() is element.xml_parser()
+    assert element.xml_parser() is not element.xml_parser(remove_blank_text=True)
+
+    other: typing.List[typing.Any] = []
+    thread = threading.Thread(target=lambda: other.append(element.xml_parser()))
+    thread.start()
+    thread.join()
+    assert other[0] is not element.xml_parser()
+
+
+def test_from_string_remove_blank_text() -> None:
+    data = '<Foo>\n  <Bar>baz</Bar>\n</Foo>'
+    assert element.Element.from_string(data).to_string() == data
+    assert element.Element.from_string(data, remove_blank_text=True).to_string() == '<Foo><Bar>baz</Bar></Foo>'
+
+
+def test_from_string_from_many_threads() -> None:
+    def parse(index: int) -> typing.Tuple[str, str]:
+        data = f"<Foo id='{index}'>" + ''.join(f'<Bar>{index}-{i}</Bar>' for i in range(200)) + '</Foo>'
+        node = element.Element.from_string(data)
+        return node.attrib['id'], node.xpath('Bar/text()')[-1]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(parse, range(2000)))
+
+    assert results == [(str(index), f'{index}-199') for index in range(2000)]
@@ -1,4 +1,6 @@
 import csv
+import gzip
+import io
 import json
 import os
 import typing
@@ -6,6 +8,8 @@ import zipfile
 import _pytest.fixtures
 import py._path.local
 import pytest
+from tqdm import tqdm
+from energuide import element
 from energuide import extractor
 
 
@@ -169,6 +173,20 @@ def test_extract_with_tsv_snippets(tmpdir: py._path.local.LocalPath, base_data:
     assert output['forwardSortationArea'] == 'H0H'
 
 
+def test_read_csv_with_progress(extra_filepath: str) -> None:
+    output = list(extractor._read_csv(extra_filepath, show_progress=True))
+    assert len(output) == 1
+    assert output[0]['other_1'] == 'foo'
+
+
+def test_progress_reader_counts_bytes(extra_filepath: str) -> None:
+    with tqdm(total=os.stat(extra_filepath).st_size, file=io.StringIO()) as progress:
+        reader = extractor._ProgressReader(io.FileIO(extra_filepath, 'r'), progress)
+        with io.BufferedReader(reader) as file:
+            content = file.read()
+        assert progress.n == len(content) == os.stat(extra_filepath).st_size
+
+
 def test_write_data(tmpdir: py._path.local.LocalPath) -> None:
     output_path = f'{tmpdir}/output.zip'
 
@@ -198,3 +216,59 @@ def test_write_bad_data(tmpdir: py._path.local.LocalPath) -> None:
 
     with zipfile.ZipFile(output_path, 'r') as output:
         assert len(output.namelist()) == 1
+
+
+@pytest.mark.parametrize('run_size', [1, 2, 100])
+def test_write_data_jsonl_gz(tmpdir: py._path.local.LocalPath, run_size: int) -> None:
+    output_path = os.path.join(tmpdir, 'output.jsonl.gz')
+
+    data: typing.List[typing.Dict[str, typing.Any]] = [
+        {'foo': 1, 'BUILDER': '4K02E90020', 'EVAL_ID': '12149'},
+        {'bar': 2, 'baz': 3},
+        {'baz': 3, 'BUILDER': '4K13D01404', 'EVAL_ID': '12148'},
+        {'qux': 4, 'BUILDER': '4K13D01405', 'EVAL_ID': '12148'},
+    ]
+
+    result = extractor.write_data(data, output_path, 'jsonl.gz', run_size=run_size)
+    assert result == (3, 1)
+
+    with gzip.open(output_path, 'rt') as output_file:
+        rows = [json.loads(line) for line in output_file]
+
+    assert [row['jsonFileName'] for row in rows] == ['12148-4K13D01404', '12148-4K13D01405', '12149-4K02E90020']
+    assert rows[0]['baz'] == 3
+
+
+def test_write_data_unknown_format(tmpdir: py._path.local.LocalPath) -> None:
+    with pytest.raises(ValueError):
+        extractor.write_data([], os.path.join(tmpdir, 'output.tar'), 'tar')
+
+
+def test_extract_parallel_matches_serial(energuide_fixture: str) -> None:
+    serial = list(extractor.extract_data(energuide_fixture))
+    parallel = list(extractor.extract_data(energuide_fixture, workers=2, batch_size=3))
+    assert parallel == serial
+
+
+def test_extract_parallel_missing(missing_filepath: str) -> None:
+    output = extractor.extract_data(missing_filepath, workers=2)
+    assert list(output) == [None]
+
+
+@pytest.mark.parametrize('structured', [False, True])
+def test_extract_stream_matches_dom(energuide_fixture: str, structured: bool) -> None:
+    dom_rows = list(extractor.extract_data(energuide_fixture, structured=structured))
+    stream_rows = list(extractor.extract_data(energuide_fixture, structured=structured, stream=True))
+    assert stream_rows == dom_rows
+
+
+def test_extract_structured(energuide_fixture: str) -> None:
+    xml_rows = list(extractor.extract_data(energuide_fixture))
+    structured_rows = list(extractor.extract_data(energuide_fixture, structured=True))
+
+    assert len(structured_rows) == len(xml_rows)
+    for xml_row, structured_row in zip(xml_rows, structured_rows):
+        assert xml_row and structured_row
+        assert structured_row['windows'] == [
+            element.Element.from_string(window).to_structured() for window in xml_row['windows']
+        ]
@@ -0,0 +1,97 @@
+import gzip
+import os
+import stat
+import typing
+import py._path.local
+import pymongo
+import pytest
+import bson
+from bson import json_util
+from bson import raw_bson
+from energuide import database
+from energuide import sink
+
+
+@pytest.fixture
+def documents() -> typing.List[typing.Dict[str, typing.Any]]:
+    return [
+        {'houseId': house_id, 'yearBuilt': 2000, 'city': 'Ottawa', 'evaluations': [{'fileId': f'{house_id}A'}]}
+        for house_id in range(3)
+    ]
+
+
+def _with_hash(documents: typing.List[typing.Dict[str, typing.Any]]) -> typing.List[typing.Dict[str, typing.Any]]:
+    return [dict(document, contentHash=database.content_hash(document)) for document in documents]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('raw', [False, True])
+def test_file_sink_bson(tmpdir: py._path.local.LocalPath,
+                        documents: typing.List[typing.Dict[str, typing.Any]],
+                        compress: bool,
+                        raw: bool) -> None:
+    path = str(tmpdir.join('dwellings.bson'))
+    rows = [raw_bson.RawBSONDocument(database.encode_document(document)) for document in documents] if raw \
+        else documents
+
+    summary = sink.FileSink(path, 'bson', compress).write(rows)
+
+    assert summary.written == 3
+    with (gzip.open(path) if compress else open(path, 'rb')) as output:
+        assert bson.decode_all(output.read()) == _with_hash(documents)
+    assert tmpdir.listdir() == [tmpdir.join('dwellings.bson')]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('raw', [False, True])
+def test_file_sink_jsonl(tmpdir: py._path.local.LocalPath,
+                         documents: typing.List[typing.Dict[str, typing.Any]],
+                         compress: bool,
+                         raw: bool) -> None:
+    path = str(tmpdir.join('dwellings.jsonl'))
+    rows = [raw_bson.RawBSONDocument(database.encode_document(document)) for document in documents] if raw \
+        else documents
+
+    sink.FileSink(path, 'jsonl', compress).write(rows)
+
+    with (gzip.open(path, 'rt') if compress else open(path)) as output:
+        assert [json_util.loads(line) for line in output] == _with_hash(documents)
+
+
+def test_file_sink_failure_leaves_no_file(tmpdir: py._path.local.LocalPath,
+                                          documents: typing.List[typing.Dict[str, typing.Any]]) -> None:
+
+    def failing_rows() -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        yield documents[0]
+        raise ValueError('transform failed')
+
+    with pytest.raises(ValueError):
+        sink.FileSink(str(tmpdir.join('dwellings.bson'))).write(failing_rows())
+    assert not tmpdir.listdir()
+
+
+def test_file_sink_file_mode(tmpdir: py._path.local.LocalPath,
+                             documents: typing.List[typing.Dict[str, typing.Any]]) -> None:
+    path = str(tmpdir.join('dwellings.bson'))
+    umask = os.umask(0o022)
+    try:
+        sink.FileSink(path).write(documents)
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+
+def test_file_sink_bad_format(tmpdir: py._path.local.LocalPath) -> None:
+    with pytest.raises(ValueError):
+        sink.FileSink(str(tmpdir.join('dwellings.csv')), 'csv')
+
+
+def test_mongo_sink(database_coordinates: database.DatabaseCoordinates,
+                    mongo_client: pymongo.MongoClient,
+                    database_name: str,
+                    collection: str,
+                    documents: typing.List[typing.Dict[str, typing.Any]]) -> None:
+    summary = sink.MongoSink(database_coordinates, database_name, collection, update=False).write(documents)
+
+    assert summary.written == 3
+    assert mongo_client[database_name][collection].count() == 3
@@ -1,4 +1,5 @@
 import os
+import typing
 import pytest
 from energuide import element
 from energuide import snippets
@@ -205,7 +206,7 @@ def test_door_snippet(house: element.Element) -> None:
 def test_heating_cooling_snippet(house: element.Element) -> None:
     output = snippets.snip_house(house)
     assert output.heating_cooling
-    doc = element.Element.from_string(output.heating_cooling)
+    doc = element.Element.from_string(typing.cast(str, output.heating_cooling))
     child_tags = {node.tag for node in doc}
     assert 'Label' in child_tags
     assert len(child_tags) == 6
@@ -213,7 +214,7 @@ def test_heating_cooling_snippet(house: element.Element) -> None:
 
 def test_ventilation_snippet(house: element.Element) -> None:
     output = snippets.snip_house(house)
-    doc = element.Element.from_string(output.ventilation[0])
+    doc = element.Element.from_string(typing.cast(str, output.ventilation[0]))
     child_tags = {node.tag for node in doc}
     assert 'VentilatorType' in child_tags
     assert len(child_tags) == 3
@@ -222,7 +223,7 @@ def test_ventilation_snippet(house: element.Element) -> None:
 def test_water_heating_snippet(house: element.Element) -> None:
     output = snippets.snip_house(house)
     assert output.water_heating
-    doc = element.Element.from_string(output.water_heating)
+    doc = element.Element.from_string(typing.cast(str, output.water_heating))
     nodes = doc.xpath('*[self::Primary or self::Secondary]')
     assert len(nodes) == 2
 
@@ -277,3 +278,97 @@ def test_other_data_snippet(doc: element.Element) -> None:
         forward_sortation_area='H0H',
         ers_rating='267',
     )
+
+
+@pytest.fixture
+def raw_xml() -> str:
+    sample_filename = os.path.join(os.path.dirname(__file__), 'sample.h2k')
+    with open(sample_filename, 'r') as h2k:
+        return h2k.read().split('?>', 1)[1]
+
+
+def test_snip_stream_matches_snip(raw_xml: str) -> None:
+    doc = element.Element.from_string(raw_xml)
+    house_node, code_node, upgrades_node = doc.find('House'), doc.find('Codes'), doc.find('EnergyUpgrades')
+    assert house_node and code_node and upgrades_node
+
+    house, codes, upgrades, other = snippets.snip_stream(raw_xml)
+    assert house == snippets.snip_house(house_node)
+    assert codes == snippets.snip_codes(code_node)
+    assert upgrades == snippets.snip_energy_upgrades(upgrades_node)
+    assert other == snippets.snip_other_data(doc)
+
+
+def test_snip_stream_structured(raw_xml: str) -> None:
+    house, codes, upgrades, _ = snippets.snip_stream(raw_xml)
+    structured_house, structured_codes, structured_upgrades, _ = snippets.snip_stream(raw_xml, structured=True)
+
+    def parsed(snippet: snippets.Snippet) -> typing.Dict[str, typing.Any]:
+        return element.Element.from_string(typing.cast(str, snippet)).to_structured()
+
+    assert structured_house.windows == [parsed(window) for window in house.windows]
+    assert structured_house.heating_cooling == parsed(typing.cast(str, house.heating_cooling))
+    assert structured_codes.wall == [parsed(wall_code) for wall_code in codes.wall]
+    assert structured_upgrades.upgrades == [parsed(upgrade) for upgrade in upgrades.upgrades]
+
+
+def test_snip_house_structured(house: element.Element) -> None:
+    output = snippets.snip_house(house)
+    structured = snippets.snip_house(house, structured=True)
+
+    assert structured.ventilation == [
+        element.Element.from_string(typing.cast(str, hrv)).to_structured() for hrv in output.ventilation
+    ]
+    water_heating = element.Element.from_string(typing.cast(str, output.water_heating))
+    assert structured.water_heating == water_heating.to_structured()
+
+
+def test_snip_stream_nested_components() -> None:
+    xml_text = """
+<HouseFile><House><Components>
+    <Wall><Components>
+        <Door id="1"><Components><Window id="2" /></Components></Door> door tail
+        <Window id="3" />
+    </Components></Wall>
+    <Components><Door id="4" /></Components>
+    <Door id="5" />
+</Components></House></HouseFile>
+    """
+    doc = element.Element.from_string(xml_text)
+    house_node = doc.find('House')
+    assert house_node
+
+    house, _, _, _ = snippets.snip_stream(xml_text)
+    assert house == snippets.snip_house(house_node)
+    assert len(house.walls) == 1
+    assert len(house.doors) == 2
+    assert len(house.windows) == 2
+
+
+
+def test_snip_stream_repeated_upgrade_settings() -> None:
+    xml_text = """
+<HouseFile><EnergyUpgrades>
+    <Settings><Ceilings id="1" /><Walls id="2" /></Settings>
+    <Settings><Doors id="3" /></Settings>
+</EnergyUpgrades></HouseFile>
+    """
+    doc = element.Element.from_string(xml_text)
+    upgrades_node = doc.find('EnergyUpgrades')
+    assert upgrades_node
+
+    _, _, upgrades, _ = snippets.snip_stream(xml_text)
+    assert upgrades == snippets.snip_energy_upgrades(upgrades_node)
+    assert len(upgrades.upgrades) == 3
+
+def test_snip_stream_empty_document() -> None:
+    house, codes, upgrades, other = snippets.snip_stream('<HouseFile />')
+    assert house.to_dict() == snippets.HouseSnippet.EMPTY_SNIPPET
+    assert codes.to_dict() == snippets.Codes.EMPTY_SNIPPET
+    assert upgrades.to_dict() == snippets.EnergyUpgradesSnippet.EMPTY_SNIPPET
+    assert other == snippets.OtherDataSnippet(forward_sortation_area=None, ers_rating=None)
+
+
+def test_snip_stream_malformed() -> None:
+    with pytest.raises(element.MalformedXmlError):
+        snippets.snip_stream('garbage')
@@ -1,3 +1,6 @@
+import typing
+import cerberus
+import pytest
 from energuide import element
 from energuide import validator
 
@@ -34,3 +37,43 @@ def test_embedded_xml() -> None:
     assert isinstance(checker.document['raw_xml'], list)
     assert len(checker.document['raw_xml']) == 2
     assert isinstance(checker.document['raw_xml'][0], element.Element)
+
+
+@pytest.fixture
+def compiled_schema() -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    return {
+        'name': {'type': 'string', 'required': True},
+        'modified': {'type': 'string', 'required': True, 'nullable': True},
+        'notes': {'type': 'string', 'required': False, 'nullable': True},
+        'upgrades': {'type': 'list', 'required': True, 'nullable': True, 'schema': {'type': 'string'}},
+    }
+
+
+@pytest.mark.parametrize('document', [
+    {'name': 'foo', 'modified': None, 'upgrades': ['a', 'b'], 'unknown': 1},
+    {'name': 'foo', 'modified': 'bar', 'notes': None, 'upgrades': None},
+    {'modified': 'bar', 'upgrades': ['a']},
+    {'name': None, 'modified': 3, 'upgrades': 'a'},
+    {'name': 'foo', 'upgrades': ['a', None, 2]},
+    {},
+])
+def test_compiled_validator_matches_cerberus(compiled_schema: typing.Dict[str, typing.Dict[str, typing.Any]],
+                                             document: typing.Dict[str, typing.Any]) -> None:
+    expected = cerberus.Validator(compiled_schema, purge_unknown=True)
+    checker = validator.CompiledValidator(compiled_schema)
+
+    assert checker.validate(document) == expected.validate(document)
+    assert list(checker.errors.items()) == list(expected.errors.items())
+    if not checker.errors:
+        assert checker.document == expected.document
+
+
+def test_compiled_validator_purges_unknown(compiled_schema: typing.Dict[str, typing.Dict[str, typing.Any]]) -> None:
+    checker = validator.CompiledValidator(compiled_schema)
+    assert checker.validate({'name': 'foo', 'modified': None, 'upgrades': None, 'unknown': 1})
+    assert checker.document == {'name': 'foo', 'modified': None, 'upgrades': None}
+
+
+def test_compiled_validator_rejects_unsupported_rules() -> None:
+    with pytest.raises(ValueError):
+        validator.CompiledValidator({'name': {'type': 'string', 'coerce': 'parse_xml'}})
@@ -1,13 +1,14 @@
+import datetime
 import enum
+import json
+import secrets
 import typing
-from azure.storage import blob
+from extract_endpoint import storage
+from extract_endpoint.storage import StorageCoordinates
 
 
-class StorageCoordinates(typing.NamedTuple):
-    account: str
-    key: str
-    container: str
-    domain: typing.Optional[str]
+# blob names containing 'timestamp' are skipped by the TL when it lists the container for extract files
+JOURNAL_PREFIX = 'timestamp_journal/'
 
 
 class EnvVariables(enum.Enum):
@@ -17,16 +18,50 @@ class EnvVariables(enum.Enum):
     domain = 'EXTRACT_ENDPOINT_STORAGE_DOMAIN'
 
 
-def upload_bytes_to_azure(coords: StorageCoordinates, data: bytes, filename: str) -> bool:
-    azure_service = blob.BlockBlobService(account_name=coords.account,
-                                          account_key=coords.key,
-                                          custom_domain=coords.domain)
-    azure_service.create_blob_from_bytes(coords.container, filename, data)
-    return filename in [blob.name for blob in azure_service.list_blobs(coords.container)]
+def blob_service(coords: StorageCoordinates) -> storage.Storage:
+    """A client that can be shared between threads, so its connection pool is reused across uploads"""
+    return storage.from_env(coords)
 
 
-def download_bytes_from_azure(coords: StorageCoordinates, filename: str) -> str:
-    azure_service = blob.BlockBlobService(account_name=coords.account,
-                                          account_key=coords.key,
-                                          custom_domain=coords.domain)
-    return azure_service.get_blob_to_bytes(coords.container, filename).content
+def missing_blobs(coords: StorageCoordinates,
+                  sizes: typing.Mapping[str, int],
+                  storage_service: typing.Optional[storage.Storage] = None) -> typing.List[str]:
+    """Names from `sizes` not in the container or stored with a different size, found with one listing"""
+    storage_service = storage_service or blob_service(coords)
+    stored = {info.name: info.size for info in storage_service.list()}
+    return [filename for filename, size in sizes.items() if stored.get(filename) != size]
+
+
+def upload_bytes_to_azure(coords: StorageCoordinates,
+                          data: bytes,
+                          filename: str,
+                          storage_service: typing.Optional[storage.Storage] = None) -> bool:
+    """Put a single blob, confirmed by reading back its stored size"""
+    storage_service = storage_service or blob_service(coords)
+    storage_service.put(filename, data)
+    return storage_service.info(filename).size == len(data)
+
+
+def upload_stream_to_azure(coords: StorageCoordinates,
+                           stream: typing.IO[bytes],
+                           filename: str,
+                           storage_service: typing.Optional[storage.Storage] = None,
+                           count: typing.Optional[int] = None) -> None:
+    """Put one of a batch of blobs; the batch is checked afterwards with `missing_blobs`"""
+    storage_service = storage_service or blob_service(coords)
+    storage_service.put_stream(filename, stream, count=count)
+
+
+def download_bytes_from_azure(coords: StorageCoordinates, filename: str) -> bytes:
+    return blob_service(coords).get(filename)
+
+
+def write_journal(coords: StorageCoordinates,
+                  filenames: typing.List[str],
+                  storage_service: typing.Optional[storage.Storage] = None) -> str:
+    """Record which blobs an upload batch wrote, as a new journal blob whose names sort by upload time"""
+    storage_service = storage_service or blob_service(coords)
+    now = datetime.datetime.utcnow()
+    journal_name = f'{JOURNAL_PREFIX}{now:%Y%m%dT%H%M%S%f}Z_{secrets.token_hex(4)}.json'
+    storage_service.put(journal_name, json.dumps({'files': filenames}).encode())
+    return journal_name
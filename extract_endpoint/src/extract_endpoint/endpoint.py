@@ -1,18 +1,27 @@
 import os
 import io
+import bisect
+import collections
 import threading
+import time
 import hashlib
 import functools
+import itertools
+import re
 import secrets
+import shutil
+import tempfile
 import typing
 from http import HTTPStatus
 import zipfile
+from concurrent import futures
 import requests
 import flask
 from werkzeug import utils
-from azure.common import AzureMissingResourceHttpError
+from azure.common import AzureException
 from extract_endpoint import azure_utils
 from extract_endpoint import logger
+from extract_endpoint import storage
 
 
 LOGGER = logger.get_logger(__name__)
@@ -24,7 +33,43 @@ DEFAULT_ETL_SECRET_KEY = 'no key'
 TIMESTAMP_FILENAME = 'timestamp.txt'
 
 
+DEFAULT_UPLOAD_WORKERS = 8
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# chunked uploads are identified by the client's secrets.token_hex(16), which is also used as a directory name
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class _SpoolingRequest(flask.Request):
+    """Spools the files uploaded to /upload_file to named temporary files, which the upload thread then reads as
+    they are rather than from a second copy. Spools not handed off are removed when the request closes.
+    """
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.upload_spools: typing.List[str] = []
+
+    def _get_file_stream(self,
+                         total_content_length: typing.Optional[int],
+                         content_type: typing.Optional[str],
+                         filename: typing.Optional[str] = None,
+                         content_length: typing.Optional[int] = None) -> typing.IO[bytes]:
+        if self.endpoint != 'upload_file':
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        spool = tempfile.NamedTemporaryFile(prefix='upload_', suffix='.zip', delete=False)
+        self.upload_spools.append(spool.name)
+        return spool
+
+    def close(self) -> None:
+        super().close()
+        for path in self.upload_spools:
+            if os.path.exists(path):
+                os.remove(path)
+
+
 App = flask.Flask(__name__)
+App.request_class = _SpoolingRequest
 App.config.update(dict(
     SECRET_KEY=os.environ.get('ETL_SECRET_KEY', DEFAULT_ETL_SECRET_KEY),
     AZURE_COORDINATES=azure_utils.StorageCoordinates(
@@ -32,7 +77,10 @@ App.config.update(dict(
         key=os.environ.get(azure_utils.EnvVariables.key.value, ''),
         container=os.environ.get(azure_utils.EnvVariables.container.value, ''),
         domain=os.environ.get(azure_utils.EnvVariables.domain.value, None)
-    )
+    ),
+    UPLOAD_WORKERS=int(os.environ.get('EXTRACT_ENDPOINT_UPLOAD_WORKERS', DEFAULT_UPLOAD_WORKERS)),
+    UPLOAD_PARTS_DIR=os.environ.get('EXTRACT_ENDPOINT_PARTS_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'extract_endpoint_parts')),
 ))
 
 
@@ -40,7 +88,7 @@ class ThreadRunner:
     _running_thread: typing.Optional[threading.Thread] = None
 
     @classmethod
-    def start_new_thread(cls, target: typing.Callable[[], None]) -> None:
+    def start_new_thread(cls, target: typing.Callable[[], typing.Any]) -> None:
         cls._running_thread = threading.Thread(target=target)
         cls._running_thread.start()
 
@@ -82,10 +130,10 @@ def timestamp() -> str:
     LOGGER.info("Fetching timestamp")
     try:
         timestamp = azure_utils.download_bytes_from_azure(App.config['AZURE_COORDINATES'], TIMESTAMP_FILENAME)
-    except AzureMissingResourceHttpError as exc:
+    except storage.MissingBlobError as exc:
         LOGGER.warning(f"Error contacting Azure: {logger.unwrap_exception_message(exc)}")
         flask.abort(HTTPStatus.BAD_GATEWAY)
-    return timestamp
+    return timestamp.decode()
 
 
 @App.route('/status', methods=['GET'])
@@ -137,57 +185,346 @@ def run_tl_route() -> typing.Tuple[str, int]:
     return '', HTTPStatus.BAD_GATEWAY
 
 
-def unzip_upload_run_tl(data: bytes) -> None:
-    file_z = zipfile.ZipFile(io.BytesIO(data))
-    for json_file in [file_z.open(zipinfo) for zipinfo in file_z.infolist()]:
-        if not azure_utils.upload_bytes_to_azure(App.config['AZURE_COORDINATES'], json_file.read(),
-                                                 utils.secure_filename(json_file.name)):
-            LOGGER.warning("File upload to Azure storage failed")
-    LOGGER.info(f"{len(file_z.infolist())} json files uploaded to Azure")
+class UploadSummary(typing.NamedTuple):
+    uploaded: typing.List[str]
+    failed: typing.List[str]
+    missing: typing.List[str]
+    num_bytes: int
+    seconds: float
+
+
+def _upload_member(storage_service: storage.Storage, zipinfo: zipfile.ZipInfo, content: bytes) -> None:
+    azure_utils.upload_stream_to_azure(App.config['AZURE_COORDINATES'],
+                                       io.BytesIO(content),
+                                       utils.secure_filename(zipinfo.filename),
+                                       storage_service=storage_service,
+                                       count=len(content))
+
+
+def upload_members(file_z: zipfile.ZipFile,
+                   storage_service: storage.Storage,
+                   workers: int) -> UploadSummary:
+    """Upload every member of the archive on a bounded thread pool sharing one client.
+
+    Members are read from the archive on the calling thread, as a ZipFile cannot be read from several threads at
+    once, and at most 2 * workers are held in memory.
+    A single listing afterwards checks that every uploaded blob is stored with the size of its member.
+    """
+    sizes: typing.Dict[str, int] = {}
+    failed: typing.List[str] = []
+    pending: typing.Deque[typing.Tuple[zipfile.ZipInfo, futures.Future]] = collections.deque()
+
+    def collect(zipinfo: zipfile.ZipInfo, future: futures.Future) -> None:
+        filename = utils.secure_filename(zipinfo.filename)
+        try:
+            future.result()
+        except (AzureException, OSError) as exc:
+            LOGGER.warning(f"Upload of {filename} failed: {logger.unwrap_exception_message(exc)}")
+            failed.append(filename)
+        else:
+            sizes[filename] = zipinfo.file_size
+
+    start = time.monotonic()
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for zipinfo in file_z.infolist():
+            pending.append((zipinfo, executor.submit(_upload_member, storage_service, zipinfo, file_z.read(zipinfo))))
+            if len(pending) >= 2 * workers:
+                collect(*pending.popleft())
+
+        while pending:
+            collect(*pending.popleft())
+
+    seconds = time.monotonic() - start
+
+    missing: typing.List[str] = []
+    if sizes:
+        missing = azure_utils.missing_blobs(App.config['AZURE_COORDINATES'], sizes, storage_service=storage_service)
+    for filename in missing:
+        del sizes[filename]
+
+    return UploadSummary(uploaded=list(sizes), failed=failed, missing=missing, num_bytes=sum(sizes.values()),
+                         seconds=seconds)
+
+
+def unzip_upload_run_tl(path: str) -> UploadSummary:
+    """Upload the members of the archive at `path`, then start the TL. The archive is deleted afterwards.
+
+    `path` is either a spooled archive or the directory holding the parts of a chunked upload.
+    """
+    coords = App.config['AZURE_COORDINATES']
+    storage_service = azure_utils.blob_service(coords)
+    try:
+        with _open_archive(path) as archive, zipfile.ZipFile(archive) as file_z:
+            summary = upload_members(file_z, storage_service, App.config['UPLOAD_WORKERS'])
+    finally:
+        _remove_archive(path)
+
+    seconds = max(summary.seconds, 1e-6)
+    LOGGER.info(f"{len(summary.uploaded)} json files uploaded to Azure in {summary.seconds:.1f}s "
+                f"({len(summary.uploaded) / seconds:.1f} files/s, {summary.num_bytes / seconds / 1e6:.2f} MB/s)")
+    if summary.failed:
+        LOGGER.warning(f"{len(summary.failed)} files failed to upload to Azure: {', '.join(summary.failed)}")
+    if summary.missing:
+        LOGGER.warning(f"{len(summary.missing)} uploaded files missing from Azure: {', '.join(summary.missing)}")
+
+    journal_name = azure_utils.write_journal(coords, summary.uploaded, storage_service=storage_service)
+    LOGGER.info(f"Upload journal written to {journal_name}")
     run_tl()
+    return summary
 
 
-@App.route('/upload_file', methods=['POST'])
-def upload_file() -> typing.Tuple[str, int]:
-    LOGGER.info("Received upload request")
+def _read_chunks(stream: typing.IO[bytes]) -> typing.Iterator[bytes]:
+    return iter(lambda: stream.read(SPOOL_CHUNK_SIZE), b'')
+
+
+def _sign_chunks(chunks: typing.Iterable[bytes], salt: str) -> str:
+    hasher = hashlib.new('sha3_256')
+    hasher.update((salt + App.config['SECRET_KEY']).encode())
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class _PartsFile(io.RawIOBase):
+    """The parts of a chunked upload read in order as one seekable file, so they are never copied into one"""
+
+    def __init__(self, paths: typing.List[str]) -> None:
+        super().__init__()
+        self._paths = paths
+        self._offsets = list(itertools.accumulate([0] + [os.path.getsize(path) for path in paths]))
+        self._position = 0
+        self._index = -1
+        self._part: typing.Optional[io.FileIO] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._offsets[-1]
+        if offset < 0:
+            raise ValueError(f'Negative seek position {offset}')
+        self._position = offset
+        return self._position
+
+    def readinto(self, buffer: typing.Any) -> int:
+        index = bisect.bisect_right(self._offsets, self._position) - 1
+        if index >= len(self._paths):
+            return 0
+        if index != self._index or self._part is None:
+            self._close_part()
+            self._part = io.FileIO(self._paths[index], 'r')
+            self._index = index
+        self._part.seek(self._position - self._offsets[index])
+        count = self._part.readinto(buffer)
+        self._position += count
+        return count
+
+    def _close_part(self) -> None:
+        if self._part is not None:
+            self._part.close()
+            self._part = None
+
+    def close(self) -> None:
+        self._close_part()
+        super().close()
+
+
+def _open_archive(path: str) -> typing.IO[bytes]:
+    if os.path.isdir(path):
+        return io.BufferedReader(_PartsFile([_part_path(path, index) for index in _received_parts(path)]))
+    return open(path, 'rb')
+
+
+def _remove_archive(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+
+
+def _check_secret_key() -> None:
     if App.config['SECRET_KEY'] == DEFAULT_ETL_SECRET_KEY:
         LOGGER.error("Need to define environment variable ETL_SECRET_KEY")
         raise ValueError("Need to define environment variable ETL_SECRET_KEY")
+
+
+def _start_spooled_upload(spool_path: str,
+                          signature: str,
+                          timestamp: str,
+                          remove_on_failure: bool = True) -> typing.Tuple[str, int]:
+    """Check a spooled archive or a directory of parts and hand it to the upload thread, which then owns it"""
+    started = False
+    try:
+        if flask.request.form['signature'] != signature:
+            LOGGER.warning("Bad signature")
+            flask.abort(HTTPStatus.BAD_REQUEST)
+
+        with _open_archive(spool_path) as archive:
+            is_zipfile = zipfile.is_zipfile(archive)
+        if not is_zipfile:
+            LOGGER.warning("Bad zipfile")
+            return "Bad Zipfile", HTTPStatus.BAD_REQUEST
+
+        if ThreadRunner.is_thread_running():
+            LOGGER.warning("Still uploading to Azure, ignoring current upload")
+            flask.abort(HTTPStatus.TOO_MANY_REQUESTS)
+
+        if not azure_utils.upload_bytes_to_azure(App.config['AZURE_COORDINATES'], timestamp.encode(),
+                                                 TIMESTAMP_FILENAME):
+            LOGGER.warning("Timestamp upload to Azure storage failed")
+            flask.abort(HTTPStatus.BAD_GATEWAY)
+
+        ThreadRunner.start_new_thread(target=functools.partial(unzip_upload_run_tl, path=spool_path))
+        started = True
+    finally:
+        if not started and remove_on_failure:
+            _remove_archive(spool_path)
+    return 'Azure upload starting', HTTPStatus.OK
+
+
+@App.route('/upload_file', methods=['POST'])
+def upload_file() -> typing.Tuple[str, int]:
+    LOGGER.info("Received upload request")
+    _check_secret_key()
     if flask.request.form is None \
             or any(key not in flask.request.form for key in ['signature', 'salt', 'timestamp']) \
             or 'file' not in flask.request.files:
         LOGGER.warning("Missing signature, salt, or timestamp")
         flask.abort(HTTPStatus.BAD_REQUEST)
 
-    file = flask.request.files['file']
+    # werkzeug has already spooled the file while receiving the body; the signature covers the salt, which is
+    # only known once the whole form is parsed, so it is computed from the spool
+    spool = flask.request.files['file'].stream
+    signature = _sign_chunks(_read_chunks(spool), flask.request.form['salt'])
+    spool.close()
+    typing.cast(_SpoolingRequest, flask.request).upload_spools.remove(spool.name)
+    return _start_spooled_upload(spool.name, signature, flask.request.form['timestamp'])
+
+
+def _parts_dir(upload_id: str) -> str:
+    if not _UPLOAD_ID.match(upload_id):
+        LOGGER.warning("Bad upload id")
+        flask.abort(HTTPStatus.BAD_REQUEST)
+    return os.path.join(App.config['UPLOAD_PARTS_DIR'], upload_id)
+
+
+def _part_path(parts_dir: str, index: int) -> str:
+    return os.path.join(parts_dir, f'{index:06d}.part')
+
+
+def _received_parts(parts_dir: str) -> typing.List[int]:
+    if not os.path.isdir(parts_dir):
+        return []
+    return sorted(int(name.split('.')[0]) for name in os.listdir(parts_dir) if name.endswith('.part'))
+
+
+def _check_form(keys: typing.List[str]) -> None:
+    if flask.request.form is None or any(key not in flask.request.form for key in keys):
+        LOGGER.warning(f"Missing one of {', '.join(keys)}")
+        flask.abort(HTTPStatus.BAD_REQUEST)
+
 
+def _salt_signature(*parts: str) -> str:
     hasher = hashlib.new('sha3_256')
     hasher.update((flask.request.form['salt'] + App.config['SECRET_KEY']).encode())
-    hasher.update(file.read())
-    file.seek(0)
-    signature = hasher.hexdigest()
-    if flask.request.form['signature'] != signature:
+    for part in parts:
+        hasher.update(part.encode())
+    return hasher.hexdigest()
+
+
+@App.route('/upload_status', methods=['POST'])
+def upload_status() -> flask.Response:
+    """Part numbers already received for a chunked upload, so an interrupted client can resume"""
+    _check_secret_key()
+    _check_form(['upload_id', 'salt', 'signature'])
+    upload_id = flask.request.form['upload_id']
+    if flask.request.form['signature'] != _salt_signature(upload_id):
         LOGGER.warning("Bad signature")
         flask.abort(HTTPStatus.BAD_REQUEST)
+    return flask.jsonify(parts=_received_parts(_parts_dir(upload_id)))
 
-    try:
-        zipfile.ZipFile(file)
-        file.seek(0)
-    except zipfile.BadZipFile:
-        LOGGER.warning("Bad zipfile")
-        return "Bad Zipfile", HTTPStatus.BAD_REQUEST
-
-    if ThreadRunner.is_thread_running():
-        LOGGER.warning("Still uploading to Azure, ignoring current upload")
-        flask.abort(HTTPStatus.TOO_MANY_REQUESTS)
-
-    timestamp = flask.request.form['timestamp']
-    if not azure_utils.upload_bytes_to_azure(App.config['AZURE_COORDINATES'], timestamp.encode(), TIMESTAMP_FILENAME):
-        LOGGER.warning("Timestamp upload to Azure storage failed")
-        flask.abort(HTTPStatus.BAD_GATEWAY)
 
-    ThreadRunner.start_new_thread(target=functools.partial(unzip_upload_run_tl, data=file.read()))
-    return 'Azure upload starting', HTTPStatus.OK
+@App.route('/upload_part', methods=['POST'])
+def upload_part() -> typing.Tuple[str, int]:
+    """Store one part of a chunked upload. Parts are signed over the upload id, part number and content."""
+    _check_secret_key()
+    _check_form(['upload_id', 'index', 'salt', 'signature'])
+    if 'file' not in flask.request.files or not flask.request.form['index'].isdigit():
+        LOGGER.warning("Missing or bad part")
+        flask.abort(HTTPStatus.BAD_REQUEST)
+
+    upload_id = flask.request.form['upload_id']
+    index = int(flask.request.form['index'])
+    parts_dir = _parts_dir(upload_id)
+    os.makedirs(parts_dir, exist_ok=True)
+
+    hasher = hashlib.new('sha3_256')
+    hasher.update((flask.request.form['salt'] + App.config['SECRET_KEY'] + f'{upload_id}:{index}:').encode())
+    with tempfile.NamedTemporaryFile(dir=parts_dir, suffix='.tmp', delete=False) as part:
+        try:
+            for chunk in _read_chunks(flask.request.files['file'].stream):
+                hasher.update(chunk)
+                part.write(chunk)
+        except BaseException:
+            part.close()
+            os.remove(part.name)
+            raise
+
+    if flask.request.form['signature'] != hasher.hexdigest():
+        os.remove(part.name)
+        LOGGER.warning("Bad part signature")
+        flask.abort(HTTPStatus.BAD_REQUEST)
+
+    os.replace(part.name, _part_path(parts_dir, index))
+    return '', HTTPStatus.OK
+
+
+@App.route('/upload_complete', methods=['POST'])
+def upload_complete() -> typing.Tuple[str, int]:
+    """Start a chunked upload like /upload_file; the signature covers the whole archive.
+
+    A completed upload id is remembered, so a client retrying a completion whose response it lost gets the same
+    answer instead of a missing parts error.
+    """
+    LOGGER.info("Received chunked upload completion")
+    _check_secret_key()
+    _check_form(['upload_id', 'parts', 'salt', 'signature', 'timestamp'])
+    upload_id = flask.request.form['upload_id']
+    parts_dir = _parts_dir(upload_id)
+    completed_path = parts_dir + '.done'
+    if os.path.isfile(completed_path):
+        with open(completed_path) as completed:
+            if flask.request.form['signature'] != completed.read():
+                LOGGER.warning("Bad signature")
+                flask.abort(HTTPStatus.BAD_REQUEST)
+        LOGGER.info(f"Chunked upload {upload_id} was already completed")
+        return 'Azure upload starting', HTTPStatus.OK
+
+    num_parts = int(flask.request.form['parts']) if flask.request.form['parts'].isdigit() else -1
+    if _received_parts(parts_dir) != list(range(num_parts)):
+        LOGGER.warning(f"Chunked upload {upload_id} is missing parts")
+        return "Missing parts", HTTPStatus.CONFLICT
+
+    with _open_archive(parts_dir) as archive:
+        signature = _sign_chunks(_read_chunks(archive), flask.request.form['salt'])
+    # an aborted request keeps its parts, so the client can retry the completion
+    message, status_code = _start_spooled_upload(parts_dir, signature, flask.request.form['timestamp'],
+                                                 remove_on_failure=False)
+    if status_code == HTTPStatus.OK:
+        with open(completed_path, 'w') as completed:
+            completed.write(signature)
+    else:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    return message, status_code
 
 
 if __name__ == "__main__":
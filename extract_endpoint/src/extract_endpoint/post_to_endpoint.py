@@ -1,6 +1,12 @@
 import os
+import collections
+import contextlib
 import hashlib
+import io
 import secrets
+import shutil
+import tempfile
+import time
 import typing
 from http import HTTPStatus
 import requests
@@ -11,6 +17,12 @@ DEFAULT_ETL_SECRET_KEY = 'no key'
 
 DEFAULT_ENERGUIDE_ENDPOINT_ADDRESS = 'http://127.0.0.1:5000'
 
+DEFAULT_RETRIES = 3
+
+DEFAULT_BACKOFF = 1.0
+
+READ_CHUNK_SIZE = 1024 * 1024
+
 
 def _etl_secret_key() -> str:
     return os.environ.get('ETL_SECRET_KEY', DEFAULT_ETL_SECRET_KEY)
@@ -20,25 +32,169 @@ def _endpoint_address() -> str:
     return os.environ.get('ENERGUIDE_ENDPOINT_ADDRESS', DEFAULT_ENERGUIDE_ENDPOINT_ADDRESS)
 
 
+def _post_with_retry(session: requests.Session,
+                     url: str,
+                     retries: int,
+                     backoff: float,
+                     **kwargs) -> int:
+    """Post, retrying connection errors and 5xx responses with exponential backoff.
+
+    A single-request upload is not idempotent, so it is only retried after a connection error raised before its
+    whole body was sent, when the server cannot have accepted it.
+    """
+    status_code: int = HTTPStatus.BAD_GATEWAY
+    body = kwargs.get('data')
+    for attempt in range(retries + 1):
+        if isinstance(body, _MultipartBody):
+            body.rewind()
+        try:
+            status_code = session.post(url, **kwargs).status_code
+            if status_code < HTTPStatus.INTERNAL_SERVER_ERROR or isinstance(body, _MultipartBody):
+                return status_code
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            status_code = HTTPStatus.BAD_GATEWAY
+            if isinstance(body, _MultipartBody) and body.is_sent:
+                return status_code
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt)
+    return status_code
+
+
+class _MultipartBody:
+    """A multipart/form-data body of some fields and one file, read from the file while it is sent.
+
+    requests builds the body for `files=` in memory, but sends a body that has a length and `read` in blocks.
+    """
+
+    def __init__(self, fields: typing.Dict[str, str], stream: typing.IO[bytes], size: int) -> None:
+        boundary = secrets.token_hex(16)
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        head = ''.join(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+                       for name, value in fields.items())
+        head += (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="file"\r\n'
+                 'Content-Type: application/octet-stream\r\n\r\n')
+        self._head = head.encode()
+        self._tail = f'\r\n--{boundary}--\r\n'.encode()
+        self._stream = stream
+        self._start = stream.tell()
+        self._length = len(self._head) + size + len(self._tail)
+        self._parts: typing.Deque[typing.IO[bytes]] = collections.deque()
+        self._sent = 0
+        self.rewind()
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def is_sent(self) -> bool:
+        """Whether the whole body has been read since the last rewind"""
+        return self._sent >= self._length
+
+    def rewind(self) -> None:
+        self._stream.seek(self._start)
+        self._parts = collections.deque([io.BytesIO(self._head), self._stream, io.BytesIO(self._tail)])
+        self._sent = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while self._parts and size != 0:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.popleft()
+                continue
+            chunks.append(chunk)
+            self._sent += len(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+
 def post_stream(stream: typing.IO[bytes],
                 timestamp: str,
-                url: str) -> int:
+                url: str,
+                retries: int = 0,
+                backoff: float = DEFAULT_BACKOFF) -> int:
+    """Upload the stream in one request. It is read once to sign it and again while sending, never held in memory.
+
+    A stream that cannot seek, like stdin, is copied to a temporary file first.
+    """
+    with contextlib.ExitStack() as stack:
+        if not stream.seekable():
+            spool = stack.enter_context(tempfile.TemporaryFile())
+            shutil.copyfileobj(stream, spool)
+            spool.seek(0)
+            stream = spool
+
+        salt = secrets.token_hex(16)
+        hasher = hashlib.new('sha3_256')
+        hasher.update((salt + _etl_secret_key()).encode())
+        start = stream.tell()
+        for chunk in iter(lambda: stream.read(READ_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+        size = stream.tell() - start
+        stream.seek(start)
 
-    data = stream.read()
+        body = _MultipartBody({'salt': salt, 'signature': hasher.hexdigest(), 'timestamp': timestamp}, stream, size)
+        with requests.Session() as session:
+            return _post_with_retry(session, url, retries, backoff,
+                                    data=body, headers={'Content-Type': body.content_type})
+
+
+def _received_parts(session: requests.Session, base_url: str, upload_id: str) -> typing.Set[int]:
+    salt = secrets.token_hex(16)
+    hasher = hashlib.new('sha3_256')
+    hasher.update((salt + _etl_secret_key() + upload_id).encode())
+    try:
+        response = session.post(f'{base_url}/upload_status',
+                                data={'upload_id': upload_id, 'salt': salt, 'signature': hasher.hexdigest()})
+    except requests.exceptions.RequestException:
+        return set()
+    if response.status_code != HTTPStatus.OK:
+        return set()
+    return set(response.json()['parts'])
+
+
+def post_stream_chunked(stream: typing.IO[bytes],
+                        timestamp: str,
+                        base_url: str,
+                        chunk_size: int,
+                        upload_id: typing.Optional[str] = None,
+                        retries: int = DEFAULT_RETRIES,
+                        backoff: float = DEFAULT_BACKOFF) -> int:
+    """Upload the stream in signed parts, then ask the endpoint to assemble them.
+
+    Only one part is held in memory at a time and each is retried on its own. Passing the `upload_id` of an
+    interrupted upload skips the parts the endpoint already has.
+    """
+    upload_id = upload_id or secrets.token_hex(16)
     salt = secrets.token_hex(16)
+    secret_key = _etl_secret_key()
 
     hasher = hashlib.new('sha3_256')
-    hasher.update((salt + _etl_secret_key()).encode())
-    hasher.update(data)
-    signature = hasher.hexdigest()
+    hasher.update((salt + secret_key).encode())
 
-    try:
-        post_return = requests.post(url=url,
-                                    files={'file': data},
-                                    data={'salt': salt, 'signature': signature, 'timestamp': timestamp})
-        return post_return.status_code
-    except requests.exceptions.ConnectionError:
-        return HTTPStatus.BAD_GATEWAY
+    with requests.Session() as session:
+        received = _received_parts(session, base_url, upload_id)
+        num_parts = 0
+        for index, chunk in enumerate(iter(lambda: stream.read(chunk_size), b'')):
+            hasher.update(chunk)
+            num_parts = index + 1
+            if index in received:
+                continue
+
+            part_hasher = hashlib.new('sha3_256')
+            part_hasher.update((salt + secret_key + f'{upload_id}:{index}:').encode())
+            part_hasher.update(chunk)
+            status_code = _post_with_retry(session, f'{base_url}/upload_part', retries, backoff,
+                                           files={'file': chunk},
+                                           data={'upload_id': upload_id, 'index': str(index), 'salt': salt,
+                                                 'signature': part_hasher.hexdigest()})
+            if status_code != HTTPStatus.OK:
+                return status_code
+
+        return _post_with_retry(session, f'{base_url}/upload_complete', retries, backoff,
+                                data={'upload_id': upload_id, 'parts': str(num_parts), 'salt': salt,
+                                      'signature': hasher.hexdigest(), 'timestamp': timestamp})
 
 
 def trigger_tl(url) -> int:
@@ -62,8 +218,31 @@ def main() -> None:
 @click.argument('stream', type=click.File('rb'))
 @click.argument('timestamp')
 @click.option('--url', default=_endpoint_address() + '/upload_file')
-def upload(stream: typing.IO[bytes], timestamp: str, url: str) -> None:
-    return_code = post_stream(stream=stream, timestamp=timestamp, url=url)
+@click.option('--chunk-size',
+              default=0,
+              type=click.IntRange(min=0),
+              help='Upload in resumable parts of this many bytes, next to the --url route (0: a single request)')
+@click.option('--retries',
+              default=DEFAULT_RETRIES,
+              type=click.IntRange(min=0),
+              help='Retries per request on connection errors and server errors')
+@click.option('--upload-id',
+              default=None,
+              help='Resume an interrupted chunked upload')
+def upload(stream: typing.IO[bytes],
+           timestamp: str,
+           url: str,
+           chunk_size: int,
+           retries: int,
+           upload_id: typing.Optional[str]) -> None:
+    if chunk_size:
+        base_url = url.rsplit('/', 1)[0]
+        upload_id = upload_id or secrets.token_hex(16)
+        click.echo(f"Upload id: {upload_id}")
+        return_code = post_stream_chunked(stream=stream, timestamp=timestamp, base_url=base_url,
+                                          chunk_size=chunk_size, upload_id=upload_id, retries=retries)
+    else:
+        return_code = post_stream(stream=stream, timestamp=timestamp, url=url, retries=retries)
     click.echo(f"Response: {return_code}")
     if return_code != HTTPStatus.OK:
         exit(return_code)
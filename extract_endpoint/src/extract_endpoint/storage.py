@@ -0,0 +1,205 @@
+import datetime
+import enum
+import io
+import os
+import tempfile
+import typing
+import typing_extensions
+from azure.common import AzureMissingResourceHttpError
+from azure.storage import blob
+
+
+class EnvVariables(enum.Enum):
+    backend = 'ENERGUIDE_STORAGE'
+    directory = 'ENERGUIDE_STORAGE_DIR'
+
+
+class EnvDefaults(enum.Enum):
+    backend = 'azure'
+
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BlobInfo(typing.NamedTuple):
+    name: str
+    last_modified: datetime.datetime
+    etag: str
+    size: typing.Optional[int]  # Azure does not report it for a put
+
+
+class StorageCoordinates(typing.NamedTuple):
+    account: str
+    key: str
+    container: str
+    domain: typing.Optional[str]
+
+
+class MissingBlobError(Exception):
+    pass
+
+
+class Storage(typing_extensions.Protocol):
+    def list(self, prefix: typing.Optional[str] = None) -> typing.Iterator[BlobInfo]:
+        pass
+
+    def info(self, name: str) -> BlobInfo:
+        pass
+
+    def exists(self, name: str) -> bool:
+        pass
+
+    def get(self, name: str) -> bytes:
+        pass
+
+    def put(self, name: str, data: bytes) -> BlobInfo:
+        pass
+
+    def put_stream(self, name: str, stream: typing.IO[bytes], count: typing.Optional[int] = None) -> BlobInfo:
+        pass
+
+
+class AzureStorage:
+    """A blob container. The client is created once and can be shared between threads."""
+
+    def __init__(self, coords: StorageCoordinates) -> None:
+        self._container = coords.container
+        self._service = blob.BlockBlobService(account_name=coords.account,
+                                              account_key=coords.key,
+                                              custom_domain=coords.domain)
+
+    def _info(self, name: str, properties: typing.Any, size: typing.Optional[int] = None) -> BlobInfo:
+        return BlobInfo(name=name, last_modified=properties.last_modified, etag=properties.etag, size=size)
+
+    def list(self, prefix: typing.Optional[str] = None) -> typing.Iterator[BlobInfo]:
+        for blob_ in self._service.list_blobs(self._container, prefix=prefix):
+            yield self._info(blob_.name, blob_.properties, blob_.properties.content_length)
+
+    def info(self, name: str) -> BlobInfo:
+        try:
+            properties = self._service.get_blob_properties(self._container, name).properties
+            return self._info(name, properties, properties.content_length)
+        except AzureMissingResourceHttpError as exc:
+            raise MissingBlobError(name) from exc
+
+    def exists(self, name: str) -> bool:
+        return self._service.exists(self._container, name)
+
+    def get(self, name: str) -> bytes:
+        try:
+            return self._service.get_blob_to_bytes(self._container, name).content
+        except AzureMissingResourceHttpError as exc:
+            raise MissingBlobError(name) from exc
+
+    def put(self, name: str, data: bytes) -> BlobInfo:
+        return self._info(name, self._service.create_blob_from_bytes(self._container, name, data))
+
+    def put_stream(self, name: str, stream: typing.IO[bytes], count: typing.Optional[int] = None) -> BlobInfo:
+        properties = self._service.create_blob_from_stream(self._container, name, stream, count=count,
+                                                           max_connections=1)
+        return self._info(name, properties)
+
+
+def _may_hold(directory: str, prefix: str) -> bool:
+    """Whether names below `directory` can start with `prefix`"""
+    return directory.startswith(prefix) or prefix.startswith(directory)
+
+
+class LocalStorage:
+    """Blobs kept as files below a directory, with '/' in names mapped to subdirectories.
+
+    Writes go to a hidden temporary file first and are renamed into place, so readers never see partial blobs.
+    """
+
+    def __init__(self, root: str) -> None:
+        self._root = os.path.abspath(root)
+        os.makedirs(self._root, exist_ok=True)
+
+    @staticmethod
+    def _valid_parts(parts: typing.List[str]) -> bool:
+        return not any(part in ('', '.', '..') or part.startswith('.') for part in parts)
+
+    def _path(self, name: str) -> str:
+        parts = name.split('/')
+        if not name or not self._valid_parts(parts):
+            raise ValueError(f'Invalid blob name: {name}')
+        return os.path.join(self._root, *parts)
+
+    def _info(self, name: str, path: str) -> BlobInfo:
+        stat = os.stat(path)
+        return BlobInfo(
+            name=name,
+            last_modified=datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc),
+            etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            size=stat.st_size,
+        )
+
+    def list(self, prefix: typing.Optional[str] = None) -> typing.Iterator[BlobInfo]:
+        """The blobs whose names start with `prefix`, walking only the directories that can hold them"""
+        prefix = prefix or ''
+        start = prefix.rpartition('/')[0]
+        if start and not self._valid_parts(start.split('/')):
+            return
+
+        names: typing.List[str] = []
+        for directory, subdirectories, files in os.walk(self._path(start) if start else self._root):
+            relative = os.path.relpath(directory, self._root)
+            base = '' if relative == '.' else relative.replace(os.sep, '/') + '/'
+            subdirectories[:] = [subdirectory for subdirectory in subdirectories
+                                 if not subdirectory.startswith('.') and _may_hold(base + subdirectory + '/', prefix)]
+            names.extend(base + file for file in files if not file.startswith('.') and (base + file).startswith(prefix))
+
+        for name in sorted(names):
+            yield self._info(name, self._path(name))
+
+    def info(self, name: str) -> BlobInfo:
+        try:
+            return self._info(name, self._path(name))
+        except FileNotFoundError as exc:
+            raise MissingBlobError(name) from exc
+
+    def exists(self, name: str) -> bool:
+        return os.path.isfile(self._path(name))
+
+    def get(self, name: str) -> bytes:
+        try:
+            with open(self._path(name), 'rb') as file:
+                return file.read()
+        except FileNotFoundError as exc:
+            raise MissingBlobError(name) from exc
+
+    def put(self, name: str, data: bytes) -> BlobInfo:
+        return self.put_stream(name, io.BytesIO(data))
+
+    def put_stream(self, name: str, stream: typing.IO[bytes], count: typing.Optional[int] = None) -> BlobInfo:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        remaining = count
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix='.', delete=False) as file:
+            try:
+                while remaining is None or remaining > 0:
+                    chunk = stream.read(COPY_CHUNK_SIZE if remaining is None else min(remaining, COPY_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    file.write(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+            except BaseException:
+                file.close()
+                os.remove(file.name)
+                raise
+        os.replace(file.name, path)
+        return self._info(name, path)
+
+
+def from_env(coords: StorageCoordinates) -> Storage:
+    """Azure by default; set ENERGUIDE_STORAGE=local and ENERGUIDE_STORAGE_DIR to use a local directory"""
+    backend = os.environ.get(EnvVariables.backend.value, EnvDefaults.backend.value)
+    if backend == 'azure':
+        return AzureStorage(coords)
+    if backend == 'local':
+        directory = os.environ.get(EnvVariables.directory.value)
+        if not directory:
+            raise ValueError(f'{EnvVariables.directory.value} must be set to use local storage')
+        return LocalStorage(directory)
+    raise ValueError(f'Unknown storage backend {backend}')
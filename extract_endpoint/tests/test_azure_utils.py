@@ -1,8 +1,12 @@
+import io
+import json
 import typing
+import _pytest
+import py
 import pytest
 from azure.storage import blob
-from azure.common import AzureMissingResourceHttpError
 from extract_endpoint import azure_utils
+from extract_endpoint import storage
 
 
 @pytest.fixture
@@ -51,6 +55,48 @@ def test_upload_bytes(azure_emulator_coords: azure_utils.StorageCoordinates,
     check_file_in_azure(azure_service, azure_emulator_coords, sample_filename, sample_stream_content)
 
 
+@pytest.mark.usefixtures('azure_service')
+def test_upload_bytes_does_not_list_container(azure_emulator_coords: azure_utils.StorageCoordinates,
+                                              monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                              sample_data: bytes,
+                                              sample_filename: str) -> None:
+
+    shared_service = azure_utils.blob_service(azure_emulator_coords)
+
+    def no_listing(*args, **kwargs) -> None:
+        raise AssertionError('list called')
+
+    monkeypatch.setattr(shared_service, 'list', no_listing)
+    assert azure_utils.upload_bytes_to_azure(azure_emulator_coords, sample_data, sample_filename,
+                                             storage_service=shared_service)
+
+
+def test_missing_blobs(azure_emulator_coords: azure_utils.StorageCoordinates,
+                       put_file_in_azure: str,
+                       sample_data: bytes) -> None:
+    sizes = {put_file_in_azure: len(sample_data), 'absent.json': 2}
+    assert azure_utils.missing_blobs(azure_emulator_coords, sizes) == ['absent.json']
+
+
+def test_missing_blobs_checks_size(azure_emulator_coords: azure_utils.StorageCoordinates,
+                                   put_file_in_azure: str,
+                                   sample_data: bytes) -> None:
+    sizes = {put_file_in_azure: len(sample_data) + 1}
+    assert azure_utils.missing_blobs(azure_emulator_coords, sizes) == [put_file_in_azure]
+
+
+def test_upload_stream(azure_emulator_coords: azure_utils.StorageCoordinates,
+                       azure_service: blob.BlockBlobService,
+                       sample_data: bytes,
+                       sample_stream_content: str,
+                       sample_filename: str) -> None:
+
+    shared_service = azure_utils.blob_service(azure_emulator_coords)
+    azure_utils.upload_stream_to_azure(azure_emulator_coords, io.BytesIO(sample_data), sample_filename,
+                                       storage_service=shared_service, count=len(sample_data))
+    check_file_in_azure(azure_service, azure_emulator_coords, sample_filename, sample_stream_content)
+
+
 def test_download_bytes(azure_emulator_coords: azure_utils.StorageCoordinates,
                         put_file_in_azure: str,
                         sample_stream_content: str) -> None:
@@ -61,5 +107,42 @@ def test_download_bytes(azure_emulator_coords: azure_utils.StorageCoordinates,
 
 @pytest.mark.usefixtures('put_file_in_azure')
 def test_download_bytes_bad_filename(azure_emulator_coords: azure_utils.StorageCoordinates) -> None:
-    with pytest.raises(AzureMissingResourceHttpError):
+    with pytest.raises(storage.MissingBlobError):
         azure_utils.download_bytes_from_azure(azure_emulator_coords, 'bad_filename')
+
+
+def test_write_journal(azure_emulator_coords: azure_utils.StorageCoordinates,
+                       azure_service: blob.BlockBlobService) -> None:
+    first = azure_utils.write_journal(azure_emulator_coords, ['a-1.json', 'b-2.json'])
+    second = azure_utils.write_journal(azure_emulator_coords, [])
+
+    assert first.startswith(azure_utils.JOURNAL_PREFIX)
+    assert 'timestamp' in first
+    assert first < second
+    content = azure_service.get_blob_to_text(azure_emulator_coords.container, first).content
+    assert json.loads(content) == {'files': ['a-1.json', 'b-2.json']}
+
+
+def test_local_storage_from_env(azure_emulator_coords: azure_utils.StorageCoordinates,
+                                monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                tmpdir: py._path.local.LocalPath,
+                                sample_data: bytes) -> None:
+    monkeypatch.setenv(storage.EnvVariables.backend.value, 'local')
+    monkeypatch.setenv(storage.EnvVariables.directory.value, str(tmpdir))
+
+    assert isinstance(azure_utils.blob_service(azure_emulator_coords), storage.LocalStorage)
+    assert azure_utils.upload_bytes_to_azure(azure_emulator_coords, sample_data, 'house.json')
+    assert azure_utils.download_bytes_from_azure(azure_emulator_coords, 'house.json') == sample_data
+    sizes = {'house.json': len(sample_data), 'absent.json': 2}
+    assert azure_utils.missing_blobs(azure_emulator_coords, sizes) == ['absent.json']
+
+    journal_name = azure_utils.write_journal(azure_emulator_coords, ['house.json'])
+    assert tmpdir.join(*journal_name.split('/')).check(file=1)
+    with pytest.raises(storage.MissingBlobError):
+        azure_utils.download_bytes_from_azure(azure_emulator_coords, 'absent.json')
+
+
+def test_local_storage_rejects_escaping_names(tmpdir: py._path.local.LocalPath) -> None:
+    local = storage.LocalStorage(str(tmpdir))
+    with pytest.raises(ValueError):
+        local.put('../outside.json', b'{}')
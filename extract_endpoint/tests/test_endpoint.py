@@ -1,13 +1,21 @@
+import functools
 import io
 import hashlib
+import json
+import os
+import tempfile
 from http import HTTPStatus
 import typing
+import zipfile
 import pytest
 import _pytest
+import py
 from flask import testing
+from azure.common import AzureHttpError
 from azure.storage import blob
 from extract_endpoint import azure_utils
 from extract_endpoint import endpoint
+from extract_endpoint import storage
 
 
 endpoint.App.testing = True
@@ -208,6 +216,13 @@ def test_upload_with_timestamp(azure_service: blob.BlockBlobService,
         check_file_in_azure(azure_service, azure_emulator_coords, name, contents)
 
 
+    journals = [blob_.name for blob_ in azure_service.list_blobs(azure_emulator_coords.container,
+                                                                 prefix=azure_utils.JOURNAL_PREFIX)]
+    assert len(journals) == 1
+    journal = azure_service.get_blob_to_text(azure_emulator_coords.container, journals[0]).content
+    assert sorted(json.loads(journal)['files']) == sorted(sample_filenames)
+
+
 def test_upload_without_timestamp(test_client: testing.FlaskClient,
                                   sample_salt: str,
                                   sample_zipfile_signature: str,
@@ -309,3 +324,246 @@ def test_status_busy(test_client: testing.FlaskClient) -> None:
     status = test_client.get('/status')
     assert status.status_code == HTTPStatus.OK
     assert b'Endpoint: busy' in status.data
+
+
+@pytest.mark.usefixtures('mocked_tl_app', 'sample_secret_key', 'test_client')
+def test_unzip_upload_run_tl(azure_service: blob.BlockBlobService,
+                             azure_emulator_coords: azure_utils.StorageCoordinates,
+                             tmpdir: py._path.local.LocalPath) -> None:
+    path = str(tmpdir.join('upload.zip'))
+    with zipfile.ZipFile(path, 'w') as file_z:
+        for index in range(50):
+            file_z.writestr(f'{index:04d}-house.json', f'{{"index": {index}}}')
+
+    summary = endpoint.unzip_upload_run_tl(path)
+    assert not os.path.exists(path)
+
+    assert summary.uploaded == [f'{index:04d}-house.json' for index in range(50)]
+    assert not summary.failed
+    assert summary.num_bytes == sum(len(f'{{"index": {index}}}') for index in range(50))
+    check_file_in_azure(azure_service, azure_emulator_coords, '0049-house.json', '{"index": 49}')
+
+
+@pytest.mark.usefixtures('test_client', 'azure_service')
+def test_upload_members_reports_failures(azure_emulator_coords: azure_utils.StorageCoordinates,
+                                         monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                         sample_zipfile: io.BytesIO,
+                                         sample_filenames: typing.Tuple[str, str]) -> None:
+
+    def failing_upload(_coords: azure_utils.StorageCoordinates,
+                       _stream: typing.IO[bytes],
+                       filename: str,
+                       **_kwargs) -> None:
+        if filename == sample_filenames[0]:
+            raise AzureHttpError('Server busy', HTTPStatus.SERVICE_UNAVAILABLE)
+        raise ConnectionResetError('Connection reset by peer')
+
+    monkeypatch.setattr(azure_utils, 'upload_stream_to_azure', failing_upload)
+    summary = endpoint.upload_members(zipfile.ZipFile(sample_zipfile),
+                                      azure_utils.blob_service(azure_emulator_coords),
+                                      workers=2)
+
+    assert summary.uploaded == []
+    assert summary.failed == list(sample_filenames)
+
+
+@pytest.mark.usefixtures('test_client', 'azure_service')
+def test_upload_members_reports_missing(azure_emulator_coords: azure_utils.StorageCoordinates,
+                                        monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                        sample_zipfile: io.BytesIO,
+                                        sample_filenames: typing.Tuple[str, str]) -> None:
+
+    upload = azure_utils.upload_stream_to_azure
+
+    def lossy_upload(coords: azure_utils.StorageCoordinates,
+                     stream: typing.IO[bytes],
+                     filename: str,
+                     **kwargs) -> None:
+        if filename != sample_filenames[0]:
+            upload(coords, stream, filename, **kwargs)
+
+    monkeypatch.setattr(azure_utils, 'upload_stream_to_azure', lossy_upload)
+    summary = endpoint.upload_members(zipfile.ZipFile(sample_zipfile),
+                                      azure_utils.blob_service(azure_emulator_coords),
+                                      workers=2)
+
+    assert summary.uploaded == [sample_filenames[1]]
+    assert summary.missing == [sample_filenames[0]]
+    assert not summary.failed
+
+
+@pytest.mark.usefixtures('sample_secret_key')
+def test_upload_hands_off_werkzeug_spool(test_client: testing.FlaskClient,
+                                         monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                         tmpdir: py._path.local.LocalPath,
+                                         sample_timestamp: str,
+                                         sample_salt: str,
+                                         sample_zipfile_signature: str,
+                                         sample_zipfile: io.BytesIO) -> None:
+    contents = sample_zipfile.getvalue()
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmpdir))
+    monkeypatch.setattr(azure_utils, 'upload_bytes_to_azure', lambda *args: True)
+    targets: typing.List[typing.Callable[[], typing.Any]] = []
+
+    def recording_start_new_thread(target: typing.Callable[[], typing.Any]) -> None:
+        targets.append(target)
+
+    monkeypatch.setattr(endpoint.ThreadRunner, 'start_new_thread', recording_start_new_thread)
+
+    post_return = test_client.post('/upload_file', data=dict(salt=sample_salt, signature=sample_zipfile_signature,
+                                                             timestamp=sample_timestamp,
+                                                             file=(sample_zipfile, 'zipfile')))
+    assert post_return.status_code == HTTPStatus.OK
+    assert len(targets) == 1
+    spooled = typing.cast(functools.partial, targets[0]).keywords['path']
+    assert tmpdir.listdir() == [tmpdir.join(os.path.basename(spooled))]
+    with open(spooled, 'rb') as spool:
+        assert spool.read() == contents
+
+
+@pytest.mark.usefixtures('sample_secret_key')
+def test_upload_bad_signature_removes_spool(test_client: testing.FlaskClient,
+                                            monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                            tmpdir: py._path.local.LocalPath,
+                                            sample_timestamp: str,
+                                            sample_salt: str,
+                                            sample_zipfile: io.BytesIO) -> None:
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmpdir))
+    post_return = test_client.post('/upload_file', data=dict(salt=sample_salt, signature='bad signature',
+                                                             timestamp=sample_timestamp,
+                                                             file=(sample_zipfile, 'zipfile')))
+    assert post_return.status_code == HTTPStatus.BAD_REQUEST
+    assert not tmpdir.listdir()
+
+
+@pytest.mark.usefixtures('sample_secret_key')
+def test_upload_missing_field_removes_spool(test_client: testing.FlaskClient,
+                                            monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                            tmpdir: py._path.local.LocalPath,
+                                            sample_salt: str,
+                                            sample_zipfile_signature: str,
+                                            sample_zipfile: io.BytesIO) -> None:
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmpdir))
+    post_return = test_client.post('/upload_file', data=dict(salt=sample_salt, signature=sample_zipfile_signature,
+                                                             file=(sample_zipfile, 'zipfile')))
+    assert post_return.status_code == HTTPStatus.BAD_REQUEST
+    assert not tmpdir.listdir()
+
+
+def sign_part(salt: str, secret_key: str, upload_id: str, index: int, data: bytes) -> str:
+    hasher = hashlib.new('sha3_256')
+    hasher.update((salt + secret_key + f'{upload_id}:{index}:').encode())
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+@pytest.fixture
+def parts_dir(monkeypatch: _pytest.monkeypatch.MonkeyPatch, tmpdir: py._path.local.LocalPath) -> str:
+    monkeypatch.setitem(endpoint.App.config, 'UPLOAD_PARTS_DIR', str(tmpdir.join('parts')))
+    return endpoint.App.config['UPLOAD_PARTS_DIR']
+
+
+@pytest.mark.usefixtures('mocked_tl_app', 'parts_dir', 'thread_runner')
+def test_chunked_upload(azure_service: blob.BlockBlobService,
+                        azure_emulator_coords: azure_utils.StorageCoordinates,
+                        sample_filenames: typing.Tuple[str, str],
+                        sample_file_contents: typing.Tuple[str, str],
+                        test_client: testing.FlaskClient,
+                        sample_secret_key: str,
+                        sample_timestamp: str,
+                        sample_salt: str,
+                        sample_zipfile_signature: str,
+                        sample_zipfile: io.BytesIO) -> None:
+
+    upload_id = '0' * 32
+    data = sample_zipfile.getvalue()
+    parts = [data[:100], data[100:]]
+    for index in [1, 0]:
+        post_return = test_client.post('/upload_part', data=dict(
+            upload_id=upload_id, index=str(index), salt=sample_salt,
+            signature=sign_part(sample_salt, sample_secret_key, upload_id, index, parts[index]),
+            file=(io.BytesIO(parts[index]), 'part'),
+        ))
+        assert post_return.status_code == HTTPStatus.OK
+
+    status_signature = hashlib.new('sha3_256')
+    status_signature.update((sample_salt + sample_secret_key + upload_id).encode())
+    status_return = test_client.post('/upload_status', data=dict(upload_id=upload_id, salt=sample_salt,
+                                                                 signature=status_signature.hexdigest()))
+    assert json.loads(status_return.data) == {'parts': [0, 1]}
+
+    complete = dict(upload_id=upload_id, parts='2', salt=sample_salt, signature=sample_zipfile_signature,
+                    timestamp=sample_timestamp)
+    post_return = test_client.post('/upload_complete', data=complete)
+    assert post_return.status_code == HTTPStatus.OK
+    endpoint.ThreadRunner.join()
+    for name, contents in zip(sample_filenames, sample_file_contents):
+        check_file_in_azure(azure_service, azure_emulator_coords, name, contents)
+
+    post_return = test_client.post('/upload_complete', data=complete)
+    assert post_return.status_code == HTTPStatus.OK
+    post_return = test_client.post('/upload_complete', data=dict(complete, signature='bad signature'))
+    assert post_return.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_parts_file(tmpdir: py._path.local.LocalPath) -> None:
+    parts = [b'first part', b'', b'second', b'last part']
+    paths = []
+    for index, part in enumerate(parts):
+        tmpdir.join(f'{index}.part').write_binary(part)
+        paths.append(str(tmpdir.join(f'{index}.part')))
+
+    with io.BufferedReader(endpoint._PartsFile(paths), buffer_size=4) as archive:
+        assert archive.read() == b''.join(parts)
+        archive.seek(-7, io.SEEK_END)
+        assert archive.read(5) == b'st pa'
+        archive.seek(8)
+        assert archive.read(6) == b'rtseco'
+
+
+@pytest.mark.usefixtures('sample_secret_key', 'parts_dir')
+def test_chunked_upload_missing_parts(test_client: testing.FlaskClient,
+                                      sample_timestamp: str,
+                                      sample_salt: str,
+                                      sample_zipfile_signature: str) -> None:
+    post_return = test_client.post('/upload_complete', data=dict(
+        upload_id='1' * 32, parts='2', salt=sample_salt, signature=sample_zipfile_signature,
+        timestamp=sample_timestamp,
+    ))
+    assert post_return.status_code == HTTPStatus.CONFLICT
+
+
+@pytest.mark.usefixtures('sample_secret_key')
+def test_upload_part_bad_signature(test_client: testing.FlaskClient, parts_dir: str, sample_salt: str) -> None:
+    post_return = test_client.post('/upload_part', data=dict(
+        upload_id='2' * 32, index='0', salt=sample_salt, signature='bad signature',
+        file=(io.BytesIO(b'part'), 'part'),
+    ))
+    assert post_return.status_code == HTTPStatus.BAD_REQUEST
+    assert os.listdir(os.path.join(parts_dir, '2' * 32)) == []
+
+
+@pytest.mark.usefixtures('sample_secret_key', 'parts_dir')
+def test_upload_part_bad_upload_id(test_client: testing.FlaskClient, sample_salt: str) -> None:
+    post_return = test_client.post('/upload_part', data=dict(
+        upload_id='../../etc', index='0', salt=sample_salt, signature='bad signature',
+        file=(io.BytesIO(b'part'), 'part'),
+    ))
+    assert post_return.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.usefixtures('mocked_tl_app', 'sample_secret_key', 'test_client')
+def test_unzip_upload_run_tl_local_storage(monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                           tmpdir: py._path.local.LocalPath) -> None:
+    storage_dir = tmpdir.mkdir('storage')
+    monkeypatch.setenv(storage.EnvVariables.backend.value, 'local')
+    monkeypatch.setenv(storage.EnvVariables.directory.value, str(storage_dir))
+    path = str(tmpdir.join('upload.zip'))
+    with zipfile.ZipFile(path, 'w') as file_z:
+        file_z.writestr('0001-house.json', '{"index": 1}')
+
+    summary = endpoint.unzip_upload_run_tl(path)
+
+    assert summary.uploaded == ['0001-house.json']
+    assert storage_dir.join('0001-house.json').read() == '{"index": 1}'
+    assert storage_dir.join(azure_utils.JOURNAL_PREFIX.rstrip('/')).listdir()
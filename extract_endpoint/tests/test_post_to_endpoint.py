@@ -1,10 +1,12 @@
 import io
+import json
 import subprocess
 from http import HTTPStatus
 import typing
 import psutil
 import pytest
 import _pytest
+import py
 import requests
 from click import testing # type: ignore
 from azure.storage import blob
@@ -171,3 +173,161 @@ def test_status() -> None:
 
     assert result.exit_code == 0
     assert 'System Status' in result.output
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, data: bytes = b'') -> None:
+        self.status_code = status_code
+        self._data = data
+
+    def json(self) -> typing.Any:
+        return json.loads(self._data)
+
+
+class FlaskSession:
+    """Stands in for requests.Session, sending posts to the endpoint's test client"""
+
+    def __init__(self, failures: int = 0) -> None:
+        self.client = endpoint.App.test_client()
+        self.failures = failures
+        self.fail_after: typing.Optional[int] = None
+        self.paths: typing.List[str] = []
+
+    def __enter__(self) -> 'FlaskSession':
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def post(self,
+             url: str,
+             data: typing.Any,
+             files: typing.Optional[dict] = None,
+             headers: typing.Optional[typing.Dict[str, str]] = None) -> FakeResponse:
+        if self.failures or (self.fail_after is not None and len(self.paths) >= self.fail_after):
+            self.failures = max(self.failures - 1, 0)
+            if hasattr(data, 'read'):
+                data.read(100)  # the connection drops part way through the body
+            raise requests.exceptions.ConnectionError('dropped')
+        path = '/' + url.rsplit('/', 1)[1]
+        self.paths.append(path)
+        if hasattr(data, 'read'):
+            body = b''.join(iter(lambda: data.read(8192), b''))
+            response = self.client.post(path, data=body, content_type=(headers or {})['Content-Type'])
+        else:
+            form: typing.Dict[str, typing.Any] = dict(data)
+            if files:
+                form['file'] = (io.BytesIO(files['file']), 'file')
+            response = self.client.post(path, data=form)
+        return FakeResponse(response.status_code, response.data)
+
+
+@pytest.fixture
+def flask_session(monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                  tmpdir: py._path.local.LocalPath,
+                  azure_emulator_coords: azure_utils.StorageCoordinates,
+                  sample_secret_key: str) -> typing.Generator:
+
+    monkeypatch.setenv('ETL_SECRET_KEY', sample_secret_key)
+    monkeypatch.setitem(endpoint.App.config, 'AZURE_COORDINATES', azure_emulator_coords)
+    monkeypatch.setitem(endpoint.App.config, 'UPLOAD_PARTS_DIR', str(tmpdir.join('parts')))
+    monkeypatch.setattr(endpoint, 'run_tl', lambda: HTTPStatus.OK)
+    session = FlaskSession()
+    monkeypatch.setattr(requests, 'Session', lambda: session)
+    yield session
+    endpoint.ThreadRunner.join()
+
+
+@pytest.mark.usefixtures('azure_service')
+def test_post_stream_chunked(flask_session: FlaskSession,
+                             sample_zipfile: io.BytesIO,
+                             sample_timestamp: str) -> None:
+    flask_session.failures = 2
+    return_code = post_to_endpoint.post_stream_chunked(sample_zipfile, sample_timestamp, 'http://endpoint',
+                                                       chunk_size=64, retries=2, backoff=0)
+    assert return_code == HTTPStatus.OK
+    assert flask_session.paths[-1] == '/upload_complete'
+    assert flask_session.paths.count('/upload_part') == -(-len(sample_zipfile.getvalue()) // 64)
+
+
+@pytest.mark.usefixtures('azure_service')
+def test_post_stream_chunked_resumes(flask_session: FlaskSession,
+                                     sample_zipfile: io.BytesIO,
+                                     sample_timestamp: str) -> None:
+    upload_id = 'a' * 32
+    data = sample_zipfile.getvalue()
+    flask_session.fail_after = 3  # the status request and the first two parts get through
+    return_code = post_to_endpoint.post_stream_chunked(io.BytesIO(data), sample_timestamp, 'http://endpoint',
+                                                       chunk_size=64, upload_id=upload_id, retries=0, backoff=0)
+    assert return_code == HTTPStatus.BAD_GATEWAY
+    flask_session.fail_after = None
+    flask_session.paths.clear()
+
+    return_code = post_to_endpoint.post_stream_chunked(io.BytesIO(data), sample_timestamp, 'http://endpoint',
+                                                       chunk_size=64, upload_id=upload_id, retries=0, backoff=0)
+    assert return_code == HTTPStatus.OK
+    assert flask_session.paths.count('/upload_part') == -(-len(data) // 64) - 2
+
+
+def test_post_with_retry_gives_up(flask_session: FlaskSession) -> None:
+    flask_session.failures = 3
+    session = typing.cast(requests.Session, flask_session)
+    assert post_to_endpoint._post_with_retry(session, 'http://endpoint/upload_status', retries=2,
+                                             backoff=0, data={}) == HTTPStatus.BAD_GATEWAY
+
+
+class BlockStream(io.BytesIO):
+    """Fails when read whole, as a large upload should only ever be read in blocks"""
+
+    def read(self, size: typing.Optional[int] = -1) -> bytes:
+        assert size is not None and size >= 0
+        return super().read(size)
+
+
+@pytest.mark.usefixtures('azure_service')
+def test_post_stream(flask_session: FlaskSession,
+                     sample_zipfile: io.BytesIO,
+                     sample_timestamp: str) -> None:
+    flask_session.failures = 1
+    return_code = post_to_endpoint.post_stream(BlockStream(sample_zipfile.getvalue()), sample_timestamp,
+                                               'http://endpoint/upload_file', retries=1, backoff=0)
+    assert return_code == HTTPStatus.OK
+    assert flask_session.paths == ['/upload_file']
+
+
+@pytest.mark.usefixtures('azure_service')
+def test_post_stream_not_retried_once_sent(flask_session: FlaskSession,
+                                           sample_zipfile: io.BytesIO,
+                                           sample_timestamp: str,
+                                           monkeypatch: _pytest.monkeypatch.MonkeyPatch) -> None:
+    post = flask_session.post
+
+    def losing_post(url: str, data: typing.Any, **kwargs) -> FakeResponse:
+        post(url, data, **kwargs)
+        raise requests.exceptions.ConnectionError('response lost')
+
+    monkeypatch.setattr(flask_session, 'post', losing_post)
+    return_code = post_to_endpoint.post_stream(sample_zipfile, sample_timestamp, 'http://endpoint/upload_file',
+                                               retries=2, backoff=0)
+    assert return_code == HTTPStatus.BAD_GATEWAY
+    assert flask_session.paths == ['/upload_file']
+
+
+@pytest.mark.usefixtures('azure_service')
+def test_post_stream_chunked_retries_completion(flask_session: FlaskSession,
+                                                sample_zipfile: io.BytesIO,
+                                                sample_timestamp: str,
+                                                monkeypatch: _pytest.monkeypatch.MonkeyPatch) -> None:
+    post = flask_session.post
+
+    def losing_post(url: str, data: typing.Any, **kwargs) -> FakeResponse:
+        response = post(url, data, **kwargs)
+        if url.endswith('/upload_complete') and flask_session.paths.count('/upload_complete') == 1:
+            raise requests.exceptions.ConnectionError('response lost')
+        return response
+
+    monkeypatch.setattr(flask_session, 'post', losing_post)
+    return_code = post_to_endpoint.post_stream_chunked(sample_zipfile, sample_timestamp, 'http://endpoint',
+                                                       chunk_size=64, retries=1, backoff=0)
+    assert return_code == HTTPStatus.OK
+    assert flask_session.paths.count('/upload_complete') == 2
@@ -1,3 +1,4 @@
+import functools
 import typing
 import os
 import click
@@ -5,11 +6,92 @@ from energuide import database
 from energuide import transform
 from energuide import extractor
 from energuide import logger
+from energuide import sink
 
 
 LOGGER = logger.get_logger(__name__)
 
 
+class ReaderOptions(typing.NamedTuple):
+    """Where `load` reads the extracted dwellings from and how it transforms them"""
+    azure: bool = False
+    azure_workers: int = transform.DOWNLOAD_WORKERS
+    azure_prefetch: int = transform.PREFETCH_DEPTH
+    azure_journal: bool = False
+    filename: typing.Optional[str] = None
+    progress: bool = True
+    transform_workers: int = 1
+    raw_bson: bool = False
+
+
+class WriterOptions(typing.NamedTuple):
+    """Where `load` writes the transformed dwellings to: MongoDB, or `outfile` when it is set"""
+    update: bool = True
+    batch_size: int = database.CHUNKSIZE
+    writers: int = database.WRITERS
+    defer_indexes: bool = False
+    staged: bool = False
+    outfile: typing.Optional[str] = None
+    output_format: str = 'bson'
+    compress: bool = False
+
+
+Command = typing.Callable[..., None]
+
+
+def _option_group(name: str,
+                  group: typing.Union[typing.Type[ReaderOptions], typing.Type[WriterOptions]],
+                 ) -> typing.Callable[[Command], Command]:
+    """Pass the options named by the fields of `group` to the command as a single `name` argument"""
+    def decorator(command: Command) -> Command:
+        @functools.wraps(command)
+        def grouped(**kwargs: typing.Any) -> None:
+            kwargs[name] = group(**{field: kwargs.pop(field) for field in group._fields})
+            command(**kwargs)
+        return grouped
+    return decorator
+
+
+def load_dwellings(coords: database.DatabaseCoordinates,
+                   db_name: str,
+                   collection: str,
+                   reader_options: ReaderOptions,
+                   writer_options: WriterOptions) -> None:
+    destination = writer_options.outfile or f'{db_name}.{collection}'
+    reader: transform.ExtractProtocol
+    if reader_options.azure:
+        LOGGER.info(f'Loading data from Azure into {destination}')
+        azure_coords = transform.AzureCoordinates.from_env()
+        reader_type = transform.AzureJournalReader if reader_options.azure_journal else transform.AzureExtractReader
+        reader = reader_type(azure_coords,
+                             workers=reader_options.azure_workers,
+                             prefetch_depth=reader_options.azure_prefetch)
+    elif reader_options.filename:
+        LOGGER.info(f'Loading data from {reader_options.filename} into {destination}')
+        reader = transform.local_extract_reader(reader_options.filename, reader_options.progress)
+    else:
+        LOGGER.error('Must supply a filename or use azure')
+        raise ValueError('Must supply a filename or use azure')
+    data = transform.transform(reader,
+                               reader_options.progress,
+                               workers=reader_options.transform_workers,
+                               raw_bson_documents=reader_options.raw_bson)
+    output: sink.Sink
+    if writer_options.outfile:
+        output = sink.FileSink(writer_options.outfile, writer_options.output_format, writer_options.compress)
+    else:
+        output = sink.MongoSink(coords,
+                                db_name,
+                                collection,
+                                update=writer_options.update,
+                                batch_size=writer_options.batch_size,
+                                writers=writer_options.writers,
+                                defer_indexes=writer_options.defer_indexes,
+                                staged=writer_options.staged)
+    output.write(data)
+    LOGGER.info(f'Finished loading data')
+
+
 @click.group()
 def main() -> None:
     pass
@@ -44,6 +126,17 @@ def main() -> None:
 @click.option('--azure',
               is_flag=True,
               help='Download data from Azure')
+@click.option('--azure-workers',
+              default=transform.DOWNLOAD_WORKERS,
+              type=click.IntRange(min=1),
+              help='Number of threads downloading files from Azure')
+@click.option('--azure-prefetch',
+              default=transform.PREFETCH_DEPTH,
+              type=click.IntRange(min=1),
+              help='Maximum number of Azure files downloaded ahead of the transform')
+@click.option('--azure-journal/--azure-listing',
+              default=False,
+              help='Read only the Azure files named in unconsumed upload journals instead of listing the container')
 @click.option('--filename',
               type=click.Path(exists=True),
               required=False,
@@ -58,19 +151,57 @@ def main() -> None:
               envvar=database.EnvVariables.production.value,
               default=False,
               help='Generate a connection string to an Atlas managed MongoDB instance')
+@click.option('--transform-workers',
+              default=1,
+              type=click.IntRange(min=1),
+              help='Number of processes used to transform dwellings')
+@click.option('--raw-bson/--no-raw-bson',
+              default=False,
+              help='Encode dwellings to BSON while transforming, so the loader sends them without re-encoding')
+@click.option('--batch-size',
+              default=database.CHUNKSIZE,
+              type=click.IntRange(min=1),
+              help='Number of dwellings written to MongoDB per bulk request')
+@click.option('--writers',
+              default=database.WRITERS,
+              type=click.IntRange(min=1),
+              help='Number of bulk requests sent to MongoDB concurrently')
+@click.option('--defer-indexes/--no-defer-indexes',
+              default=False,
+              help='With --no-update, build the collection indexes after loading instead of before')
+@click.option('--staged/--in-place',
+              default=False,
+              help='With --no-update, load into a staging collection and swap it in once it is complete')
+@click.option('--outfile',
+              type=click.Path(),
+              required=False,
+              help='Write the dwellings to this file instead of MongoDB, for mongorestore or mongoimport')
+@click.option('--format', 'output_format',
+              default='bson',
+              type=click.Choice(sink.FILE_FORMATS),
+              help='Format of --outfile: BSON documents for mongorestore, or JSON Lines for mongoimport')
+@click.option('--compress/--no-compress',
+              default=False,
+              help='Gzip --outfile')
+@_option_group('reader_options', ReaderOptions)
+@_option_group('writer_options', WriterOptions)
 def load(username: str,
          password: str,
          host: str,
          port: int,
          db_name: str,
          collection: str,
-         azure: bool,
-         filename: typing.Optional[str],
-         update: bool,
-         progress: bool,
          production: bool,
+         reader_options: ReaderOptions,
+         writer_options: WriterOptions,
         ) -> None:
 
+    for flag, is_set in (('--staged', writer_options.staged), ('--defer-indexes', writer_options.defer_indexes)):
+        if is_set and writer_options.update:
+            raise click.UsageError(f'{flag} rebuilds the collection, so it needs --no-update')
+        if is_set and writer_options.outfile:
+            raise click.UsageError(f'{flag} applies to loads into MongoDB, not to --outfile')
+
     coords = database.DatabaseCoordinates(
         username=username,
         password=password,
@@ -78,21 +209,54 @@ def load(username: str,
         port=port,
         production=production
     )
+    load_dwellings(coords, db_name, collection, reader_options, writer_options)
 
-    reader: transform.ExtractProtocol
-    if azure:
-        LOGGER.info(f'Loading data from Azure into {db_name}.{collection}')
-        azure_coords = transform.AzureCoordinates.from_env()
-        reader = transform.AzureExtractReader(azure_coords)
-    elif filename:
-        LOGGER.info(f'Loading data from {filename} into {db_name}.{collection}')
-        reader = transform.LocalExtractReader(filename)
-    else:
-        LOGGER.error('Must supply a filename or use azure')
-        raise ValueError('Must supply a filename or use azure')
-    data = transform.transform(reader, progress)
-    database.load(coords, db_name, collection, data, update)
-    LOGGER.info(f'Finished loading data')
+
+@main.command()
+@click.option('--username',
+              envvar=database.EnvVariables.username.value,
+              default=database.EnvDefaults.username.value,
+              help='Username for MongoDB Server')
+@click.option('--password',
+              envvar=database.EnvVariables.password.value,
+              default=database.EnvDefaults.password.value,
+              help='Password for MongoDB Server')
+@click.option('--host',
+              envvar=database.EnvVariables.host.value,
+              default=database.EnvDefaults.host.value,
+              help='Hostname for MongoDB Server')
+@click.option('--port',
+              envvar=database.EnvVariables.port.value,
+              default=database.EnvDefaults.port.value,
+              type=int,
+              help='Port for MongoDB Server')
+@click.option('--db_name',
+              envvar=database.EnvVariables.database.value,
+              default=database.EnvDefaults.database.value,
+              help='Database name for MongoDB Server')
+@click.option('--collection',
+              envvar=database.EnvVariables.collection.value,
+              default=database.EnvDefaults.collection.value,
+              help='Collection to restore from the one replaced by the last staged load')
+@click.option('--production/--local',
+              envvar=database.EnvVariables.production.value,
+              default=False,
+              help='Generate a connection string to an Atlas managed MongoDB instance')
+def rollback(username: str,
+             password: str,
+             host: str,
+             port: int,
+             db_name: str,
+             collection: str,
+             production: bool) -> None:
+    coords = database.DatabaseCoordinates(
+        username=username,
+        password=password,
+        host=host,
+        port=port,
+        production=production
+    )
+    database.rollback(coords, db_name, collection)
 
 
 @main.command()
@@ -105,11 +269,19 @@ def load(username: str,
               type=click.Path(),
               help='Path to output file')
 @click.option('--progress/--no-progress', default=True)
-def extract(infile: str, outfile: str, progress: bool) -> None:
+@click.option('--workers',
+              default=1,
+              type=click.IntRange(min=1),
+              help='Number of processes used to extract rows')
+@click.option('--format', 'output_format',
+              default='zip',
+              type=click.Choice(extractor.OUTPUT_FORMATS),
+              help='Output format: a zip of JSON files, or gzipped JSON Lines sorted by file name')
+def extract(infile: str, outfile: str, progress: bool, workers: int, output_format: str) -> None:
     LOGGER.info(f'Extracting data from {infile} into {outfile}')
     if os.path.exists(outfile):
         LOGGER.warning(f'Warning: file {outfile} exists. Overwriting.')
-    extracted = extractor.extract_data(infile, show_progress=progress)
-    records_written, records_failed = extractor.write_data(extracted, outfile)
+    extracted = extractor.extract_data(infile, show_progress=progress, workers=workers)
+    records_written, records_failed = extractor.write_data(extracted, outfile, output_format)
     LOGGER.info(f'Finished extracting data into {outfile}. '
                 f'Successfully written: {records_written}. Failed: {records_failed}')
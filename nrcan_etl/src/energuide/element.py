@@ -1,3 +1,6 @@
+import functools
+import re
+import threading
 import typing
 from lxml import etree
 from energuide.exceptions import EnerguideError, ElementGetValueError
@@ -9,10 +12,48 @@ class MalformedXmlError(EnerguideError):
 
 T = typing.TypeVar('T', int, float, str)
 
+XPATH_CACHE_SIZE = 1024
 
-class Element:
+# relative paths made only of child steps mean the same thing to ElementPath (find/findtext) and XPath
+_SIMPLE_PATH = re.compile(r'^(\*|[A-Za-z_][\w.-]*)(/(\*|[A-Za-z_][\w.-]*))*$')
+
+
+@functools.lru_cache(maxsize=XPATH_CACHE_SIZE)
+def compiled_xpath(path: str) -> etree.XPath:
+    """Process-wide cache of compiled XPath expressions, keyed by the path string"""
+    return etree.XPath(path)
+
+
+def xpath_cache_info() -> typing.Any:
+    """Hits, misses and size of the compiled XPath cache"""
+    return compiled_xpath.cache_info()
+
+
+# lxml parsers keep per-parse state and must not be shared between threads, so each thread gets its own
+_THREAD_PARSERS = threading.local()
 
-    _PARSER = etree.XMLParser(ns_clean=True, recover=True, encoding='utf-8')
+
+def xml_parser(huge_tree: bool = False, remove_blank_text: bool = False) -> etree.XMLParser:
+    """The calling thread's parser for the given options, created on first use"""
+    parsers: typing.Optional[typing.Dict[typing.Tuple[bool, bool], etree.XMLParser]] = \
+        getattr(_THREAD_PARSERS, 'parsers', None)
+    if parsers is None:
+        parsers = _THREAD_PARSERS.parsers = {}
+
+    key = (huge_tree, remove_blank_text)
+    parser = parsers.get(key)
+    if parser is None:
+        parser = parsers[key] = etree.XMLParser(
+            ns_clean=True,
+            recover=True,
+            encoding='utf-8',
+            huge_tree=huge_tree,
+            remove_blank_text=remove_blank_text,
+        )
+    return parser
+
+
+class Element:
 
     def __init__(self, node: etree._Element) -> None:
         self.__node = node
@@ -22,8 +63,9 @@ class Element:
         return cls(etree.Element(tag))
 
     @classmethod
-    def from_string(cls, data: str) -> 'Element':
-        output: typing.Optional[etree._Element] = etree.fromstring(data.encode('utf-8'), parser=cls._PARSER)
+    def from_string(cls, data: str, huge_tree: bool = False, remove_blank_text: bool = False) -> 'Element':
+        parser = xml_parser(huge_tree=huge_tree, remove_blank_text=remove_blank_text)
+        output: typing.Optional[etree._Element] = etree.fromstring(data.encode('utf-8'), parser=parser)
         if output is None:
             raise MalformedXmlError(f'Invalid XML fragment: {data}')
         return cls(output)
@@ -33,11 +75,18 @@ class Element:
         output = etree.parse(*args, **kwargs)
         return cls(output.find('.'))
 
+    def _find_simple(self, path: str) -> typing.Optional[etree._Element]:
+        nodes = compiled_xpath(path)(self.__node)
+        return nodes[0] if nodes else None
+
     def findtext(self, *args, **kwargs) -> typing.Optional[str]:
+        if len(args) == 1 and not kwargs and _SIMPLE_PATH.match(args[0]):
+            node = self._find_simple(args[0])
+            return (node.text or '') if node is not None else None
         return self.__node.findtext(*args, **kwargs)
 
     def get_text(self, *args, **kwargs) -> str:
-        result: typing.Optional[str] = self.__node.findtext(*args, **kwargs)
+        result: typing.Optional[str] = self.findtext(*args, **kwargs)
         if result is None:
             error_message = (
                 f"Couldn't find text at path {args[0]} in tag {self.tag}"
@@ -52,11 +101,17 @@ class Element:
         return self.__node.attrib
 
     def xpath(self, *args, **kwargs) -> typing.List[typing.Any]:
-        output = self.__node.xpath(*args, **kwargs)
+        if len(args) == 1 and not kwargs:
+            output = compiled_xpath(args[0])(self.__node)
+        else:
+            output = self.__node.xpath(*args, **kwargs)
         return [Element(node) if isinstance(node, etree._Element) else node for node in output]
 
     def find(self, *args, **kwargs) -> typing.Optional['Element']:
-        output = self.__node.find(*args, **kwargs)
+        if len(args) == 1 and not kwargs and _SIMPLE_PATH.match(args[0]):
+            output = self._find_simple(args[0])
+        else:
+            output = self.__node.find(*args, **kwargs)
         return Element(output) if output is not None else None
 
     def to_string(self) -> str:
@@ -75,7 +130,7 @@ class Element:
 
     def get(self, xpath: str, type_: typing.Type[T]) -> T:
         try:
-            value = self.__node.xpath(xpath)[0]
+            value = compiled_xpath(xpath)(self.__node)[0]
         except IndexError as ex:
             raise ElementGetValueError(f"Couldn't find element at {xpath} in {self.tag}") from ex
 
@@ -25,3 +25,11 @@ class InvalidEmbeddedDataTypeError(EnerguideError):
 
 class ElementGetValueError(EnerguideError):
     pass
+
+
+class MissingBlobError(EnerguideError):
+    pass
+
+
+class LoadSanityError(EnerguideError):
+    pass
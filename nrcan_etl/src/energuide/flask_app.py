@@ -37,21 +37,16 @@ DATABASE_NAME = os.environ.get(database.EnvVariables.database.value, default=dat
 
 COLLECTION = os.environ.get(database.EnvVariables.collection.value, default=database.EnvDefaults.collection.value)
 
+AZURE_JOURNAL = os.environ.get('TL_AZURE_JOURNAL', '').lower() in ('1', 'true', 'yes')
+
 
 def _run_tl_and_verify() -> None:
     LOGGER.info("TL starting")
-    cli.load.callback(username=DATABASE_COORDS.username,
-                      password=DATABASE_COORDS.password,
-                      host=DATABASE_COORDS.host,
-                      port=DATABASE_COORDS.port,
-                      db_name=DATABASE_NAME,
-                      collection=COLLECTION,
-                      azure=True,
-                      filename=None,
-                      update=True,
-                      progress=False,
-                      production=DATABASE_COORDS.production
-                     )
+    cli.load_dwellings(DATABASE_COORDS,
+                       DATABASE_NAME,
+                       COLLECTION,
+                       cli.ReaderOptions(azure=True, azure_journal=AZURE_JOURNAL, progress=False),
+                       cli.WriterOptions())
 
     mongo_client: pymongo.MongoClient
     with database.mongo_client(DATABASE_COORDS) as mongo_client:
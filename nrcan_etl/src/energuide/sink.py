@@ -0,0 +1,111 @@
+import gzip
+import os
+import tempfile
+import time
+import typing
+import typing_extensions
+import bson
+from bson import json_util
+from bson import raw_bson
+from energuide import database
+from energuide import logger
+
+
+LOGGER = logger.get_logger(__name__)
+
+FILE_FORMATS = ['bson', 'jsonl']
+
+
+def _umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+class Sink(typing_extensions.Protocol):
+    def write(self, data: typing.Iterable[database.Row]) -> database.LoadSummary:
+        pass
+
+
+class MongoSink:
+    """Loads the dwellings into a live collection with `database.load`"""
+
+    def __init__(self,
+                 coords: database.DatabaseCoordinates,
+                 database_name: str,
+                 collection_name: str,
+                 update: bool = True,
+                 batch_size: int = database.CHUNKSIZE,
+                 writers: int = database.WRITERS,
+                 defer_indexes: bool = False,
+                 staged: bool = False) -> None:
+        self._coords = coords
+        self._database_name = database_name
+        self._collection_name = collection_name
+        self._update = update
+        self._batch_size = batch_size
+        self._writers = writers
+        self._defer_indexes = defer_indexes
+        self._staged = staged
+
+    def write(self, data: typing.Iterable[database.Row]) -> database.LoadSummary:
+        return database.load(self._coords,
+                             self._database_name,
+                             self._collection_name,
+                             data,
+                             update=self._update,
+                             batch_size=self._batch_size,
+                             writers=self._writers,
+                             defer_indexes=self._defer_indexes,
+                             staged=self._staged)
+
+
+class FileSink:
+    """Writes the dwellings to a file for restoring into MongoDB elsewhere.
+
+    'bson' is a concatenation of BSON documents, as read by `mongorestore` (with --gzip when compressed), and 'jsonl'
+    is one extended JSON document per line, as read by `mongoimport`. Documents carry their content hash, so later
+    incremental loads into the restored collection still skip unchanged dwellings. The file is written under a
+    temporary name and renamed into place when complete.
+    """
+
+    def __init__(self, path: str, file_format: str = 'bson', compress: bool = False) -> None:
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f'Unknown file format {file_format}, expected one of {", ".join(FILE_FORMATS)}')
+        self._path = path
+        self._file_format = file_format
+        self._compress = compress
+
+    def _encode(self, row: database.Row) -> bytes:
+        document = database.to_document(row)
+        if self._file_format == 'bson':
+            return document.raw if isinstance(document, raw_bson.RawBSONDocument) else bson.BSON.encode(document)
+
+        if isinstance(document, raw_bson.RawBSONDocument):
+            document = bson.BSON(document.raw).decode()
+        return json_util.dumps(document).encode() + b'\n'
+
+    def write(self, data: typing.Iterable[database.Row]) -> database.LoadSummary:
+        start = time.monotonic()
+        written = 0
+        directory = os.path.dirname(os.path.abspath(self._path))
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='.', delete=False) as raw_file:
+            output: typing.Union[gzip.GzipFile, typing.IO[bytes]] = \
+                gzip.GzipFile(fileobj=raw_file, mode='wb') if self._compress else raw_file
+            try:
+                for row in data:
+                    output.write(self._encode(row))
+                    written += 1
+                if self._compress:
+                    output.close()
+            except BaseException:
+                raw_file.close()
+                os.remove(raw_file.name)
+                raise
+        # NamedTemporaryFile creates the file readable by its owner only
+        os.chmod(raw_file.name, 0o666 & ~_umask())
+        os.replace(raw_file.name, self._path)
+
+        seconds = time.monotonic() - start
+        LOGGER.info(f"wrote {written} rows to {self._path} in {seconds:.1f}s")
+        return database.LoadSummary(written=written, skipped=0, failed=0, seconds=seconds)
@@ -1,28 +1,35 @@
+import collections
+import gzip
 import itertools
 import json
 import os
 import typing
 import zipfile
+from concurrent import futures
+from bson import raw_bson
 from tqdm import tqdm
 import typing_extensions
-from azure.storage import blob
+from energuide import database
 from energuide import dwelling
 from energuide import logger
+from energuide import storage
 from energuide.exceptions import InvalidEmbeddedDataTypeError
 from energuide.exceptions import EnerguideError
 
 
 LOGGER = logger.get_logger(__name__)
 
+TRANSFORM_BATCH_SIZE = 100
 
-class _AzureCoordinates(typing.NamedTuple):
-    account: str
-    key: str
-    container: str
-    domain: typing.Optional[str]
+DOWNLOAD_WORKERS = 8
 
+PREFETCH_DEPTH = 32
 
-class AzureCoordinates(_AzureCoordinates):
+Document = typing.Dict[str, typing.Any]
+TransformedDocument = typing.Union[Document, raw_bson.RawBSONDocument]
+
+
+class AzureCoordinates(storage.StorageCoordinates):
     @classmethod
     def from_env(cls) -> 'AzureCoordinates':
         return AzureCoordinates(
@@ -37,7 +44,7 @@ class ExtractProtocol(typing_extensions.Protocol):
     def extracted_rows(self) -> typing.Iterator[typing.Dict[str, typing.Any]]:
         pass
 
-    def num_rows(self) -> int:
+    def num_rows(self) -> typing.Optional[int]:
         pass
 
 
@@ -59,50 +66,120 @@ class LocalExtractReader:
             return len(zip_input.namelist())
 
 
+class LocalJsonLinesExtractReader:
+    """Reads the `jsonl.gz` output of `energuide extract`, which is already sorted by file name.
+
+    Counting the rows would mean decompressing the whole file, so the reader reports progress itself, as the
+    compressed bytes read against the file size.
+    """
+
+    def __init__(self, jsonl_filename: str, show_progress: bool = False) -> None:
+        self._jsonl_filename = jsonl_filename
+        self._show_progress = show_progress
+
+    def extracted_rows(self) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        total_bytes = os.stat(self._jsonl_filename).st_size
+        with tqdm(total=total_bytes, unit='B', unit_scale=True, disable=not self._show_progress) as progress, \
+                open(self._jsonl_filename, 'rb') as compressed, \
+                gzip.open(compressed, 'rt', encoding='utf-8') as jsonl_input:
+            for line in jsonl_input:
+                yield json.loads(line)
+                progress.update(compressed.tell() - progress.n)
+
+    def num_rows(self) -> typing.Optional[int]:
+        return None
+
+
+def local_extract_reader(filename: str, show_progress: bool = False) -> ExtractProtocol:
+    if filename.endswith('.jsonl.gz'):
+        return LocalJsonLinesExtractReader(filename, show_progress)
+    return LocalExtractReader(filename)
+
+
 class AzureExtractReader:
+    """Reads new extract files from blob storage: Azure, or a local directory chosen through `storage.from_env`.
+
+    Downloads run on up to `workers` threads and stay at most `prefetch_depth` files ahead of the consumer, so
+    memory is capped at roughly `prefetch_depth` blobs. Files are still yielded in sorted name order.
+
+    New files are found in a single listing of the container. A dwelling counts as changed if any of its files
+    was modified since the last TL start, and every file of a changed dwelling is read.
+    """
     tl_start_filename = 'timestamp_tl_start.txt'
 
-    def __init__(self, coords: AzureCoordinates) -> None:
+    def __init__(self,
+                 coords: AzureCoordinates,
+                 workers: int = DOWNLOAD_WORKERS,
+                 prefetch_depth: int = PREFETCH_DEPTH,
+                 storage_service: typing.Optional[storage.Storage] = None) -> None:
+        if workers < 1 or prefetch_depth < 1:
+            raise ValueError('workers and prefetch_depth must be at least 1')
         self._coords = coords
-        self._azure: typing.Optional[blob.BlockBlobService] = None
+        self._workers = workers
+        self._prefetch_depth = prefetch_depth
+        self._storage_service = storage_service
         self._new_file_list: typing.Optional[typing.List[str]] = None
 
 
     @property
-    def _azure_service(self) -> blob.BlockBlobService:
-        if self._azure is None:
-            self._azure = blob.BlockBlobService(account_name=self._coords.account,
-                                                account_key=self._coords.key,
-                                                custom_domain=self._coords.domain)
-        return self._azure
+    def _storage(self) -> storage.Storage:
+        if self._storage_service is None:
+            self._storage_service = storage.from_env(self._coords)
+        return self._storage_service
 
     @property
     def _new_files(self) -> typing.List[str]:
         if self._new_file_list is None:
-            if self._azure_service.exists(self._coords.container, self.tl_start_filename):
-                etl_start_properties = self._azure_service.get_blob_properties(self._coords.container,
-                                                                               self.tl_start_filename)
-                last_etl_start = etl_start_properties.properties.last_modified
-
-                self._azure_service.create_blob_from_text(self._coords.container, self.tl_start_filename, 'TL start')
-
-                new_blobs = [blob_ for blob_ in self._azure_service.list_blobs(self._coords.container)
-                             if 'timestamp' not in blob_.name and blob_.properties.last_modified >= last_etl_start]
-                new_eval_ids = set(blob_.name.split('-')[0] for blob_ in new_blobs if '-' in blob_.name)
-
-                self._new_file_list = sorted([blob_.name
-                                              for blob_ in self._azure_service.list_blobs(self._coords.container)
-                                              if '-' in blob_.name and blob_.name.split('-')[0] in new_eval_ids])
-            else:
-                self._azure_service.create_blob_from_text(self._coords.container, self.tl_start_filename, 'TL start')
-                self._new_file_list = sorted([blob_.name
-                                              for blob_ in self._azure_service.list_blobs(self._coords.container)
-                                              if 'timestamp' not in blob_.name])
+            self._new_file_list = self._find_new_files()
         return self._new_file_list
 
+    def _find_new_files(self) -> typing.List[str]:
+        last_etl_start = None
+        if self._storage.exists(self.tl_start_filename):
+            last_etl_start = self._storage.info(self.tl_start_filename).last_modified
+
+        self._storage.put(self.tl_start_filename, b'TL start')
+
+        blobs = [blob_ for blob_ in self._storage.list() if 'timestamp' not in blob_.name]
+        if last_etl_start is None:
+            return sorted(blob_.name for blob_ in blobs)
+
+        files_by_eval_id: typing.Dict[str, typing.List[str]] = collections.defaultdict(list)
+        new_eval_ids: typing.Set[str] = set()
+        for blob_ in blobs:
+            if '-' not in blob_.name:
+                continue
+            eval_id = blob_.name.split('-')[0]
+            files_by_eval_id[eval_id].append(blob_.name)
+            if blob_.last_modified >= last_etl_start:
+                new_eval_ids.add(eval_id)
+
+        return sorted(name for eval_id in new_eval_ids for name in files_by_eval_id[eval_id])
+
+    def _download(self, file: str) -> bytes:
+        return self._storage.get(file)
+
+    def _prefetched(self) -> typing.Iterator[typing.Tuple[str, bytes]]:
+        files = iter(self._new_files)
+        pending: typing.Deque[typing.Tuple[str, futures.Future]] = collections.deque()
+        executor = futures.ThreadPoolExecutor(max_workers=self._workers)
+        try:
+            for file in itertools.islice(files, self._prefetch_depth):
+                pending.append((file, executor.submit(self._download, file)))
+
+            while pending:
+                file, future = pending.popleft()
+                content = future.result()
+                for next_file in itertools.islice(files, 1):
+                    pending.append((next_file, executor.submit(self._download, next_file)))
+                yield file, content
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
     def extracted_rows(self) -> typing.Iterator[typing.Dict[str, typing.Any]]:
-        for file in self._new_files:
-            content = self._azure_service.get_blob_to_bytes(self._coords.container, file).content
+        for file, content in self._prefetched():
             house = json.loads(content)
             house['jsonFileName'] = file
             yield house
@@ -111,39 +188,166 @@ class AzureExtractReader:
         return len(self._new_files)
 
 
+def _listing_prefixes(eval_ids: typing.Iterable[str], trim: int) -> typing.List[str]:
+    """Blob name prefixes that together cover every file of `eval_ids`, sharing one listing between neighbouring ids
+
+    Ids of the same length that only differ in their last `trim` characters share a prefix. A prefix can also match
+    files of other eval ids, so listings still have to be filtered.
+    """
+    prefixes: typing.List[str] = []
+    for prefix in sorted({eval_id[:max(len(eval_id) - trim, 1)] for eval_id in eval_ids}):
+        if not prefixes or not prefix.startswith(prefixes[-1]):
+            prefixes.append(prefix)
+    return prefixes
+
+
+class AzureJournalReader(AzureExtractReader):
+    """Reads only the files recorded in upload journals that no earlier run has consumed.
+
+    The extract endpoint writes one journal blob per upload batch under `journal_prefix`. The names of the journals
+    read so far are kept in `consumed_filename`, rather than the name of the last one, so a journal that shows up
+    late is still read. The list is only saved once every row has been yielded, so an interrupted run is picked up
+    again by the next one.
+    """
+    journal_prefix = 'timestamp_journal/'
+    consumed_filename = 'timestamp_journal_consumed.json'
+    listing_prefix_trim = 2
+
+    def __init__(self,
+                 coords: AzureCoordinates,
+                 workers: int = DOWNLOAD_WORKERS,
+                 prefetch_depth: int = PREFETCH_DEPTH,
+                 storage_service: typing.Optional[storage.Storage] = None) -> None:
+        super().__init__(coords, workers=workers, prefetch_depth=prefetch_depth, storage_service=storage_service)
+        self._consumed: typing.Set[str] = set()
+        self._new_journals: typing.List[str] = []
+
+    def _read_consumed(self) -> typing.Set[str]:
+        if not self._storage.exists(self.consumed_filename):
+            return set()
+        return set(json.loads(self._storage.get(self.consumed_filename)))
+
+    def _find_new_files(self) -> typing.List[str]:
+        self._consumed = self._read_consumed()
+        self._new_journals = sorted(blob_.name for blob_ in self._storage.list(prefix=self.journal_prefix)
+                                    if blob_.name not in self._consumed)
+
+        new_eval_ids: typing.Set[str] = set()
+        for journal in self._new_journals:
+            content = self._storage.get(journal)
+            new_eval_ids.update(name.split('-')[0] for name in json.loads(content)['files'] if '-' in name)
+
+        return sorted(blob_.name
+                      for prefix in _listing_prefixes(new_eval_ids, self.listing_prefix_trim)
+                      for blob_ in self._storage.list(prefix=prefix)
+                      if '-' in blob_.name and blob_.name.split('-')[0] in new_eval_ids)
+
+    def extracted_rows(self) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        yield from super().extracted_rows()
+        if self._new_journals:
+            consumed = sorted(self._consumed.union(self._new_journals))
+            self._storage.put(self.consumed_filename, json.dumps(consumed).encode())
+
+
 def _read_groups(extracted_rows: typing.Iterable[typing.Dict[str, typing.Any]]
                 ) -> typing.Iterator[typing.List[typing.Dict[str, typing.Any]]]:
     for group in itertools.groupby(extracted_rows, lambda y: y.get(dwelling.Dwelling.GROUPING_FIELD)):
         yield [x for x in group[1]]
 
 
-def _generate_dwellings(grouped: typing.List[typing.Dict[str, typing.Any]]) -> typing.Optional[dwelling.Dwelling]:
-    try:
-        return dwelling.Dwelling.from_group(grouped)
-    except InvalidEmbeddedDataTypeError as exc:
-        files = [str(file.get('jsonFileName')) for file in grouped]
-        failing_type = exc.data_class
-        full_message = logger.unwrap_exception_message(exc)
+def _error_message(grouped: typing.List[typing.Dict[str, typing.Any]], exc: EnerguideError) -> str:
+    files = [str(file.get('jsonFileName')) for file in grouped]
+    full_message = logger.unwrap_exception_message(exc)
 
-        LOGGER.error(
+    if isinstance(exc, InvalidEmbeddedDataTypeError):
+        failing_type = exc.data_class
+        return (
             f'Files: "{", ".join(files)}": {failing_type.__name__}'
             f' - {full_message}' if full_message else ''
         )
-    except EnerguideError as exc:
-        files = [str(file.get('jsonFileName')) for file in grouped]
-        full_message = logger.unwrap_exception_message(exc)
+    return (
+        f'Files: "{", ".join(files)}"'
+        f': {full_message}' if full_message else ''
+    )
 
-        LOGGER.error(
-            f'Files: "{", ".join(files)}"'
-            f': {full_message}' if full_message else ''
-        )
+
+def _generate_dwellings(grouped: typing.List[typing.Dict[str, typing.Any]]) -> typing.Optional[dwelling.Dwelling]:
+    try:
+        return dwelling.Dwelling.from_group(grouped)
+    except EnerguideError as exc:
+        LOGGER.error(_error_message(grouped, exc))
     return None
 
 
-def transform(extract_reader: ExtractProtocol, show_progress: bool = False) -> typing.Iterator[dwelling.Dwelling]:
-    extracted_rows = tqdm(extract_reader.extracted_rows(), total=extract_reader.num_rows(),
-                          unit=' files', disable=not show_progress)
-    for row_group in _read_groups(extracted_rows):
-        output = _generate_dwellings(row_group)
-        if output:
-            yield output
+def _transform_batch(groups: typing.List[typing.List[typing.Dict[str, typing.Any]]],
+                     encode_bson: bool = False,
+                    ) -> typing.List[typing.Tuple[typing.Union[None, Document, bytes], typing.Optional[str]]]:
+    """Worker side of the parallel transform; errors come back as messages so the parent logs them in order.
+
+    With `encode_bson` documents come back as BSON bytes, which are cheaper to send to the parent than dicts.
+    """
+    results: typing.List[typing.Tuple[typing.Union[None, Document, bytes], typing.Optional[str]]] = []
+    for grouped in groups:
+        try:
+            document = dwelling.Dwelling.from_group(grouped).to_dict()
+            results.append((database.encode_document(document) if encode_bson else document, None))
+        except EnerguideError as exc:
+            results.append((None, _error_message(grouped, exc)))
+    return results
+
+
+def _batched(items: typing.Iterable[typing.Any], size: int) -> typing.Iterator[typing.List[typing.Any]]:
+    iterator = iter(items)
+    batch = list(itertools.islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(iterator, size))
+
+
+def _transform_parallel(groups: typing.Iterable[typing.List[typing.Dict[str, typing.Any]]],
+                        workers: int,
+                        batch_size: int,
+                        raw_bson_documents: bool) -> typing.Iterator[TransformedDocument]:
+    pending: typing.Deque[futures.Future] = collections.deque()
+
+    def drain(future: futures.Future) -> typing.Iterator[TransformedDocument]:
+        for document, error in future.result():
+            if error is not None:
+                LOGGER.error(error)
+            elif isinstance(document, bytes):
+                yield raw_bson.RawBSONDocument(document)
+            elif document is not None:
+                yield document
+
+    with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in _batched(groups, batch_size):
+            pending.append(executor.submit(_transform_batch, batch, raw_bson_documents))
+            if len(pending) >= 2 * workers:
+                yield from drain(pending.popleft())
+
+        while pending:
+            yield from drain(pending.popleft())
+
+
+def transform(extract_reader: ExtractProtocol,
+              show_progress: bool = False,
+              workers: int = 1,
+              batch_size: int = TRANSFORM_BATCH_SIZE,
+              raw_bson_documents: bool = False) -> typing.Iterator[TransformedDocument]:
+    """Dwellings as dicts, or with `raw_bson_documents` as RawBSONDocuments already carrying their content hash"""
+    # counting can mean reading the whole input, so only do it for the progress bar; a reader that cannot count
+    # cheaply returns None and reports its own progress
+    total = extract_reader.num_rows() if show_progress else None
+    extracted_rows = tqdm(extract_reader.extracted_rows(), total=total,
+                          unit=' files', disable=not show_progress or total is None)
+    groups = _read_groups(extracted_rows)
+
+    if workers > 1:
+        yield from _transform_parallel(groups, workers, batch_size, raw_bson_documents)
+    else:
+        for row_group in groups:
+            output = _generate_dwellings(row_group)
+            if output and raw_bson_documents:
+                yield raw_bson.RawBSONDocument(database.encode_document(output.to_dict()))
+            elif output:
+                yield output.to_dict()
@@ -1,3 +1,4 @@
+import collections.abc
 import typing
 import cerberus
 from energuide import element
@@ -11,3 +12,89 @@ class DwellingValidator(cerberus.Validator):
     def _normalize_coerce_parse_xml(self, value: typing.Any) -> element.Element:  # pylint: disable=no-self-use
         assert isinstance(value, str), "Can't coerce non-strings to XML"
         return element.Element.from_string(value)
+
+
+_SUPPORTED_RULES = frozenset(['type', 'required', 'nullable', 'schema'])
+
+_TYPE_CHECKS: typing.Dict[str, typing.Callable[[typing.Any], bool]] = {
+    'string': lambda value: isinstance(value, str),
+    'list': lambda value: isinstance(value, collections.abc.Sequence) and not isinstance(value, str),
+}
+
+_FieldCheck = typing.Callable[[typing.Any], typing.Optional[typing.Any]]
+
+
+def _compile_rules(rules: typing.Dict[str, typing.Any]) -> _FieldCheck:
+    unsupported = set(rules) - _SUPPORTED_RULES
+    if unsupported or rules.get('type') not in _TYPE_CHECKS:
+        raise ValueError(f'Cannot compile schema rules: {rules}')
+
+    type_check = _TYPE_CHECKS[rules['type']]
+    type_error = f"must be of {rules['type']} type"
+    nullable = rules.get('nullable', False)
+    item_check = _compile_rules(rules['schema']) if 'schema' in rules else None
+
+    def check(value: typing.Any) -> typing.Optional[typing.Any]:
+        if value is None:
+            return None if nullable else 'null value not allowed'
+        if not type_check(value):
+            return type_error
+        if item_check is not None:
+            item_errors = {}
+            for index, item in enumerate(value):
+                item_error = item_check(item)
+                if item_error is not None:
+                    item_errors[index] = [item_error]
+            if item_errors:
+                return item_errors
+        return None
+
+    return check
+
+
+class CompiledValidator:
+    """A specialised stand-in for cerberus.Validator(schema, purge_unknown=True).
+
+    Only the 'type' ('string' or 'list'), 'required', 'nullable' and 'schema' rules are supported, which is all
+    the extract input schemas use. The schema is compiled once into plain checks, and validate() reports the
+    same errors as cerberus, so messages built from `errors` are unchanged.
+    """
+
+    def __init__(self, schema: typing.Dict[str, typing.Dict[str, typing.Any]]) -> None:
+        self._known = frozenset(schema)
+        self._required = tuple(field for field, rules in schema.items() if rules.get('required', False))
+        self._string_fields = tuple(
+            (field, rules.get('nullable', False)) for field, rules in schema.items()
+            if rules.get('type') == 'string' and set(rules) <= {'type', 'required', 'nullable'}
+        )
+        string_field_names = {field for field, _ in self._string_fields}
+        self._checks = tuple(
+            (field, _compile_rules(rules)) for field, rules in schema.items() if field not in string_field_names
+        )
+        self._string_checks = {field: _compile_rules(schema[field]) for field in string_field_names}
+        self.document: typing.Dict[str, typing.Any] = {}
+        self.errors: typing.Dict[str, typing.List[typing.Any]] = {}
+
+    def validate(self, document: typing.Dict[str, typing.Any]) -> bool:
+        errors: typing.Dict[str, typing.List[typing.Any]] = {}
+
+        for field, nullable in self._string_fields:
+            value = document.get(field)
+            if isinstance(value, str) or (value is None and nullable and field in document):
+                continue
+            if field in document:
+                errors[field] = [self._string_checks[field](value)]
+
+        for field, check in self._checks:
+            if field in document:
+                error = check(document[field])
+                if error is not None:
+                    errors[field] = [error]
+
+        for field in self._required:
+            if field not in document:
+                errors[field] = ['required field']
+
+        self.errors = {field: errors[field] for field in sorted(errors)}
+        self.document = {key: value for key, value in document.items() if key in self._known}
+        return not errors
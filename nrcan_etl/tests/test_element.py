@@ -1,3 +1,6 @@
+import concurrent.futures
+import threading
+import typing
 import py._path.local
 import pytest
 from energuide import element
@@ -135,3 +138,55 @@ def test_get_raises_when_not_found(fragment_node: element.Element) -> None:
 def test_get_raises_when_cant_cast(fragment_node: element.Element) -> None:
     with pytest.raises(ElementGetValueError):
         fragment_node.get('Bar/text()', int)
+
+
+def test_xpath_cache_counts_hits(fragment_node: element.Element) -> None:
+    path = 'Bar/@id'
+    fragment_node.xpath(path)
+    before = element.xpath_cache_info()
+    assert fragment_node.xpath(path) == ['1', '2']
+    after = element.xpath_cache_info()
+    assert after.hits == before.hits + 1
+    assert after.misses == before.misses
+    assert after.maxsize == element.XPATH_CACHE_SIZE
+
+
+def test_findtext_empty_element() -> None:
+    node = element.Element.from_string('<Foo><Bar /></Foo>')
+    assert node.findtext('Bar') == ''
+    assert node.findtext('Baz') is None
+
+
+def test_find_falls_back_for_element_path(fragment_node: element.Element) -> None:
+    found = fragment_node.find(".//Bar[@id='2']")
+    assert found is not None
+    assert found.findtext('.') == 'qux'
+
+
+def test_xml_parser_is_per_thread() -> None:
+    assert element.xml_parser() is element.xml_parser()
+    assert element.xml_parser() is not element.xml_parser(remove_blank_text=True)
+
+    other: typing.List[typing.Any] = []
+    thread = threading.Thread(target=lambda: other.append(element.xml_parser()))
+    thread.start()
+    thread.join()
+    assert other[0] is not element.xml_parser()
+
+
+def test_from_string_remove_blank_text() -> None:
+    data = '<Foo>\n  <Bar>baz</Bar>\n</Foo>'
+    assert element.Element.from_string(data).to_string() == data
+    assert element.Element.from_string(data, remove_blank_text=True).to_string() == '<Foo><Bar>baz</Bar></Foo>'
+
+
+def test_from_string_from_many_threads() -> None:
+    def parse(index: int) -> typing.Tuple[str, str]:
+        data = f"<Foo id='{index}'>" + ''.join(f'<Bar>{index}-{i}</Bar>' for i in range(200)) + '</Foo>'
+        node = element.Element.from_string(data)
+        return node.attrib['id'], node.xpath('Bar/text()')[-1]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(parse, range(2000)))
+
+    assert results == [(str(index), f'{index}-199') for index in range(2000)]
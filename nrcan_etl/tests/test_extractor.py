@@ -1,4 +1,6 @@
 import csv
+import gzip
+import io
 import json
 import os
 import typing
@@ -6,6 +8,7 @@ import zipfile
 import _pytest.fixtures
 import py._path.local
 import pytest
+from tqdm import tqdm
 from energuide import extractor
 
 
@@ -126,6 +129,20 @@ def test_empty_to_none(tmpdir: py._path.local.LocalPath, nullable_data: typing.D
     assert row['MODIFICATIONDATE'] is None
 
 
+def test_read_csv_with_progress(extra_filepath: str) -> None:
+    output = list(extractor._read_csv(extra_filepath, show_progress=True))
+    assert len(output) == 1
+    assert output[0]['other_1'] == 'foo'
+
+
+def test_progress_reader_counts_bytes(extra_filepath: str) -> None:
+    with tqdm(total=os.stat(extra_filepath).st_size, file=io.StringIO()) as progress:
+        reader = extractor._ProgressReader(io.FileIO(extra_filepath, 'r'), progress)
+        with io.BufferedReader(reader) as file:
+            content = file.read()
+        assert progress.n == len(content) == os.stat(extra_filepath).st_size
+
+
 def test_write_data(tmpdir: py._path.local.LocalPath) -> None:
     output_path = os.path.join(tmpdir, 'output.zip')
 
@@ -155,3 +172,51 @@ def test_write_bad_data(tmpdir: py._path.local.LocalPath) -> None:
 
     with zipfile.ZipFile(output_path, 'r') as output:
         assert len(output.namelist()) == 1
+
+
+@pytest.mark.parametrize('run_size', [1, 2, 100])
+def test_write_data_jsonl_gz(tmpdir: py._path.local.LocalPath, run_size: int) -> None:
+    output_path = os.path.join(tmpdir, 'output.jsonl.gz')
+
+    data: typing.List[typing.Dict[str, typing.Any]] = [
+        {'foo': 1, 'BUILDER': '4K02E90020', 'EVAL_ID': '12149', 'HOUSE_ID': '15678'},
+        {'bar': 2, 'baz': 3},
+        {'baz': 3, 'BUILDER': '4K13D01404', 'EVAL_ID': '12148', 'HOUSE_ID': '15677'},
+        {'qux': 4, 'BUILDER': '4K13D01405', 'EVAL_ID': '12150', 'HOUSE_ID': '15677'},
+    ]
+
+    result = extractor.write_data(data, output_path, 'jsonl.gz', run_size=run_size)
+    assert result == (3, 1)
+
+    with gzip.open(output_path, 'rt') as output_file:
+        rows = [json.loads(line) for line in output_file]
+
+    assert [row['jsonFileName'] for row in rows] == [
+        '15677-12148-4K13D01404', '15677-12150-4K13D01405', '15678-12149-4K02E90020',
+    ]
+    assert rows[0]['baz'] == 3
+
+
+def test_write_data_unknown_format(tmpdir: py._path.local.LocalPath) -> None:
+    with pytest.raises(ValueError):
+        extractor.write_data([], os.path.join(tmpdir, 'output.tar'), 'tar')
+
+
+def test_extract_parallel_matches_serial(tmpdir: py._path.local.LocalPath,
+                                         base_data: typing.Dict[str, str]) -> None:
+    filepath = os.path.join(tmpdir, 'sample.csv')
+    rows = []
+    for index in range(10):
+        row = dict(base_data)
+        row['EVAL_ID'] = str(index)
+        rows.append(row)
+    rows[3].pop('BUILDER')
+    with open(filepath, 'w') as file:
+        writer = csv.DictWriter(file, fieldnames=list(base_data.keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    serial = list(extractor.extract_data(filepath))
+    parallel = list(extractor.extract_data(filepath, workers=2, batch_size=3))
+    assert parallel == serial
+    assert parallel[3] is None
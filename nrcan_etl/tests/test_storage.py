@@ -0,0 +1,138 @@
+import io
+import os
+import typing
+import zipfile
+import _pytest
+import py._path.local
+import pytest
+from energuide import storage
+from energuide import transform
+from energuide.exceptions import MissingBlobError
+
+
+@pytest.fixture
+def local_storage(tmpdir: py._path.local.LocalPath) -> storage.LocalStorage:
+    return storage.LocalStorage(str(tmpdir.join('blobs')))
+
+
+@pytest.fixture
+def azure_storage(azure_emulator: transform.AzureCoordinates) -> storage.AzureStorage:
+    return storage.AzureStorage(azure_emulator)
+
+
+@pytest.fixture(params=['local_storage', 'azure_storage'])
+def any_storage(request: _pytest.fixtures.FixtureRequest) -> storage.Storage:
+    return request.getfixturevalue(request.param)
+
+
+def test_put_get(any_storage: storage.Storage) -> None:
+    info = any_storage.put('1-foo.json', b'{}')
+    assert info.name == '1-foo.json'
+    assert info.etag
+    assert any_storage.exists('1-foo.json')
+    assert any_storage.get('1-foo.json') == b'{}'
+    assert any_storage.info('1-foo.json').etag == info.etag
+
+
+def test_missing(any_storage: storage.Storage) -> None:
+    assert not any_storage.exists('missing.json')
+    with pytest.raises(MissingBlobError):
+        any_storage.get('missing.json')
+    with pytest.raises(MissingBlobError):
+        any_storage.info('missing.json')
+
+
+def test_list(any_storage: storage.Storage) -> None:
+    for name in ['2-b.json', '1-a.json', 'timestamp_journal/1.json']:
+        any_storage.put(name, name.encode())
+
+    assert [info.name for info in any_storage.list()] == ['1-a.json', '2-b.json', 'timestamp_journal/1.json']
+    assert [info.name for info in any_storage.list(prefix='timestamp_journal/')] == ['timestamp_journal/1.json']
+    assert all(info.last_modified.tzinfo is not None for info in any_storage.list())
+    assert [info.size for info in any_storage.list()] == [8, 8, 24]
+
+
+def test_list_prefixes(any_storage: storage.Storage) -> None:
+    for name in ['1-a.json', 'timestamp_journal/1.json', 'timestamp_journal/2.json', 'other/1.json']:
+        any_storage.put(name, name.encode())
+
+    assert [info.name for info in any_storage.list(prefix='timestamp_jo')] == [
+        'timestamp_journal/1.json', 'timestamp_journal/2.json',
+    ]
+    assert [info.name for info in any_storage.list(prefix='timestamp_journal/2')] == ['timestamp_journal/2.json']
+    assert not list(any_storage.list(prefix='missing/'))
+
+
+def test_local_list_walks_only_prefix(local_storage: storage.LocalStorage,
+                                      monkeypatch: _pytest.monkeypatch.MonkeyPatch) -> None:
+    for name in ['1-a.json', 'timestamp_journal/1.json', 'other/deeper/1.json']:
+        local_storage.put(name, name.encode())
+    walked = []
+    walk = os.walk
+
+    def recording_walk(top: str) -> typing.Iterator[typing.Tuple[str, typing.List[str], typing.List[str]]]:
+        for directory, subdirectories, files in walk(top):
+            walked.append(os.path.basename(directory))
+            yield directory, subdirectories, files
+
+    monkeypatch.setattr(os, 'walk', recording_walk)
+    assert [info.name for info in local_storage.list(prefix='timestamp_journal/')] == ['timestamp_journal/1.json']
+    assert walked == ['timestamp_journal']
+
+    walked.clear()
+    assert [info.name for info in local_storage.list(prefix='t')] == ['timestamp_journal/1.json']
+    assert walked == ['blobs', 'timestamp_journal']
+
+
+def test_local_rejects_escaping_names(local_storage: storage.LocalStorage) -> None:
+    with pytest.raises(ValueError):
+        local_storage.put('../outside.json', b'')
+
+
+def test_local_put_stream_replaces_atomically(local_storage: storage.LocalStorage,
+                                              tmpdir: py._path.local.LocalPath) -> None:
+    first = local_storage.put('1-a.json', b'old')
+    with open(str(tmpdir.join('new.json')), 'wb+') as stream:
+        stream.write(b'newer')
+        stream.seek(0)
+        second = local_storage.put_stream('1-a.json', stream)
+
+    assert local_storage.get('1-a.json') == b'newer'
+    assert first.etag != second.etag
+    assert os.listdir(str(tmpdir.join('blobs'))) == ['1-a.json']
+
+
+def test_local_put_stream_count(local_storage: storage.LocalStorage,
+                                monkeypatch: _pytest.monkeypatch.MonkeyPatch) -> None:
+    monkeypatch.setattr(storage, 'COPY_CHUNK_SIZE', 3)
+    stream = io.BytesIO(b'0123456789')
+    local_storage.put_stream('1-a.json', stream, count=7)
+
+    assert local_storage.get('1-a.json') == b'0123456'
+    assert stream.tell() == 7
+
+
+def test_from_env(monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                  tmpdir: py._path.local.LocalPath) -> None:
+    coords = transform.AzureCoordinates(account='foo', key='bar', container='baz', domain=None)
+    monkeypatch.setenv(storage.EnvVariables.backend.value, 'local')
+    monkeypatch.setenv(storage.EnvVariables.directory.value, str(tmpdir))
+    assert isinstance(storage.from_env(coords), storage.LocalStorage)
+
+    monkeypatch.setenv(storage.EnvVariables.backend.value, 'elsewhere')
+    with pytest.raises(ValueError):
+        storage.from_env(coords)
+
+
+def test_reader_on_local_storage(local_storage: storage.LocalStorage, energuide_zip_fixture: str) -> None:
+    with zipfile.ZipFile(energuide_zip_fixture) as file_z:
+        for name in file_z.namelist():
+            local_storage.put(name, file_z.read(name))
+        names = sorted(file_z.namelist())
+
+    coords = transform.AzureCoordinates(account='', key='', container='', domain=None)
+    reader = transform.AzureExtractReader(coords, storage_service=local_storage)
+    assert [row['jsonFileName'] for row in reader.extracted_rows()] == names
+
+    reader = transform.AzureExtractReader(coords, storage_service=local_storage)
+    assert reader.num_rows() == 0
@@ -1,9 +1,18 @@
+import json
+import os
+import threading
 import time
 import typing
 import zipfile
 import _pytest
+import py._path.local
 import pytest
+import tqdm
 from azure.storage import blob
+import bson
+from bson import raw_bson
+from energuide import database
+from energuide import extractor
 from energuide import transform
 
 
@@ -39,6 +48,54 @@ def test_reader_num_rows(local_reader: transform.LocalExtractReader) -> None:
     assert local_reader.num_rows() == 21
 
 
+def test_jsonl_reader_matches_zip_reader(local_reader: transform.LocalExtractReader,
+                                        energuide_fixture: str,
+                                        tmpdir: py._path.local.LocalPath) -> None:
+    outfile = f'{tmpdir}/extracted.jsonl.gz'
+    extractor.write_data(extractor.extract_data(energuide_fixture), outfile, 'jsonl.gz', run_size=5)
+
+    jsonl_reader = transform.local_extract_reader(outfile)
+    assert isinstance(jsonl_reader, transform.LocalJsonLinesExtractReader)
+    assert jsonl_reader.num_rows() is None
+    assert list(jsonl_reader.extracted_rows()) == list(local_reader.extracted_rows())
+
+
+def test_jsonl_reader_progress_in_bytes(energuide_fixture: str,
+                                        tmpdir: py._path.local.LocalPath,
+                                        monkeypatch: _pytest.monkeypatch.MonkeyPatch) -> None:
+    outfile = f'{tmpdir}/extracted.jsonl.gz'
+    extractor.write_data(extractor.extract_data(energuide_fixture), outfile, 'jsonl.gz')
+    progress: typing.List[typing.Tuple[int, int]] = []
+
+    class RecordingProgress(tqdm.tqdm):
+        def close(self) -> None:
+            progress.append((self.n, self.total))
+            super().close()
+
+    monkeypatch.setattr(transform, 'tqdm', RecordingProgress)
+    rows = list(transform.local_extract_reader(outfile, show_progress=True).extracted_rows())
+
+    assert len(rows) == 14
+    assert progress[0] == (os.stat(outfile).st_size, os.stat(outfile).st_size)
+
+
+@pytest.mark.parametrize('show_progress, counted', [(False, False), (True, True)])
+def test_transform_counts_rows_only_for_progress(local_reader: transform.LocalExtractReader,
+                                                 monkeypatch: _pytest.monkeypatch.MonkeyPatch,
+                                                 show_progress: bool,
+                                                 counted: bool) -> None:
+    calls: typing.List[int] = []
+    num_rows = local_reader.num_rows
+
+    def counting_num_rows() -> int:
+        calls.append(1)
+        return num_rows()
+
+    monkeypatch.setattr(local_reader, 'num_rows', counting_num_rows)
+    assert list(transform.transform(local_reader, show_progress=show_progress))
+    assert bool(calls) == counted
+
+
 def test_azure_reader_extracted_rows(azure_reader: transform.AzureExtractReader) -> None:
     output = list(azure_reader.extracted_rows())
     output = sorted(output, key=lambda row: row['BUILDER'])
@@ -70,6 +127,37 @@ def test_azure_reader_extracted_rows_new_data(azure_reader: transform.AzureExtra
     assert len(output) == 2
 
 
+def test_azure_reader_prefetch_keeps_order(populated_azure_emulator: transform.AzureCoordinates,
+                                           monkeypatch: _pytest.monkeypatch.MonkeyPatch) -> None:
+    reader = transform.AzureExtractReader(populated_azure_emulator, workers=4, prefetch_depth=3)
+    names = reader._new_files
+    lock = threading.Lock()
+    in_flight = [0, 0]
+    download = reader._download
+
+    def slow_download(file: str) -> bytes:
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.01 * (len(file) % 3))
+        try:
+            return download(file)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    monkeypatch.setattr(reader, '_download', slow_download)
+    output = list(reader.extracted_rows())
+
+    assert [row['jsonFileName'] for row in output] == names
+    assert in_flight[1] <= 3
+
+
+def test_azure_reader_rejects_bad_prefetch(azure_coordinates: transform.AzureCoordinates) -> None:
+    with pytest.raises(ValueError):
+        transform.AzureExtractReader(azure_coordinates, workers=1, prefetch_depth=0)
+
+
 def test_azure_reader_num_rows(azure_reader: transform.AzureExtractReader) -> None:
     assert azure_reader.num_rows() == 21
 
@@ -98,3 +186,93 @@ def test_azure_coordinates_from_env(monkeypatch: _pytest.monkeypatch.MonkeyPatch
 def test_transform(local_reader: transform.LocalExtractReader) -> None:
     output = transform.transform(local_reader)
     assert len(list(output)) == 11
+
+
+def test_transform_parallel_matches_serial(local_reader: transform.LocalExtractReader) -> None:
+    serial = list(transform.transform(local_reader))
+    parallel = list(transform.transform(local_reader, workers=2, batch_size=2))
+    assert parallel == serial
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_transform_raw_bson(local_reader: transform.LocalExtractReader, workers: int) -> None:
+    documents = list(transform.transform(local_reader))
+    raw_documents = list(transform.transform(local_reader, workers=workers, batch_size=2, raw_bson_documents=True))
+
+    assert all(isinstance(document, raw_bson.RawBSONDocument) for document in raw_documents)
+    decoded = [bson.BSON(typing.cast(raw_bson.RawBSONDocument, document).raw).decode() for document in raw_documents]
+    assert decoded == [dict(document, contentHash=database.content_hash(document)) for document in documents]
+
+
+def test_azure_reader_lists_container_once(azure_reader: transform.AzureExtractReader,
+                                          monkeypatch: _pytest.monkeypatch.MonkeyPatch) -> None:
+    azure_reader.num_rows()
+    azure_reader._new_file_list = None
+
+    calls = []
+    list_blobs = azure_reader._storage.list
+
+    def counting_list_blobs(*args, **kwargs):
+        calls.append(args)
+        return list_blobs(*args, **kwargs)
+
+    monkeypatch.setattr(azure_reader._storage, 'list', counting_list_blobs)
+    azure_reader.num_rows()
+    assert len(calls) == 1
+
+
+def write_journal(coords: transform.AzureCoordinates, name: str, files: typing.List[str]) -> None:
+    service = blob.BlockBlobService(account_name=coords.account,
+                                    account_key=coords.key,
+                                    custom_domain=coords.domain)
+    service.create_blob_from_text(coords.container, transform.AzureJournalReader.journal_prefix + name,
+                                  json.dumps({'files': files}))
+
+
+def test_azure_journal_reader(populated_azure_emulator: transform.AzureCoordinates) -> None:
+    all_files = transform.AzureExtractReader(populated_azure_emulator)._new_files
+    eval_id = all_files[0].split('-')[0]
+    expected = [name for name in all_files if name.startswith(f'{eval_id}-')]
+
+    reader = transform.AzureJournalReader(populated_azure_emulator)
+    assert reader.num_rows() == 0
+
+    write_journal(populated_azure_emulator, '20180101T000000000000Z_a.json', [all_files[0]])
+    reader = transform.AzureJournalReader(populated_azure_emulator)
+    assert [row['jsonFileName'] for row in reader.extracted_rows()] == expected
+
+    reader = transform.AzureJournalReader(populated_azure_emulator)
+    assert reader.num_rows() == 0
+
+
+def test_azure_journal_reader_keeps_unfinished_journals(populated_azure_emulator: transform.AzureCoordinates) -> None:
+    all_files = transform.AzureExtractReader(populated_azure_emulator)._new_files
+    write_journal(populated_azure_emulator, '20180101T000000000000Z_a.json', all_files[:1])
+    write_journal(populated_azure_emulator, '20180102T000000000000Z_b.json', all_files[-1:])
+
+    reader = transform.AzureJournalReader(populated_azure_emulator)
+    rows = typing.cast(typing.Generator[typing.Dict[str, typing.Any], None, None], reader.extracted_rows())
+    next(rows)
+    rows.close()
+
+    reader = transform.AzureJournalReader(populated_azure_emulator)
+    assert reader.num_rows() >= 2
+
+
+def test_azure_journal_reader_reads_late_journals(populated_azure_emulator: transform.AzureCoordinates) -> None:
+    all_files = transform.AzureExtractReader(populated_azure_emulator)._new_files
+    write_journal(populated_azure_emulator, '20180102T000000000000Z_b.json', all_files[-1:])
+    reader = transform.AzureJournalReader(populated_azure_emulator)
+    assert list(reader.extracted_rows())
+
+    write_journal(populated_azure_emulator, '20180101T000000000000Z_a.json', all_files[:1])
+    reader = transform.AzureJournalReader(populated_azure_emulator)
+    assert all_files[0] in [row['jsonFileName'] for row in reader.extracted_rows()]
+
+    reader = transform.AzureJournalReader(populated_azure_emulator)
+    assert reader.num_rows() == 0
+
+
+def test_listing_prefixes() -> None:
+    assert transform._listing_prefixes(['12149', '12150', '12188', '103800', '5'], 2) == ['1038', '121', '5']
+    assert not transform._listing_prefixes([], 2)